@@ -0,0 +1,455 @@
+"""Optional ASGI server for the realtime and read-only endpoints.
+
+    uvicorn app.asgi:app --host 0.0.0.0 --port $PORT --no-access-log
+
+Serves the Socket.IO namespace (python-socketio AsyncServer), the SSE session stream and
+the public read-only JSON endpoints with the same payloads and ETags as app.main. Auth,
+Team Picker and the HTML pages stay on the Flask app: route those paths to it at the
+proxy. Both share Redis (message queue, presence store), so emits from the Flask process
+reach sockets held here. Needs requirements-asgi.txt.
+
+Database reads run on an asyncpg engine through AsyncConnection.run_sync(), which lets the
+existing store functions run unchanged. One refresher task does every read behind the
+per-tick caches; request handlers only read memory, apart from the history endpoints,
+which go to the database when their cache entry has expired.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import socketio
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app.compress import GzipFrames, SharedFrames, negotiate
+from app.config import settings
+from app.db import bound_sessions
+from app.httpcache import ResponseCache
+from app.jsoncodec import dumps, dumps_str
+from app.presence import presence_writes, site_gone, site_online_users, site_seen
+from app.presence_snapshot import LONG_POLL_MAX_SECONDS, PROFILE_TTL_SECONDS, PresenceSnapshots, in_game_players
+from app.records import SessionView
+from app.search import LiveSessions, normalize_query
+from app.store import (
+    get_current_sessions, get_current_sessions_version, get_history_summary, get_maps_summary,
+    get_match_maps_summary, get_matches, get_mod_catalog, get_mods_summary, get_player_history, get_session_detail,
+    get_site_profiles,
+)
+from app.team_picker import events_head, get_statuses, session_docs, user_room
+
+
+REFRESH_SECONDS = 1.0
+SSE_INTERVAL_SECONDS = 5.0
+# Flask's default session cookie: itsdangerous, "cookie-session" salt, HMAC-SHA1, 31 days
+SESSION_COOKIE = "session"
+SESSION_MAX_AGE = 31 * 24 * 3600
+
+
+def _async_url(url: str) -> str:
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+_pool_size, _max_overflow, _pool_timeout = settings.db_pools["sse"]
+engine = create_async_engine(
+    _async_url(settings.database_url),
+    pool_pre_ping=True, pool_size=_pool_size, max_overflow=_max_overflow, pool_timeout=_pool_timeout,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    # asyncpg prepares every statement; PgBouncer's transaction pooling cannot keep them
+    connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0} if settings.db_pgbouncer else {},
+)
+
+
+def _bound_call(sync_conn, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+    with bound_sessions(sync_conn):
+        return fn(*args)
+
+
+async def run_store(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a sync store function on the asyncpg engine."""
+    async with engine.connect() as conn:
+        return await conn.run_sync(_bound_call, fn, args)
+
+
+class Tick:
+    """Latest reads made by the refresher; the per-tick caches below load from it."""
+
+    def __init__(self) -> None:
+        self.version: Any = None
+        self.sessions: List[SessionView] = []
+        self.status_token: Any = None
+        self.statuses: Dict[str, Dict[str, Any]] = {}
+        self.online: List[str] = []
+        self.profiles: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.profiles_expires = 0.0
+
+
+tick = Tick()
+live_sessions = LiveSessions(lambda: (tick.version, tick.sessions), lambda: tick.version, probe_interval=0)
+presence_snapshots = PresenceSnapshots(
+    live_sessions.sessions, lambda: tick.version, lambda: tick.online,
+    lambda pairs: [tick.profiles[p] for p in pairs if p in tick.profiles],
+)
+
+
+async def refresh() -> None:
+    version = await run_store(get_current_sessions_version)
+    if version != tick.version:
+        tick.sessions = await run_store(get_current_sessions)
+        tick.version = version
+    token = (version, await run_store(events_head))
+    if token != tick.status_token:
+        tick.statuses = await run_store(get_statuses, [s.id for s in tick.sessions])
+        tick.status_token = token
+    online = await asyncio.to_thread(site_online_users)
+    pairs = [tuple(u.split(":", 1)) for u in online if ":" in u]
+    # Same lifetime as PresenceSnapshots' own profile cache; only online users are kept
+    profiles = tick.profiles
+    now = time.monotonic()
+    if now >= tick.profiles_expires:
+        profiles = {}
+        tick.profiles_expires = now + PROFILE_TTL_SECONDS
+    missing = [p for p in pairs if p not in profiles]
+    if missing:
+        for entry in await run_store(get_site_profiles, missing):
+            profiles[(entry["provider"], entry["id"])] = entry
+    tick.profiles = {p: profiles[p] for p in pairs if p in profiles}
+    tick.online = online
+
+
+# --- Socket.IO ---------------------------------------------------------------------------
+
+sio = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins=settings.ws_allowed_origins or "*",
+    # Same channel as Flask-SocketIO, so app.main and the worker reach these sockets
+    client_manager=socketio.AsyncRedisManager(settings.redis_url, channel="flask-socketio") if settings.redis_url else None,
+)
+_session_cookies = URLSafeTimedSerializer(
+    settings.secret_key, salt="cookie-session",
+    signer_kwargs={"key_derivation": "hmac", "digest_method": hashlib.sha1},
+)
+_SOCKET_UIDS: Dict[str, str] = {}
+
+
+def _session_uid(environ: Dict[str, Any]) -> Optional[str]:
+    from http.cookies import SimpleCookie
+    cookie = SimpleCookie(environ.get("HTTP_COOKIE", "")).get(SESSION_COOKIE)
+    if cookie is None:
+        return None
+    try:
+        uid = _session_cookies.loads(cookie.value, max_age=SESSION_MAX_AGE).get("uid")
+    except (BadSignature, ValueError, AttributeError):
+        return None
+    return uid if isinstance(uid, str) and ":" in uid else None
+
+
+async def _site(fn: Callable[..., Any], *args: Any) -> None:
+    try:
+        await asyncio.to_thread(fn, *args)
+    except Exception as ex:
+        print(f"[presence] {fn.__name__} error: {ex}", flush=True)
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    _start_tasks()
+    uid = _session_uid(environ)
+    if uid:
+        _SOCKET_UIDS[sid] = uid
+        await sio.enter_room(sid, user_room(*uid.split(":", 1)))
+        await _site(site_seen, uid, sid)
+
+
+@sio.on("join")
+async def join(sid, data):
+    room = (data or {}).get("room") if isinstance(data, dict) else None
+    if isinstance(room, str) and room and not room.startswith("user:"):
+        await sio.enter_room(sid, room)
+
+
+@sio.on("leave")
+async def leave(sid, data):
+    room = (data or {}).get("room") if isinstance(data, dict) else None
+    if isinstance(room, str) and room:
+        await sio.leave_room(sid, room)
+
+
+@sio.on("presence:heartbeat")
+async def presence_heartbeat(sid, data=None):
+    uid = _SOCKET_UIDS.get(sid)
+    if uid:
+        await _site(site_seen, uid, sid)
+
+
+@sio.event
+async def disconnect(sid, *_reason):
+    uid = _SOCKET_UIDS.pop(sid, None)
+    if uid:
+        await _site(site_gone, uid, sid)
+
+
+_tasks_started = False
+
+
+def _start_tasks() -> None:
+    """Once per process: the refresher, the site_presence write flush and the snapshot push."""
+    global _tasks_started
+    if _tasks_started:
+        return
+    _tasks_started = True
+
+    async def _refresh_loop() -> None:
+        from app.presence import get_presence_store
+        last = None
+        while True:
+            try:
+                await refresh()
+                snap = presence_snapshots.current()
+                if snap.version != last:
+                    # Keyed on the transition like app.main: a content hash recurs when presence flips back
+                    lock = f"presence:snapshot:{last}->{snap.version}"
+                    if last is not None and await asyncio.to_thread(get_presence_store().try_lock, lock, 10):
+                        await sio.emit("presence:snapshot", snap.doc)
+                    last = snap.version
+            except Exception as ex:
+                print(f"[asgi] refresh error: {ex}", flush=True)
+            await asyncio.sleep(REFRESH_SECONDS)
+
+    async def _flush_loop() -> None:
+        while True:
+            await asyncio.sleep(settings.presence_flush_seconds)
+            try:
+                await run_store(presence_writes.flush)
+            except Exception as ex:
+                print(f"[presence] flush error: {ex}", flush=True)
+
+    sio.start_background_task(_refresh_loop)
+    sio.start_background_task(_flush_loop)
+
+
+# --- HTTP --------------------------------------------------------------------------------
+
+http_cache = ResponseCache()
+sse_frames = SharedFrames()
+poll_max_age = max(1, settings.poll_interval_seconds)
+history_max_age = 60
+rollup_max_age = 300
+
+
+def _json(obj: Any, status_code: int = 200) -> Response:
+    # Same bytes as jsonify() with app.json_provider
+    return Response(dumps(obj) + b"\n", status_code=status_code, media_type="application/json")
+
+
+def _accept_encodings(request: Request) -> Accept:
+    return parse_accept_header(request.headers.get("accept-encoding"))
+
+
+def _int_arg(request: Request, name: str, default: Optional[int]) -> Optional[int]:
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def _cached(request: Request, key: Any, build: Callable[[], Any], max_age: int, token: Any = None,
+                  raw: bool = False, from_store: bool = False) -> Response:
+    """ResponseCache entry served the way ResponseCache.respond does for Flask."""
+    entry = http_cache.lookup(key, token)
+    if entry is None:
+        value = await run_store(build) if from_store else build()
+        entry = http_cache.put(key, value, max_age, token, raw)
+    encoding, etag, body = http_cache.variant(entry, _accept_encodings(request))
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={max(0, int(max_age))}",
+        "Vary": "Accept-Encoding",
+    }
+    if parse_etags(request.headers.get("if-none-match")).contains(etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def healthz(request: Request) -> Response:
+    return _json({"status": "ok"})
+
+
+async def sessions_current(request: Request) -> Response:
+    q = request.query_params
+    key = normalize_query(q.get("state"), q.get("nat_type"), _int_arg(request, "min_players", None), q.get("mod"), q.get("q"))
+    statuses = tick.statuses
+    return await _cached(request, ("sessions", key), lambda: {"sessions": session_docs(live_sessions.query(key), statuses)},
+                         poll_max_age, token=tick.status_token)
+
+
+async def session_detail(request: Request) -> Response:
+    data = await run_store(get_session_detail, request.path_params["sid"])
+    if data is None:
+        return _json({"error": "not_found"}, 404)
+    return _json(data)
+
+
+def _sse_event(statuses: Dict[str, Dict[str, Any]]) -> str:
+    return f"data: {dumps_str({'sessions': session_docs(live_sessions.sessions(), statuses)})}\n\n"
+
+
+async def stream_sessions(request: Request) -> Response:
+    async def _frames():
+        last = None
+        while True:
+            statuses = tick.statuses
+            frame = sse_frames.get(tick.status_token, lambda: _sse_event(statuses))
+            if frame is not last:
+                yield frame
+                last = frame
+            await asyncio.sleep(SSE_INTERVAL_SECONDS)
+
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if negotiate(_accept_encodings(request), allow_br=False) != "gzip":
+        async def _plain():
+            async for frame in _frames():
+                yield frame.raw
+
+        return StreamingResponse(_plain(), media_type="text/event-stream", headers=headers)
+
+    async def _gzipped():
+        z = GzipFrames()
+        async for frame in _frames():
+            yield z.chunk(frame)
+
+    headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_gzipped(), media_type="text/event-stream", headers=headers)
+
+
+async def history_summary(request: Request) -> Response:
+    minutes = _int_arg(request, "minutes", 60)
+    return await _cached(request, ("history", minutes), lambda: {"points": get_history_summary(minutes=minutes)},
+                         history_max_age, from_store=True)
+
+
+async def history_maps(request: Request) -> Response:
+    hours = _int_arg(request, "hours", 24)
+    return await _cached(request, ("maps", hours), lambda: {"items": get_maps_summary(hours=hours)},
+                         rollup_max_age, from_store=True)
+
+
+async def history_mods(request: Request) -> Response:
+    hours = _int_arg(request, "hours", 24)
+    return await _cached(request, ("mods", hours), lambda: {"items": get_mods_summary(hours=hours)},
+                         rollup_max_age, from_store=True)
+
+
+async def history_matches(request: Request) -> Response:
+    hours = _int_arg(request, "hours", 24)
+    return await _cached(request, ("match_maps", hours), lambda: {"items": get_match_maps_summary(hours=hours)},
+                         history_max_age, from_store=True)
+
+
+async def matches(request: Request) -> Response:
+    map_file = request.query_params.get("map") or None
+    hours = _int_arg(request, "hours", 24)
+    limit = _int_arg(request, "limit", 50)
+    return await _cached(request, ("matches", map_file, hours, limit),
+                         lambda: {"matches": get_matches(map_file, hours=hours, limit=limit)}, history_max_age, from_store=True)
+
+
+async def mods_catalog(request: Request) -> Response:
+    return await _cached(request, "mod_catalog", lambda: {"mods": get_mod_catalog()}, rollup_max_age, from_store=True)
+
+
+async def players_online(request: Request) -> Response:
+    return await _cached(request, "players_online", lambda: {"players": in_game_players(live_sessions.sessions())},
+                         poll_max_age, token=tick.version)
+
+
+async def presence_snapshot(request: Request) -> Response:
+    since = request.query_params.get("since")
+    try:
+        wait = float(request.query_params.get("wait", LONG_POLL_MAX_SECONDS)) if since else 0.0
+    except ValueError:
+        wait = LONG_POLL_MAX_SECONDS
+    snap = presence_snapshots.current()
+    deadline = asyncio.get_running_loop().time() + max(0.0, min(wait, LONG_POLL_MAX_SECONDS))
+    while since and snap.version == since and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(REFRESH_SECONDS)
+        snap = presence_snapshots.current()
+    return await _cached(request, "presence_snapshot", lambda: snap.body, 0, token=snap.version, raw=True)
+
+
+async def player_history(request: Request) -> Response:
+    limit = _int_arg(request, "limit", 20)
+    cursor = request.query_params.get("cursor") or None
+    try:
+        data = await run_store(get_player_history, request.path_params["steam_id"], limit, cursor)
+    except ValueError:
+        return _json({"error": "bad_cursor"}, 400)
+    return _json(data)
+
+
+async def leaderboards(request: Request) -> Response:
+    from app.leaderboards import METRICS, WINDOWS, leaderboard_cache
+    window = request.query_params.get("window", "all")
+    metric = request.query_params.get("metric")
+    if window not in WINDOWS:
+        return _json({"error": "bad_window", "windows": list(WINDOWS)}, 400)
+    max_age = max(1, settings.leaderboard_cache_seconds)
+    if metric is None:
+        return await _cached(request, ("leaderboards", window), lambda: leaderboard_cache.document(window), max_age,
+                             raw=True, from_store=True)
+    if metric not in METRICS:
+        return _json({"error": "bad_metric", "metrics": list(METRICS)}, 400)
+    limit = max(1, min(settings.leaderboard_size, _int_arg(request, "limit", 25)))
+    return await _cached(request, ("leaderboards", window, metric, limit),
+                         lambda: leaderboard_cache.slice(window, metric, limit), max_age, raw=True, from_store=True)
+
+
+async def team_picker_status(request: Request) -> Response:
+    ids = [i for i in (request.query_params.get("ids") or "").split(",") if i][:100]
+    live = tick.statuses
+    out = {i: live[i] for i in ids if i in live}
+    missing = [i for i in ids if i not in out]
+    if missing:
+        out.update(await run_store(get_statuses, missing))
+    return _json({"statuses": out})
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(_app):
+    _start_tasks()
+    yield
+
+
+http = Starlette(
+    routes=[
+        Route("/healthz", healthz),
+        Route("/api/v1/sessions/current", sessions_current),
+        Route("/api/v1/sessions/{sid:path}", session_detail),
+        Route("/api/v1/stream/sessions", stream_sessions),
+        Route("/api/v1/history/summary", history_summary),
+        Route("/api/v1/history/maps", history_maps),
+        Route("/api/v1/history/mods", history_mods),
+        Route("/api/v1/history/matches", history_matches),
+        Route("/api/v1/matches", matches),
+        Route("/api/v1/mods", mods_catalog),
+        Route("/api/v1/players/online", players_online),
+        Route("/api/v1/presence/snapshot", presence_snapshot),
+        Route("/api/v1/players/{steam_id}/history", player_history),
+        Route("/api/v1/leaderboards", leaderboards),
+        Route("/api/v1/team_picker/status", team_picker_status),
+    ],
+    lifespan=_lifespan,
+)
+app = socketio.ASGIApp(sio, other_asgi_app=http, socketio_path="socket.io")
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import gzip
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+try:  # optional: brotli is preferred when installed, gzip otherwise
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# Bodies smaller than this are sent as-is; the framing overhead outweighs the savings
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic JSON; static assets use the maximum at build time
+
+ENCODING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+
+def negotiate(accept_encodings, allow_br: bool = True) -> Optional[str]:
+    """Pick "br", "gzip" or None from a werkzeug Accept-Encoding header object."""
+    best = accept_encodings.best_match(["br", "gzip"] if (allow_br and brotli is not None) else ["gzip"])
+    return best if best in ("br", "gzip") else None
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic, so equal bodies give equal bytes
+        return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+class Frame(NamedTuple):
+    raw: bytes
+    deflated: bytes  # raw deflate, sync-flushed, with no back-references to earlier frames
+
+
+class SharedFrames:
+    """Frames of a stream every client receives (SSE), built and compressed once per token.
+
+    Each frame is deflated with a fresh window and sync-flushed, so the same bytes continue
+    any connection's gzip stream (see gzip_frames). That gives up matches against earlier
+    frames, which a per-connection compressor would find, for one compression per frame
+    instead of one per client. A rebuilt frame equal to the newest one is that same object,
+    so connections skip it with an identity check.
+    """
+
+    def __init__(self, max_entries: int = 4) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._frames: "OrderedDict[Any, Frame]" = OrderedDict()
+
+    def get(self, token: Any, build: Callable[[], str]) -> Frame:
+        with self._lock:
+            frame = self._frames.get(token)
+            if frame is not None:
+                return frame
+            raw = build().encode("utf-8")
+            newest = next(reversed(self._frames.values()), None)
+            if newest is not None and newest.raw == raw:
+                frame = newest
+            else:
+                z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -15)
+                frame = Frame(raw, z.compress(raw) + z.flush(zlib.Z_SYNC_FLUSH))
+            self._frames[token] = frame
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+            return frame
+
+
+# gzip member header (no name, mtime 0) and the final empty deflate block that closes the body
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+_DEFLATE_END = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -15).flush()
+
+
+class GzipFrames:
+    """One gzip member per connection around shared deflated frames; only the CRC is per client."""
+
+    def __init__(self) -> None:
+        self._started = False
+        self._crc = 0
+        self._size = 0
+
+    def chunk(self, frame: Frame) -> bytes:
+        self._crc = zlib.crc32(frame.raw, self._crc)
+        self._size += len(frame.raw)
+        if self._started:
+            return frame.deflated
+        self._started = True
+        return _GZIP_HEADER + frame.deflated
+
+    def close(self) -> bytes:
+        head = b"" if self._started else _GZIP_HEADER
+        return head + _DEFLATE_END + struct.pack("<II", self._crc, self._size & 0xFFFFFFFF)
+
+
+def gzip_frames(frames: Iterable[Frame]) -> Iterator[bytes]:
+    """Gzip a stream of shared frames with one GzipFrames per connection."""
+    z = GzipFrames()
+    for frame in frames:
+        yield z.chunk(frame)
+    yield z.close()
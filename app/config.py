@@ -5,6 +5,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _pool_profile(name: str, default: str):
+    size, overflow, timeout = (os.getenv(name) or default).split(",")
+    return int(size), int(overflow), float(timeout)
+
+
 class Settings:
     def __init__(self) -> None:
         self.flask_env = os.getenv("FLASK_ENV", "production")
@@ -19,10 +24,57 @@ class Settings:
         self.poll_interval_seconds = int(os.getenv("POLL_INTERVAL_SECONDS", "5"))
         self.enrichment_enabled = os.getenv("ENRICHMENT_ENABLED", "true").lower() == "true"
 
+        # session_snapshots retention, opt-in: rows older than N days move to gzip CSV archives (0 keeps
+        # everything in Postgres). The archive dir must be storage the web processes can read too
+        self.snapshot_retention_days = int(os.getenv("SNAPSHOT_RETENTION_DAYS", "0"))
+        self.snapshot_archive_dir = os.getenv("SNAPSHOT_ARCHIVE_DIR", "archive/session_snapshots")
+        self.retention_interval_seconds = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+        self.retention_batch_size = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+        self.retention_batch_pause_seconds = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.5"))
+        self.retention_max_batches = int(os.getenv("RETENTION_MAX_BATCHES", "200"))
+
+        # Leaderboards: entries kept per metric/window and how long web processes reuse a loaded document
+        self.leaderboard_size = int(os.getenv("LEADERBOARD_SIZE", "100"))
+        self.leaderboard_cache_seconds = int(os.getenv("LEADERBOARD_CACHE_SECONDS", "30"))
+
+        # site_presence writes: buffered heartbeats are flushed every N seconds, and last_seen_at is
+        # only moved forward once it is at least PRESENCE_STALE_SECONDS old
+        self.presence_flush_seconds = float(os.getenv("PRESENCE_FLUSH_SECONDS", "1"))
+        self.presence_stale_seconds = int(os.getenv("PRESENCE_STALE_SECONDS", "60"))
+
         self.assets_storage = os.getenv("ASSETS_STORAGE", "file")
         self.assets_cdn_base = os.getenv("ASSETS_CDN_BASE", "")
 
         self.database_url = os.getenv("DATABASE_URL")
+        # Optional streaming replica for read-only endpoints; bypassed while its replay lag exceeds
+        # DB_READ_MAX_LAG_SECONDS (checked every DB_READ_LAG_CHECK_SECONDS) or it is unreachable
+        self.database_read_url = os.getenv("DATABASE_READ_URL")
+        self.db_read_max_lag_seconds = float(os.getenv("DB_READ_MAX_LAG_SECONDS", "10"))
+        self.db_read_lag_check_seconds = float(os.getenv("DB_READ_LAG_CHECK_SECONDS", "5"))
+        # Session-level work (the migration lock) needs a real server connection; set this to the
+        # database itself when DATABASE_URL points at a transaction-pooling PgBouncer
+        self.database_direct_url = os.getenv("DATABASE_DIRECT_URL") or self.database_url
+        # Green database mode for eventlet processes: psycopg waits yield to the hub instead of
+        # blocking it ("auto" = when eventlet has monkey-patched select)
+        self.db_green = os.getenv("DB_GREEN", "auto").lower()
+        # Connection pool per process role, "size,max_overflow,timeout_seconds". "auto" picks sse
+        # under eventlet (more queries in flight per process) and web otherwise; the worker and
+        # `python -m app.migrate` set their own role, and migrations use no pool at all
+        self.db_role = os.getenv("DB_ROLE", "auto").lower()
+        self.db_pools = {
+            "web": _pool_profile("DB_POOL_WEB", "5,5,30"),
+            "sse": _pool_profile("DB_POOL_SSE", "10,10,10"),
+            "worker": _pool_profile("DB_POOL_WORKER", "3,2,30"),
+        }
+        # Checkouts ping the server only when the connection sat idle longer than this; pooled
+        # connections are replaced after DB_POOL_RECYCLE_SECONDS
+        self.db_stale_seconds = float(os.getenv("DB_STALE_SECONDS", "30"))
+        self.db_pool_recycle_seconds = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+        # DATABASE_URL is a PgBouncer in transaction pooling mode: no server-side prepared statements
+        self.db_pgbouncer = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+        # Schema migrations normally run once per deploy (`python -m app.migrate`); set to also
+        # apply them at process start (they serialize on an advisory lock)
+        self.migrate_on_boot = os.getenv("MIGRATE_ON_BOOT", "false").lower() == "true"
         self.redis_url = os.getenv("REDIS_URL")
 
         self.steam_api_key = os.getenv("STEAM_API_KEY", "")
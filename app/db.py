@@ -1,21 +1,339 @@
 from __future__ import annotations
 
 import contextlib
-from typing import Iterator
+import functools
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy import exc as sqla_exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 
 from app.config import settings
 
 
-engine = create_engine(settings.database_url, pool_pre_ping=True, pool_size=5, max_overflow=5, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+def green_mode() -> bool:
+    if settings.db_green != "auto":
+        return settings.db_green == "true"
+    patcher = sys.modules.get("eventlet.patcher")
+    return bool(patcher and patcher.is_monkey_patched("select"))
+
+
+def use_green_wait() -> None:
+    """Make psycopg wait on sockets through select.select, which eventlet turns cooperative.
+
+    psycopg only notices gevent's monkey patching; under eventlet it keeps its C wait loop,
+    a blocking poll() that stalls every greenlet in the process for the length of a query.
+    """
+    import psycopg.waiting
+    psycopg.waiting.wait = psycopg.waiting.wait_select
+
+
+GREEN = green_mode()
+if GREEN:
+    use_green_wait()
+
+
+class PoolStats:
+    """Checkout counters for one engine, served by /admin/tools/db/pool."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.stale_pings = 0
+        self.invalidated = 0
+        self.timeouts = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.wait_max_seconds = 0.0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds += seconds
+            self.wait_max_seconds = max(self.wait_max_seconds, seconds)
+            if seconds >= 0.001:
+                self.waited += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "stale_pings": self.stale_pings,
+                "invalidated": self.invalidated,
+                "timeouts": self.timeouts,
+                "waited": self.waited,
+                "wait_ms_total": round(self.wait_seconds * 1000, 1),
+                "wait_ms_max": round(self.wait_max_seconds * 1000, 1),
+            }
+
+
+pool_stats = PoolStats()
+replica_pool_stats = PoolStats()
+
+
+def _timed_pool(stats: PoolStats):
+    class TimedQueuePool(QueuePool):
+        # Time spent getting a connection: queueing behind other checkouts, or opening an overflow one
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except sqla_exc.TimeoutError:
+                stats.add(timeouts=1)
+                raise
+            finally:
+                stats.wait(time.perf_counter() - started)
+
+    return TimedQueuePool
+
+
+def _watch(engine, stats: PoolStats) -> None:
+    """Count pool events and replace pre-ping with a ping after DB_STALE_SECONDS of idleness.
+
+    A connection returned a moment ago is handed out without a round trip; one that sat in
+    the pool long enough for a server or proxy timeout to close it is pinged first, and a
+    failed ping makes the pool discard it and try the next one.
+    """
+    stale_after = settings.db_stale_seconds
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, record):
+        stats.add(connects=1)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, record):
+        record.info["idle_since"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, record, proxy):
+        stats.add(checkouts=1)
+        idle_since = record.info.pop("idle_since", None)
+        if dbapi_connection.closed:
+            raise sqla_exc.DisconnectionError("connection closed while pooled")
+        if idle_since is not None and time.monotonic() - idle_since > stale_after:
+            stats.add(stale_pings=1)
+            try:
+                engine.dialect.do_ping(dbapi_connection)
+            except Exception as ex:
+                raise sqla_exc.DisconnectionError(f"stale connection: {ex}") from ex
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, record, exception):
+        stats.add(invalidated=1)
+
+
+def process_role() -> str:
+    if settings.db_role != "auto":
+        return settings.db_role
+    return "sse" if GREEN else "web"
+
+
+def create_role_engine(role: str, url: Optional[str] = None, stats: PoolStats = pool_stats):
+    """Engine for a process role: its pool profile, and PgBouncer-safe connect options."""
+    connect_args = {}
+    if settings.db_pgbouncer:
+        # Transaction pooling hands each transaction to any server connection: psycopg's
+        # automatic prepared statements would not exist on the next one
+        connect_args["prepare_threshold"] = None
+    if role == "migrate":
+        return create_engine(settings.database_direct_url, poolclass=NullPool, connect_args=connect_args)
+    size, overflow, timeout = settings.db_pools[role]
+    engine = create_engine(
+        url or settings.database_url, poolclass=_timed_pool(stats), connect_args=connect_args,
+        pool_size=size, max_overflow=overflow, pool_timeout=timeout,
+        pool_recycle=settings.db_pool_recycle_seconds,
+    )
+    _watch(engine, stats)
+    return engine
+
+
+_role: Optional[str] = None
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def configure(role: str) -> None:
+    """Pick the pool profile before the first query (the worker and the migration CLI)."""
+    global _role
+    if _engine is not None and role != _role:
+        print(f"[db] engine already created for role {_role}; ignoring role {role}", flush=True)
+        return
+    _role = role
+
+
+def get_engine():
+    global _engine, _role
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _role = _role or process_role()
+                _engine = create_role_engine(_role)
+    return _engine
+
+
+_read_engine = None
+
+
+def get_read_engine():
+    """Engine on DATABASE_READ_URL with the process role's pool profile (None without a replica)."""
+    global _read_engine
+    if _read_engine is None and settings.database_read_url:
+        with _engine_lock:
+            if _read_engine is None:
+                _read_engine = create_role_engine(_role or process_role(), settings.database_read_url, replica_pool_stats)
+    return _read_engine
+
+
+class ReplicaGuard:
+    """Whether read-only sessions may use the replica: it answers and its replay lag is at most
+    DB_READ_MAX_LAG_SECONDS. Measured at most every DB_READ_LAG_CHECK_SECONDS per process."""
+
+    LAG_SQL = """
+        SELECT CASE
+          WHEN NOT pg_is_in_recovery() THEN 0
+          WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+          ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self.usable = False
+        self.lag_seconds: Optional[float] = None
+        self.routed = 0
+        self.fallbacks = 0
+
+    def check(self) -> bool:
+        engine = get_read_engine()
+        if engine is None:
+            return False
+        if time.monotonic() - self._checked_at < settings.db_read_lag_check_seconds:
+            return self.usable
+        with self._lock:
+            if time.monotonic() - self._checked_at < settings.db_read_lag_check_seconds:
+                return self.usable
+            try:
+                with engine.connect() as conn:
+                    lag = conn.execute(text(self.LAG_SQL)).scalar()
+                self.lag_seconds = float(lag) if lag is not None else None
+                usable = self.lag_seconds is not None and self.lag_seconds <= settings.db_read_max_lag_seconds
+                reason = f"lag {self.lag_seconds}s"
+            except Exception as ex:
+                self.lag_seconds = None
+                usable = False
+                reason = f"error: {ex}"
+            if usable != self.usable:
+                print(f"[db] replica {'in use' if usable else 'bypassed'} ({reason})", flush=True)
+            self.usable = usable
+            self._checked_at = time.monotonic()
+        return self.usable
+
+    def route(self) -> Optional[Any]:
+        """The read engine when the replica is usable, else None (use the primary)."""
+        if get_read_engine() is None:
+            return None
+        if self.check():
+            self.routed += 1
+            return get_read_engine()
+        self.fallbacks += 1
+        return None
+
+
+replica_guard = ReplicaGuard()
+
+
+def pool_metrics() -> Dict[str, Any]:
+    out: Dict[str, Any] = {"role": _role or process_role(), "pgbouncer": settings.db_pgbouncer}
+    out.update(_engine_metrics(get_engine(), pool_stats))
+    read_engine = get_read_engine()
+    if read_engine is not None:
+        replica_guard.check()
+        out["replica"] = dict(
+            _engine_metrics(read_engine, replica_pool_stats),
+            usable=replica_guard.usable, lag_seconds=replica_guard.lag_seconds,
+            routed=replica_guard.routed, fallbacks=replica_guard.fallbacks,
+        )
+    return out
+
+
+def _engine_metrics(engine, stats: PoolStats) -> Dict[str, Any]:
+    pool = engine.pool
+    out: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        out.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    out.update(stats.snapshot())
+    return out
+
+
+def __getattr__(name: str) -> Any:
+    # `engine` is built on first use so entry points can configure() the role first
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
+
+
+SessionLocal = sessionmaker(autoflush=False, autocommit=False, future=True)
+
+
+# Connection that session_scope() binds to instead of the engine, set by bound_sessions()
+_bind: ContextVar[Optional[Any]] = ContextVar("session_bind", default=None)
+# Set by @read_replica: session_scope() defaults to read_only=True inside the handler
+_read_only: ContextVar[bool] = ContextVar("session_read_only", default=False)
+
+
+def read_replica(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Mark a read-only handler: the store calls it makes may be served by the replica."""
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+@contextlib.contextmanager
+def bound_sessions(conn) -> Iterator[None]:
+    """Run store code on `conn`, e.g. the sync facade an AsyncConnection.run_sync() hands out."""
+    token = _bind.set(conn)
+    try:
+        yield
+    finally:
+        _bind.reset(token)
+
+
+def read_snapshot(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Like @read_replica, but every store call fn makes shares one REPEATABLE READ transaction,
+    so the reads are routed once and see the same snapshot."""
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with session_scope(read_only=True) as db:
+            with bound_sessions(db.connection(execution_options={"isolation_level": "REPEATABLE READ"})):
+                return fn(*args, **kwargs)
+    return wrapper
 
 
 @contextlib.contextmanager
-def session_scope() -> Iterator:
-    session = SessionLocal()
+def session_scope(read_only: Optional[bool] = None) -> Iterator:
+    """Session in a transaction; read_only sessions go to DATABASE_READ_URL while the replica
+    keeps up (see ReplicaGuard) and to the primary otherwise."""
+    bind = _bind.get()
+    if bind is None and (read_only if read_only is not None else _read_only.get()):
+        bind = replica_guard.route()
+    session = SessionLocal(bind=bind if bind is not None else get_engine())
     try:
         yield session
         session.commit()
@@ -6,6 +6,7 @@ import requests
 from app.config import settings
 from app.db import session_scope
 from app.models import Level, Mod
+from app.records import NormalizedSession
 from app.assets import mirror_asset
 
 
@@ -31,7 +32,7 @@ def fetch_getdata(map_file: str, mod_id: str, timeout: float = 8.0) -> Optional[
         return None
 
 
-def enrich_sessions_levels(sessions: Iterable[Dict]) -> Dict[str, int]:
+def enrich_sessions_levels(sessions: Iterable[NormalizedSession]) -> Dict[str, int]:
     """Fetch getdata for unique (mod,map) pairs and upsert level/mod names/images.
 
     Returns counts for logging.
@@ -46,8 +47,8 @@ def enrich_sessions_levels(sessions: Iterable[Dict]) -> Dict[str, int]:
 
     with session_scope() as db:
         for s in sessions:
-            mod_id = s.get("mod")
-            map_file = s.get("map_file")
+            mod_id = s.mod
+            map_file = s.map_file
             if not mod_id or not map_file:
                 continue
             # Use lowercase map id for getdata parity with reference implementation
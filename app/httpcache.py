@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from app.compress import MIN_COMPRESS_BYTES, compress, negotiate
+from app.jsoncodec import dumps
+
+
+_MAX_ENTRIES = 512
+
+
+def strong_etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class _Entry(NamedTuple):
+    token: Any
+    expires: float
+    etag: str
+    body: bytes
+    variants: Dict[str, bytes]  # content-encoding -> compressed body, filled on first request for it
+
+
+class ResponseCache:
+    """Serialised JSON bodies for public read endpoints, with strong ETags and Cache-Control.
+
+    An entry is reused while its token matches (e.g. the current tick version) or, for
+    endpoints without one, until its TTL runs out. Conditional requests that match the
+    entry's ETag get a 304 straight from memory. Bodies are compressed once per entry and
+    encoding (br/gzip, negotiated per request); each encoding carries its own ETag.
+    """
+
+    def __init__(self, max_entries: int = _MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, _Entry] = {}
+
+    def lookup(self, key: Hashable, token: Any = None) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if token is not None:
+            return entry if entry.token == token else None
+        return entry if entry.expires > time.monotonic() else None
+
+    def put(self, key: Hashable, value: Any, max_age: int, token: Any = None, raw: bool = False) -> _Entry:
+        """Store a freshly built payload; raw values are already-serialised JSON."""
+        if raw:
+            body = value.encode("utf-8") if isinstance(value, str) else value
+        else:
+            body = dumps(value) + b"\n"
+        entry = _Entry(token, time.monotonic() + max_age, strong_etag(body), body, {})
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def variant(entry: _Entry, accept_encodings) -> Tuple[Optional[str], str, bytes]:
+        """(content-encoding, etag, body) for a werkzeug Accept-Encoding header object."""
+        encoding = negotiate(accept_encodings) if len(entry.body) >= MIN_COMPRESS_BYTES else None
+        if not encoding:
+            return None, entry.etag, entry.body
+        body = entry.variants.get(encoding)
+        if body is None:
+            body = compress(entry.body, encoding)
+            entry.variants[encoding] = body
+        return encoding, f"{entry.etag}-{'br' if encoding == 'br' else 'gz'}", body
+
+    def respond(self, key: Hashable, build: Callable[[], Any], max_age: int, token: Any = None, raw: bool = False):
+        """Serve key's cached body, building it when stale; raw builders return already-serialised JSON."""
+        from flask import Response, request
+        entry = self.lookup(key, token) or self.put(key, build(), max_age, token, raw)
+        encoding, etag, body = self.variant(entry, request.accept_encodings)
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = Response(body, mimetype="application/json")
+            if encoding:
+                resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = f"public, max-age={max(0, int(max_age))}"
+        resp.vary.add("Accept-Encoding")
+        return resp
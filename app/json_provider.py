@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+from flask import Response
+from flask.json.provider import JSONProvider
+
+from app import jsoncodec
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by app.jsoncodec (orjson/msgspec when installed).
+
+    Output is compact with sorted keys, like Flask's default, but datetimes are ISO 8601
+    instead of HTTP dates. Calls that pass stdlib-only options (indent etc.) go through
+    the stdlib encoder.
+    """
+
+    mimetype = "application/json"
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            kwargs.setdefault("default", jsoncodec.json_default)
+            kwargs.setdefault("sort_keys", True)
+            return json.dumps(obj, **kwargs)
+        return jsoncodec.dumps_str(obj)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return jsoncodec.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self.raw_response(jsoncodec.dumps(obj) + b"\n")
+
+    def raw_response(self, body: Union[bytes, str], status: int = 200) -> Response:
+        """Wrap an already-encoded JSON document without re-serialising it."""
+        return self._app.response_class(body, status=status, mimetype=self.mimetype)
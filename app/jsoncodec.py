@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import datetime as _dt
+import decimal
+import json
+import uuid
+from typing import Any, Callable, Union
+
+# Framework-free JSON encode/decode used by the Flask provider, the SSE stream and the
+# precomputed documents. Picks the fastest installed backend: orjson, then msgspec, then
+# the stdlib. Keys are sorted (matching Flask's default provider) so payloads and their
+# ETags stay stable. Datetimes are emitted as ISO 8601 by every backend; msgspec writes
+# UTC offsets as "Z" rather than "+00:00".
+
+
+def json_default(o: Any) -> Any:
+    if isinstance(o, (_dt.datetime, _dt.date, _dt.time)):
+        return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, default=json_default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+dumps: Callable[[Any], bytes]
+loads: Callable[[Union[bytes, str]], Any]
+
+try:
+    import orjson  # type: ignore
+
+    _ORJSON_OPTS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTS)
+
+    loads = orjson.loads
+    BACKEND = "orjson"
+except ImportError:  # pragma: no cover - depends on installed extras
+    try:
+        import msgspec  # type: ignore
+
+        _encoder = msgspec.json.Encoder(enc_hook=json_default, order="sorted")
+        _decoder = msgspec.json.Decoder()
+
+        def dumps(obj: Any) -> bytes:
+            return _encoder.encode(obj)
+
+        def loads(data: Union[bytes, str]) -> Any:
+            return _decoder.decode(data)
+
+        BACKEND = "msgspec"
+    except ImportError:
+        dumps = _stdlib_dumps
+        loads = json.loads
+        BACKEND = "json"
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
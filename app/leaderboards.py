@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import settings
+from app.db import session_scope
+from app.jsoncodec import dumps_str, loads
+from app.models import Identity, LeaderboardDoc, Player, PlayerName, PlayerSession, PlayerStat, PlayerStatDaily, Session
+
+
+# Window name -> number of UTC days summed from player_stats_daily (None reads the all-time table)
+WINDOWS: Dict[str, Optional[int]] = {"1d": 1, "7d": 7, "30d": 30, "all": None}
+METRICS = ("games", "kills", "deaths", "score", "play_time")
+_COUNTERS = ("games", "kills", "deaths", "score", "play_seconds")
+
+
+def _metric_column(metric: str) -> str:
+    return "play_seconds" if metric == "play_time" else metric
+
+
+def _top_key(counts: Optional[Dict[str, int]]) -> Optional[str]:
+    if not counts:
+        return None
+    return max(counts.items(), key=lambda kv: (kv[1], kv[0]))[0]
+
+
+def roll_up_ended_sessions(db, session_ids: Iterable[str], now: datetime) -> int:
+    """Fold the participation stints of just-ended sessions into player_stats and player_stats_daily.
+
+    Runs inside save_sessions' transaction. Each stint is counted once (rolled_up flag);
+    a revived session contributes its new stints when it ends again. Returns players touched.
+    """
+    session_ids = list(session_ids)
+    if not session_ids:
+        return 0
+    rows = db.execute(
+        select(PlayerSession, Session.map_file, Session.mod_id)
+        .join(Session, Session.id == PlayerSession.session_id)
+        .where(PlayerSession.session_id.in_(session_ids), PlayerSession.rolled_up.is_(False))
+    ).all()
+    if not rows:
+        return 0
+
+    # In-game counters are per match, so a player who rejoined a session is counted from their
+    # highest reading rather than summing stints; play time does sum across stints.
+    per_game: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for ps, map_file, mod_id in rows:
+        g = per_game.setdefault((ps.steam_id, ps.session_id), {
+            "kills": 0, "deaths": 0, "score": 0, "play_seconds": 0,
+            "map_file": map_file, "mod_id": mod_id, "last_seen_at": ps.last_seen_at,
+        })
+        g["kills"] = max(g["kills"], ps.kills or 0)
+        g["deaths"] = max(g["deaths"], ps.deaths or 0)
+        g["score"] = max(g["score"], ps.score or 0)
+        if ps.first_seen_at and ps.last_seen_at:
+            g["play_seconds"] += max(0, int((ps.last_seen_at - ps.first_seen_at).total_seconds()))
+        if ps.last_seen_at and (g["last_seen_at"] is None or ps.last_seen_at > g["last_seen_at"]):
+            g["last_seen_at"] = ps.last_seen_at
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    for (steam_id, _sid), g in per_game.items():
+        t = totals.setdefault(steam_id, {k: 0 for k in _COUNTERS} | {"maps": {}, "mods": {}, "last_played_at": None})
+        t["games"] += 1
+        for k in ("kills", "deaths", "score", "play_seconds"):
+            t[k] += g[k]
+        if g["map_file"]:
+            t["maps"][g["map_file"]] = t["maps"].get(g["map_file"], 0) + 1
+        if g["mod_id"]:
+            t["mods"][g["mod_id"]] = t["mods"].get(g["mod_id"], 0) + 1
+        if g["last_seen_at"] and (t["last_played_at"] is None or g["last_seen_at"] > t["last_played_at"]):
+            t["last_played_at"] = g["last_seen_at"]
+
+    existing = {r.steam_id: r for r in db.scalars(select(PlayerStat).where(PlayerStat.steam_id.in_(totals.keys())))}
+    for steam_id, t in totals.items():
+        stat = existing.get(steam_id)
+        if stat is None:
+            stat = PlayerStat(steam_id=steam_id, games=0, kills=0, deaths=0, score=0, play_seconds=0, map_counts={}, mod_counts={})
+            db.add(stat)
+        for k in _COUNTERS:
+            setattr(stat, k, (getattr(stat, k) or 0) + t[k])
+        # JSON columns are not mutation-tracked; assign fresh dicts
+        maps = dict(stat.map_counts or {})
+        for k, v in t["maps"].items():
+            maps[k] = maps.get(k, 0) + v
+        mods = dict(stat.mod_counts or {})
+        for k, v in t["mods"].items():
+            mods[k] = mods.get(k, 0) + v
+        stat.map_counts = maps
+        stat.mod_counts = mods
+        if t["last_played_at"] and (stat.last_played_at is None or t["last_played_at"] > stat.last_played_at):
+            stat.last_played_at = t["last_played_at"]
+
+    ins = pg_insert(PlayerStatDaily).values([
+        {"steam_id": steam_id, "day": now.date(), **{k: t[k] for k in _COUNTERS}} for steam_id, t in totals.items()
+    ])
+    db.execute(ins.on_conflict_do_update(
+        index_elements=[PlayerStatDaily.steam_id, PlayerStatDaily.day],
+        set_={k: getattr(PlayerStatDaily, k) + getattr(ins.excluded, k) for k in _COUNTERS},
+    ))
+    db.execute(
+        update(PlayerSession)
+        .where(PlayerSession.id.in_([ps.id for ps, _m, _d in rows]))
+        .values(rolled_up=True)
+        .execution_options(synchronize_session=False)
+    )
+    return len(totals)
+
+
+def _top(rows: List[Dict[str, Any]], col: str, size: int) -> List[Dict[str, Any]]:
+    # Highest value first, ties broken by steam id so refreshes produce stable orderings
+    return heapq.nsmallest(size, (r for r in rows if r[col]), key=lambda r: (-int(r[col]), r["steam_id"]))
+
+
+def _window_totals(db, days: Optional[int], today: date) -> List[Dict[str, Any]]:
+    if days is None:
+        q = select(PlayerStat.steam_id, *(getattr(PlayerStat, k) for k in _COUNTERS))
+    else:
+        q = (
+            select(PlayerStatDaily.steam_id, *(func.sum(getattr(PlayerStatDaily, k)).label(k) for k in _COUNTERS))
+            .where(PlayerStatDaily.day > today - timedelta(days=days))
+            .group_by(PlayerStatDaily.steam_id)
+        )
+    return [dict(r._mapping) for r in db.execute(q)]
+
+
+def _build_document(window: str, rows: List[Dict[str, Any]], profiles: Dict[str, Dict[str, Any]], size: int, now: datetime) -> Dict[str, Any]:
+    metrics: Dict[str, List[Dict[str, Any]]] = {}
+    for metric in METRICS:
+        col = _metric_column(metric)
+        entries = []
+        for i, r in enumerate(_top(rows, col, size), start=1):
+            entries.append({"rank": i, "steam_id": r["steam_id"], "value": int(r[col]), "games": int(r["games"] or 0), **profiles.get(r["steam_id"], {})})
+        metrics[metric] = entries
+    return {"window": window, "computed_at": now.isoformat(), "metrics": metrics}
+
+
+def refresh_leaderboards(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Recompute every window's top-N lists and store them pre-serialised in the leaderboards table."""
+    now = now or datetime.utcnow()
+    size = max(1, settings.leaderboard_size)
+    out: Dict[str, int] = {}
+    with session_scope() as db:
+        per_window = {w: _window_totals(db, days, now.date()) for w, days in WINDOWS.items()}
+        # Candidate ids are only the ones that can make a list; profiles are fetched for those alone
+        ranked: set[str] = set()
+        for rows in per_window.values():
+            for metric in METRICS:
+                ranked.update(r["steam_id"] for r in _top(rows, _metric_column(metric), size))
+        profiles: Dict[str, Dict[str, Any]] = {}
+        if ranked:
+            for steam_id, name in db.execute(select(PlayerName.steam_id, PlayerName.name).where(PlayerName.steam_id.in_(ranked))):
+                profiles.setdefault(steam_id, {})["name"] = name
+            for steam_id, nickname, avatar in db.execute(
+                select(Identity.external_id, Player.display_name, Player.avatar_url)
+                .join(Player, Identity.player_id == Player.id)
+                .where(Identity.provider == "steam", Identity.external_id.in_(ranked))
+            ):
+                p = profiles.setdefault(steam_id, {})
+                if nickname:
+                    p["nickname"] = nickname
+                if avatar:
+                    p["avatar"] = avatar
+            for steam_id, maps, mods in db.execute(
+                select(PlayerStat.steam_id, PlayerStat.map_counts, PlayerStat.mod_counts).where(PlayerStat.steam_id.in_(ranked))
+            ):
+                p = profiles.setdefault(steam_id, {})
+                p["favorite_map"] = _top_key(maps)
+                p["favorite_mod"] = _top_key(mods)
+        for window, rows in per_window.items():
+            doc = _build_document(window, rows, profiles, size, now)
+            body = dumps_str(doc)
+            ins = pg_insert(LeaderboardDoc).values(window=window, body=body, computed_at=now)
+            db.execute(ins.on_conflict_do_update(
+                index_elements=[LeaderboardDoc.window],
+                set_={"body": ins.excluded.body, "computed_at": ins.excluded.computed_at},
+            ))
+            out[window] = len(rows)
+    return out
+
+
+class LeaderboardCache:
+    """Per-process cache of leaderboard documents and the serialised slices served from them.
+
+    A window's row is re-read at most every LEADERBOARD_CACHE_SECONDS; slices are keyed on the
+    document's computed_at so they are rebuilt only when the worker publishes a new one.
+    """
+
+    def __init__(self, ttl_seconds: int) -> None:
+        self.ttl = max(0, ttl_seconds)
+        self._lock = threading.Lock()
+        self._docs: Dict[str, Tuple[float, Optional[str], Optional[str], Optional[Dict[str, Any]]]] = {}
+        self._slices: Dict[Tuple[str, str, int], Tuple[Optional[str], str]] = {}
+
+    def _load(self, window: str) -> Tuple[Optional[str], Optional[str], Optional[Dict[str, Any]]]:
+        with self._lock:
+            hit = self._docs.get(window)
+        if hit is not None and time.monotonic() - hit[0] < self.ttl:
+            return hit[1], hit[2], hit[3]
+        with session_scope() as db:
+            row = db.get(LeaderboardDoc, window)
+            body = row.body if row else None
+        version = None
+        doc = None
+        if body is not None:
+            doc = loads(body)
+            version = doc.get("computed_at")
+        with self._lock:
+            self._docs[window] = (time.monotonic(), version, body, doc)
+        return version, body, doc
+
+    def document(self, window: str) -> str:
+        """The stored document for a window, as-is."""
+        _version, body, _doc = self._load(window)
+        if body is None:
+            return dumps_str({"window": window, "computed_at": None, "metrics": {m: [] for m in METRICS}})
+        return body
+
+    def slice(self, window: str, metric: str, limit: int) -> str:
+        """Serialised top-`limit` entries for one metric."""
+        version, _body, doc = self._load(window)
+        key = (window, metric, limit)
+        with self._lock:
+            hit = self._slices.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        items = ((doc or {}).get("metrics") or {}).get(metric) or []
+        payload = dumps_str({"window": window, "metric": metric, "computed_at": version, "items": items[:limit]})
+        with self._lock:
+            self._slices[key] = (version, payload)
+        return payload
+
+
+leaderboard_cache = LeaderboardCache(settings.leaderboard_cache_seconds)
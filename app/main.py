@@ -1,33 +1,101 @@
 from flask import Flask, jsonify, request, Response, stream_with_context, render_template, redirect, session
-import json
 import time
 import secrets
 from app.store import get_current_sessions, get_session_detail, get_history_summary, get_maps_summary, get_mods_summary
-from app.store import get_mod_catalog
-from app.migrate import create_all, ensure_alter_tables
+from app.store import get_mod_catalog, get_player_history, get_current_sessions_version
+from app.migrate import migrate, verify_schema
 from app.config import settings
 from flask_socketio import SocketIO
 import os
 
 
 socketio: SocketIO | None = None
+# Sidebar presence snapshot (app.presence_snapshot), set up by create_app
+presence_snapshots = None
+
+# A Team Picker participant counts as active if their last presence ping is this recent
+TEAM_PICK_ACTIVE_SECONDS = 20
+
+# Socket.IO sid -> "provider:external_id" for signed-in connections handled by this process
+_SOCKET_UIDS: dict[str, str] = {}
+_presence_tasks_started = False
+
+
+def _site_seen(uid: str, conn_id: str) -> None:
+    from app.presence import site_seen
+    _start_presence_tasks()
+    try:
+        site_seen(uid, conn_id)
+    except Exception as ex:
+        print(f"[presence] seen error: {ex}", flush=True)
+
+
+def _site_gone(uid: str, conn_id: str | None = None) -> None:
+    from app.presence import site_gone
+    _start_presence_tasks()
+    try:
+        site_gone(uid, conn_id)
+    except Exception as ex:
+        print(f"[presence] gone error: {ex}", flush=True)
+
+
+def _start_presence_tasks() -> None:
+    """Once per process: flush buffered site_presence writes, and push the presence
+    snapshot to clients at most once per second when it changes."""
+    global _presence_tasks_started
+    if _presence_tasks_started or socketio is None:
+        return
+    _presence_tasks_started = True
+
+    def _flush_loop() -> None:
+        from app.presence import presence_writes
+        while True:
+            socketio.sleep(settings.presence_flush_seconds)
+            try:
+                presence_writes.flush()
+            except Exception as ex:
+                print(f"[presence] flush error: {ex}", flush=True)
+
+    def _broadcast_loop() -> None:
+        from app.presence import get_presence_store
+        last = presence_snapshots.current().version
+        while True:
+            socketio.sleep(1)
+            try:
+                snap = presence_snapshots.current()
+                if snap.version == last:
+                    continue
+                # Versions are content hashes, so every web process computes the same one; the
+                # lock lets one of them send it through the shared message queue. It is keyed on
+                # the transition, since a content hash comes back when presence flips A->B->A
+                transition = f"{last}->{snap.version}"
+                last = snap.version
+                if get_presence_store().try_lock(f"presence:snapshot:{transition}", 10):
+                    socketio.emit("presence:snapshot", snap.doc)
+            except Exception as ex:
+                print(f"[presence] broadcast error: {ex}", flush=True)
+
+    socketio.start_background_task(_flush_loop)
+    socketio.start_background_task(_broadcast_loop)
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
+    from app.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
     app.config['SECRET_KEY'] = settings.secret_key
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     # Expose realtime flag to templates/JS (set by dev.ps1 -Realtime)
     app.config['REALTIME_ENABLED'] = bool(os.getenv('REALTIME'))
-    app.config['TEAM_PICK_PRESENCE'] = {}
 
-    # Ensure DB schema exists (idempotent)
+    # Verify the schema against the migration ledger (one read); DDL runs in `python -m app.migrate`
     try:
-        create_all()
-        ensure_alter_tables()
+        if settings.migrate_on_boot:
+            migrate()
+        verify_schema()
     except Exception as ex:
         # Defer hard failure to first DB access; still log to console
-        print(f"[app] schema init warning: {ex}", flush=True)
+        print(f"[app] schema check warning: {ex}", flush=True)
 
     # Initialize Socket.IO (Redis message queue for cross-process emit)
     global socketio
@@ -44,7 +112,8 @@ def create_app() -> Flask:
         def _on_join(data):  # type: ignore[no-redef]
             try:
                 room = (data or {}).get('room')
-                if isinstance(room, str) and room:
+                # Per-user rooms are joined on connect only, from the signed session
+                if isinstance(room, str) and room and not room.startswith('user:'):
                     _join_room(room)
             except Exception:
                 pass
@@ -58,6 +127,31 @@ def create_app() -> Flask:
             except Exception:
                 pass
 
+        # Site presence rides on the socket: connect/heartbeat/disconnect update the presence
+        # store, and site_presence writes go through the coalescing buffer in app.presence
+        @socketio.on('connect')
+        def _on_connect(auth=None):  # type: ignore[no-redef]
+            _start_presence_tasks()
+            uid = session.get('uid')
+            if uid:
+                from app.team_picker import user_room
+                _SOCKET_UIDS[request.sid] = uid
+                # Targeted pushes (Team Picker invites) go to every connection of the user
+                _join_room(user_room(*uid.split(":", 1)))
+                _site_seen(uid, request.sid)
+
+        @socketio.on('presence:heartbeat')
+        def _on_presence_heartbeat(data=None):  # type: ignore[no-redef]
+            uid = _SOCKET_UIDS.get(request.sid)
+            if uid:
+                _site_seen(uid, request.sid)
+
+        @socketio.on('disconnect')
+        def _on_disconnect(*_reason):  # type: ignore[no-redef]
+            uid = _SOCKET_UIDS.pop(request.sid, None)
+            if uid:
+                _site_gone(uid, request.sid)
+
     @app.get("/healthz")
     def healthz():
         return jsonify({"status": "ok"})
@@ -77,43 +171,60 @@ def create_app() -> Flask:
             "steam_api_key_present": bool(_settings.steam_api_key),
         })
 
+    @app.get("/admin/tools/db/pool")
+    def admin_db_pool():
+        from app.db import pool_metrics
+        return jsonify(pool_metrics())
+
     @app.get("/favicon.ico")
     def favicon():
         return ("", 204)
 
+    # Per-tick search index over current sessions; rebuilt only when the worker writes a new tick
+    from app.search import LiveSessions, normalize_query
+    from app.httpcache import ResponseCache
+    # Reads that tolerate replica lag (DATABASE_READ_URL) are wrapped in / decorated with @read_replica.
+    # The per-tick index loads its version and rows in one read-only snapshot, so both come from the
+    # same server; a probe answered by the other side only triggers another load
+    from app.db import read_replica, read_snapshot
+    live_sessions = LiveSessions(
+        read_snapshot(lambda: (get_current_sessions_version(), get_current_sessions())),
+        read_replica(get_current_sessions_version),
+    )
+    # Sidebar presence (site + in-game), rebuilt when the tick or the set of signed-in users changes
+    global presence_snapshots
+    from app.presence import site_online_users
+    from app.presence_snapshot import PresenceSnapshots, in_game_players
+    from app.store import get_site_profiles
+    presence_snapshots = PresenceSnapshots(live_sessions.sessions, live_sessions.version, site_online_users, get_site_profiles)
+    # Team Picker badge per live session, embedded in the session feed
+    from app.team_picker import LiveStatus, get_statuses, session_docs
+    tp_status = LiveStatus(lambda: [s.id for s in live_sessions.sessions()], live_sessions.version)
+    # Public read endpoints: bodies cached per tick (or per history bucket) and revalidated by ETag
+    http_cache = ResponseCache()
+    # SSE session feed: one encoded frame per Team Picker status token, shared by every stream
+    from app.compress import SharedFrames
+    sse_frames = SharedFrames()
+    poll_max_age = max(1, settings.poll_interval_seconds)
+    history_max_age = 60  # per-minute buckets
+    rollup_max_age = 300  # hour-window map/mod rollups and the mod catalog
+
     @app.get("/api/v1/sessions/current")
     def sessions_current():
-        # Basic filter: ?state=InGame (case-insensitive)
-        state = request.args.get("state")
-        nat_type = request.args.get("nat_type")
-        min_players = request.args.get("min_players", type=int)
-        q = request.args.get("q")
-        mod = request.args.get("mod")
-
-        sessions = get_current_sessions()
-        if state:
-            s_norm = state.strip().lower()
-            sessions = [s for s in sessions if (s.get("state") or "").lower() == s_norm]
-        if nat_type:
-            n_norm = nat_type.strip().lower()
-            sessions = [s for s in sessions if (s.get("nat_type") or "").lower() == n_norm]
-        if isinstance(min_players, int):
-            sessions = [s for s in sessions if len(s.get("players") or []) >= min_players]
-        if mod:
-            sessions = [s for s in sessions if (s.get("mod") or "") == mod]
-        if q:
-            q_norm = q.strip().lower()
-            def _match(s):
-                if (s.get("name") or "").lower().find(q_norm) >= 0:
-                    return True
-                for p in s.get("players") or []:
-                    if ((p.get("name") or "").lower().find(q_norm) >= 0):
-                        return True
-                return False
-            sessions = [s for s in sessions if _match(s)]
-        return jsonify({"sessions": sessions})
+        # Filters: ?state=InGame&nat_type=&min_players=&mod=&q= (state/nat_type/q are case-insensitive)
+        key = normalize_query(
+            request.args.get("state"),
+            request.args.get("nat_type"),
+            request.args.get("min_players", type=int),
+            request.args.get("mod"),
+            request.args.get("q"),
+        )
+        token, statuses = tp_status.current()
+        return http_cache.respond(("sessions", key), lambda: {"sessions": session_docs(live_sessions.query(key), statuses)},
+                                  poll_max_age, token=token)
 
     @app.get("/api/v1/sessions/<path:sid>")
+    @read_replica
     def session_detail(sid: str):
         data = get_session_detail(sid)
         if data is None:
@@ -123,65 +234,138 @@ def create_app() -> Flask:
     @app.get("/api/v1/stream/sessions")
     def stream_sessions():
         # Simple SSE stream with 5s updates from DB
+        from app.compress import gzip_frames, negotiate
+        from app.jsoncodec import dumps_str
+
+        def _event(statuses) -> str:
+            return f"data: {dumps_str({'sessions': session_docs(live_sessions.sessions(), statuses)})}\n\n"
+
         def _gen():
-            last_payload = None
+            last = None
             while True:
-                sessions = get_current_sessions()
-                payload = json.dumps({"sessions": sessions})
-                if payload != last_payload:
-                    yield f"data: {payload}\n\n"
-                    last_payload = payload
+                token, statuses = tp_status.current()
+                frame = sse_frames.get(token, lambda: _event(statuses))
+                if frame is not last:
+                    yield frame
+                    last = frame
                 time.sleep(5)
-        return Response(stream_with_context(_gen()), mimetype="text/event-stream")
+        # Frames are encoded once per tick for all connections; each gzip response wraps the shared bytes
+        if negotiate(request.accept_encodings, allow_br=False) == "gzip":
+            resp = Response(stream_with_context(gzip_frames(_gen())), mimetype="text/event-stream")
+            resp.headers["Content-Encoding"] = "gzip"
+        else:
+            resp = Response(stream_with_context(f.raw for f in _gen()), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.vary.add("Accept-Encoding")
+        return resp
 
     @app.get("/api/v1/history/summary")
+    @read_replica
     def history_summary():
         minutes = request.args.get("minutes", default=60, type=int)
-        return jsonify({"points": get_history_summary(minutes=minutes)})
+        return http_cache.respond(("history", minutes), lambda: {"points": get_history_summary(minutes=minutes)}, history_max_age)
 
     @app.get("/api/v1/history/maps")
+    @read_replica
     def history_maps():
         hours = request.args.get("hours", default=24, type=int)
-        return jsonify({"items": get_maps_summary(hours=hours)})
+        return http_cache.respond(("maps", hours), lambda: {"items": get_maps_summary(hours=hours)}, rollup_max_age)
 
     @app.get("/api/v1/history/mods")
+    @read_replica
     def history_mods():
         hours = request.args.get("hours", default=24, type=int)
-        return jsonify({"items": get_mods_summary(hours=hours)})
+        return http_cache.respond(("mods", hours), lambda: {"items": get_mods_summary(hours=hours)}, rollup_max_age)
+
+    @app.get("/api/v1/history/matches")
+    @read_replica
+    def history_matches():
+        from app.store import get_match_maps_summary
+        hours = request.args.get("hours", default=24, type=int)
+        return http_cache.respond(("match_maps", hours), lambda: {"items": get_match_maps_summary(hours=hours)}, history_max_age)
+
+    @app.get("/api/v1/matches")
+    @read_replica
+    def matches():
+        # ?map=<map_file>&hours=24&limit=50, newest first
+        from app.store import get_matches
+        map_file = request.args.get("map") or None
+        hours = request.args.get("hours", default=24, type=int)
+        limit = request.args.get("limit", default=50, type=int)
+        return http_cache.respond(("matches", map_file, hours, limit),
+                                  lambda: {"matches": get_matches(map_file, hours=hours, limit=limit)}, history_max_age)
 
     @app.get("/api/v1/mods")
+    @read_replica
     def mods_catalog():
-        return jsonify({"mods": get_mod_catalog()})
+        return http_cache.respond("mod_catalog", lambda: {"mods": get_mod_catalog()}, rollup_max_age)
 
     @app.get("/api/v1/players/online")
     def players_online():
+        return http_cache.respond("players_online", _online_players, poll_max_age, token=live_sessions.version())
+
+    def _online_players():
         # Derive unique players across active sessions for sidebar presence
-        sessions = get_current_sessions()
-        seen = {}
-        for s in sessions:
-            for p in s.get("players") or []:
-                key = None
-                steam = (p.get("steam") or {})
-                if steam.get("id"):
-                    key = f"steam:{steam['id']}"
-                elif p.get("name"):
-                    key = f"name:{p['name']}"
-                else:
-                    continue
-                if key not in seen:
-                    seen[key] = {
-                        "name": steam.get("nickname") or p.get("name") or "Player",
-                        "steam": {
-                            "id": steam.get("id"),
-                            "nickname": steam.get("nickname"),
-                            "avatar": steam.get("avatar"),
-                            "url": steam.get("url"),
-                        },
-                        "in_game": True,
-                    }
-        players = list(seen.values())
-        players.sort(key=lambda x: (x.get("steam", {}).get("nickname") or x.get("name") or "").lower())
-        return jsonify({"players": players})
+        return {"players": in_game_players(live_sessions.sessions())}
+
+    @app.get("/api/v1/presence/snapshot")
+    def presence_snapshot():
+        # Sidebar presence in one document. ?since=<version> long-polls (up to ?wait= seconds,
+        # max 25) until the snapshot changes; Socket.IO clients get it pushed as presence:snapshot
+        since = request.args.get("since")
+        wait = request.args.get("wait", default=25.0, type=float) if since else 0.0
+        snap = presence_snapshots.wait(since, wait)
+        return http_cache.respond("presence_snapshot", lambda: snap.body, 0, token=snap.version, raw=True)
+
+    @app.get("/api/v1/players/<steam_id>/history")
+    @read_replica
+    def player_history(steam_id: str):
+        limit = request.args.get("limit", default=20, type=int)
+        cursor = request.args.get("cursor") or None
+        try:
+            return jsonify(get_player_history(steam_id, limit=limit, cursor=cursor))
+        except ValueError:
+            return jsonify({"error": "bad_cursor"}), 400
+
+    @app.get("/api/v1/leaderboards")
+    @read_replica
+    def leaderboards():
+        from app.leaderboards import METRICS, WINDOWS, leaderboard_cache
+        window = request.args.get("window", default="all")
+        metric = request.args.get("metric")
+        if window not in WINDOWS:
+            return jsonify({"error": "bad_window", "windows": list(WINDOWS)}), 400
+        max_age = max(1, settings.leaderboard_cache_seconds)
+        if metric is None:
+            return http_cache.respond(("leaderboards", window), lambda: leaderboard_cache.document(window), max_age, raw=True)
+        if metric not in METRICS:
+            return jsonify({"error": "bad_metric", "metrics": list(METRICS)}), 400
+        limit = request.args.get("limit", default=25, type=int)
+        limit = max(1, min(settings.leaderboard_size, limit))
+        return http_cache.respond(("leaderboards", window, metric, limit),
+                                  lambda: leaderboard_cache.slice(window, metric, limit), max_age, raw=True)
+
+    # Hashed bundle from `python -m app.static_bundle`; precompressed variants, cached forever
+    from app.static_bundle import DIST_DIR, IMMUTABLE_CACHE_CONTROL, asset_url
+
+    @app.context_processor
+    def _inject_asset_url():
+        return {"asset_url": asset_url}
+
+    @app.get("/static/dist/<path:filename>")
+    def static_dist(filename: str):
+        import mimetypes
+        from flask import send_from_directory
+        from app.compress import ENCODING_SUFFIX
+        available = [e for e, suffix in ENCODING_SUFFIX.items() if os.path.isfile(os.path.join(DIST_DIR, filename + suffix))]
+        encoding = request.accept_encodings.best_match(available) if available else None
+        served = filename + ENCODING_SUFFIX[encoding] if encoding else filename
+        resp = send_from_directory(DIST_DIR, served, mimetype=mimetypes.guess_type(filename)[0])
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        resp.vary.add("Accept-Encoding")
+        return resp
 
     @app.get("/")
     def index():
@@ -235,13 +419,11 @@ def create_app() -> Flask:
 
     @app.post("/auth/logout")
     def auth_logout():
+        uid = session.get('uid')
         session.clear()
-        # notify presence update
-        try:
-            if socketio:
-                socketio.emit("presence:update", {"action": "logout"}, broadcast=True)
-        except Exception:
-            pass
+        # Drops every connection of the user; the presence broadcaster reports them offline
+        if uid:
+            _site_gone(uid)
         return jsonify({"ok": True})
 
     @app.get("/api/v1/me")
@@ -275,20 +457,13 @@ def create_app() -> Flask:
                         db.flush()
                 except Exception:
                     pass
-            # Secondary fallback: derive name from most recent in-game session record
+            # Secondary fallback: last in-game name seen for this Steam id
             if provider == "steam" and player and not player.display_name:
                 try:
-                    from sqlalchemy import text as _text
-                    r = db.execute(_text(
-                        """
-                        SELECT stats->>'name' AS name
-                        FROM session_players
-                        WHERE stats->>'steam_id' = :e
-                        ORDER BY id DESC LIMIT 1
-                        """
-                    ), {"e": external_id}).first()
-                    if r and r[0]:
-                        player.display_name = r[0]
+                    from app.models import PlayerName
+                    pn = db.get(PlayerName, external_id)
+                    if pn and pn.name:
+                        player.display_name = pn.name
                         db.flush()
                 except Exception:
                     pass
@@ -325,198 +500,62 @@ def create_app() -> Flask:
         uid = session.get('uid')
         if not uid:
             return jsonify({"ok": False, "error": "not_authenticated"}), 401
-        provider, external_id = uid.split(":", 1)
-        from app.db import session_scope
-        from app.models import SitePresence
-        from sqlalchemy import text as _text
-        with session_scope() as db:
-            # upsert via SQL for simplicity
-            db.execute(_text(
-                """
-                INSERT INTO site_presence(provider, external_id, last_seen_at)
-                VALUES (:p, :e, now())
-                ON CONFLICT DO NOTHING;
-                """
-            ), {"p": provider, "e": external_id})
-            db.execute(_text(
-                """
-                UPDATE site_presence SET last_seen_at = now()
-                WHERE provider = :p AND external_id = :e
-                """
-            ), {"p": provider, "e": external_id})
-        try:
-            if socketio:
-                socketio.emit("presence:update", {"provider": provider, "id": external_id}, broadcast=True)
-        except Exception:
-            pass
+        # Fallback for clients without a realtime socket; counts as one long-lived "http" connection
+        _site_seen(uid, "http")
         return jsonify({"ok": True})
 
     @app.get("/api/v1/players/site-online")
     def players_site_online():
-        # list users with recent heartbeats (last 20s) for snappier presence
-        from datetime import timedelta, datetime
-        cutoff = datetime.utcnow() - timedelta(seconds=20)
-        from app.db import session_scope
-        from app.models import SitePresence, Identity, Player
-        from sqlalchemy import select as _select
-        with session_scope() as db:
-            rows = db.execute(
-                _select(SitePresence, Identity, Player)
-                .where(SitePresence.last_seen_at >= cutoff)
-                .join(Identity, (Identity.provider == SitePresence.provider) & (Identity.external_id == SitePresence.external_id), isouter=True)
-                .join(Player, Identity.player_id == Player.id, isouter=True)
-            ).all()
-            out = []
-            for pr, ident, player in rows:
-                # If display name missing, derive from last seen session
-                display_name = player.display_name if player else None
-                avatar_url = player.avatar_url if player else None
-                if pr.provider == "steam" and not display_name:
-                    try:
-                        from sqlalchemy import text as _text
-                        r = db.execute(_text(
-                            """
-                            SELECT stats->>'name' AS name
-                            FROM session_players
-                            WHERE stats->>'steam_id' = :e
-                            ORDER BY id DESC LIMIT 1
-                            """
-                        ), {"e": pr.external_id}).first()
-                        if r and r[0]:
-                            display_name = r[0]
-                    except Exception:
-                        pass
-                out.append({
-                    "provider": pr.provider,
-                    "id": pr.external_id,
-                    "display_name": display_name,
-                    "avatar": avatar_url,
-                    "profile": ident.profile_url if ident else None,
-                })
-            return jsonify({"players": out})
+        # Signed-in users with a live connection; same list as the snapshot's "site"
+        return jsonify({"players": presence_snapshots.current().doc["site"]})
 
     # --- Team Picker (per TECHNICAL_SPEC.md Sections 4 & 5) ---
     def _build_team_picker_state(session_id: str):
-        from app.db import session_scope
-        from app.models import TeamPickSession, TeamPickPick, TeamPickParticipant, Identity, Player, SessionPlayer
-        from sqlalchemy import select as _select
-        with session_scope() as db:
-            tps = db.execute(
-                _select(TeamPickSession)
-                .where(TeamPickSession.session_id == session_id, TeamPickSession.state != "canceled")
-                .order_by(TeamPickSession.id.desc())
-            ).scalars().first()
-            if not tps:
-                return None
-            picks = db.execute(
-                _select(TeamPickPick).where(TeamPickPick.pick_session_id == tps.id).order_by(TeamPickPick.order_index.asc())
-            ).scalars().all()
-            parts = db.execute(
-                _select(TeamPickParticipant).where(TeamPickParticipant.pick_session_id == tps.id)
-            ).scalars().all()
-            # Enrich Steam identities for picks, participants, and roster
-            roster_rows = db.execute(
-                _select(SessionPlayer).where(SessionPlayer.session_id == session_id).order_by(SessionPlayer.slot.asc())
-            ).scalars().all()
-            steam_ids: set[str] = set(p.player_steam_id for p in picks if p.player_steam_id)
-            for r in roster_rows:
-                sid = (r.stats or {}).get("steam_id")
-                if sid:
-                    steam_ids.add(str(sid))
-            for r in parts:
-                if r.provider == "steam" and r.external_id:
-                    steam_ids.add(str(r.external_id))
-            mapping: dict[str, dict] = {}
-            if steam_ids:
-                rows = db.execute(
-                    _select(Identity, Player)
-                    .where(Identity.provider == "steam", Identity.external_id.in_(list(steam_ids)))
-                    .join(Player, Identity.player_id == Player.id, isouter=True)
-                ).all()
-                for ident, player in rows:
-                    mapping[str(ident.external_id)] = {
-                        "id": str(ident.external_id),
-                        "profile": ident.profile_url,
-                        "nickname": (player.display_name if player else None),
-                        "avatar": (player.avatar_url if player else None),
-                    }
-            # Compute remaining eligible players and next team only if any remain
-            commander_ids = set(str(r.external_id) for r in parts if r.role in ("commander1", "commander2") and r.provider == "steam")
-            picked_ids = set(p.player_steam_id for p in picks if p.player_steam_id)
-            remaining = 0
-            for rr in roster_rows:
-                sid = (rr.stats or {}).get("steam_id")
-                if not sid:
-                    continue
-                sid = str(sid)
-                if sid in commander_ids:
-                    continue
-                if sid in picked_ids:
-                    continue
-                remaining += 1
-            next_team = None
-            if tps.coin_winner_team is not None and remaining > 0:
-                next_team = tps.coin_winner_team if (len(picks) % 2 == 0) else (2 if tps.coin_winner_team == 1 else 1)
-            # Determine caller role
-            me_role = None
-            uid = session.get('uid')
-            if uid:
-                pvd, ext = uid.split(":", 1)
-                for r in parts:
-                    if r.provider == pvd and r.external_id == ext:
-                        me_role = r.role
-                        break
-            # Build response
-            from datetime import datetime as _dt, timedelta as _td
-            presence = app.config.get('TEAM_PICK_PRESENCE', {})
-            cutoff_ts = (_dt.utcnow() - _td(seconds=20)).timestamp()
-            resp = {
-                "id": tps.id,
-                "game_session_id": tps.session_id,
-                "state": tps.state,
-                "coin_winner_team": tps.coin_winner_team,
-                "next_team": next_team,
-                "your_role": me_role,
-                "picks_complete": remaining == 0,
-                "max_team_size": 5,
-                "created_at": tps.created_at.isoformat() if tps.created_at else None,
-                "closed_at": tps.closed_at.isoformat() if tps.closed_at else None,
-                "accepted": {
-                    "commander1": bool(tps.accepted_by_commander1),
-                    "commander2": bool(tps.accepted_by_commander2),
-                },
-                "participants": [
-                    {
-                        "provider": r.provider,
-                        "id": r.external_id,
-                        "role": r.role,
-                        "active": presence.get(f"{session_id}:{r.provider}:{r.external_id}", 0) >= cutoff_ts,
-                        "steam": (mapping.get(str(r.external_id)) if r.provider == "steam" else None),
-                    } for r in parts
-                ],
-                "picks": [
-                    {
-                        "order": p.order_index,
-                        "team_id": p.team_id,
-                        "player": {
-                            "steam_id": p.player_steam_id,
-                            "steam": mapping.get(p.player_steam_id),
-                        },
-                        "picked_at": p.picked_at.isoformat() if p.picked_at else None,
-                    } for p in picks
-                ],
-                "roster": [
-                    {
-                        "slot": rr.slot,
-                        "team_id": rr.team_id,
-                        "is_host": rr.is_host,
-                        "name": (rr.stats or {}).get("name"),
-                        "steam_id": (rr.stats or {}).get("steam_id"),
-                        "steam": mapping.get(str((rr.stats or {}).get("steam_id"))) if (rr.stats or {}).get("steam_id") else None,
-                    } for rr in roster_rows
-                ],
-            }
-            return resp
+        # Cached aggregate plus what lives outside the event stream: roster, caller role, presence
+        from app import team_picker as tp
+        from app.store import get_session_players
+        version, agg = tp.current(session_id)
+        if agg is None:
+            return None
+        live = live_sessions.get(session_id)
+        roster = live.players if live is not None else get_session_players(session_id)
+        return tp.render_state(agg, version, roster, session.get('uid'), _team_pick_active(session_id, agg))
+
+    def _team_pick_active(session_id: str, agg: dict) -> dict:
+        from app.presence import get_presence_store, team_pick_scope
+        return get_presence_store().active(
+            team_pick_scope(session_id), [f"{p['provider']}:{p['id']}" for p in agg["participants"]], TEAM_PICK_ACTIVE_SECONDS
+        )
+
+    def _publish_team_picker(session_id: str, action: str, events: list, invite: bool = False, **extra):
+        # Advance the cached aggregate, then tell the room what happened; clients refetch state
+        # (an O(1) cache read) when the version is newer than what they have
+        from app import team_picker as tp
+        version, agg = tp.publish(session_id, events)
+        try:
+            if socketio:
+                socketio.emit("team_picker:update", {"session_id": session_id, "action": action, "version": version, "events": events, **extra}, room=f"team_picker:{session_id}")
+                # Card badges for everyone, without waiting for the next tick
+                socketio.emit("team_picker:status", {"session_id": session_id, "status": tp.status_of(version, agg)})
+                # A (re)start prompts both commanders directly; clients skip prompts for their own start
+                if invite and agg is not None:
+                    item = tp.invite_item(session_id, agg, _team_pick_active(session_id, agg))
+                    for p in agg["participants"]:
+                        if p["role"] in ("commander1", "commander2"):
+                            socketio.emit("team_picker:invite", item, room=tp.user_room(p["provider"], p["id"]))
+        except Exception:
+            pass
+
+    @app.get("/api/v1/team_picker/status")
+    def team_picker_status():
+        # Bulk badge lookup: ?ids=a,b,c (max 100); live sessions come from the per-tick status
+        ids = [i for i in (request.args.get("ids") or "").split(",") if i][:100]
+        _token, live = tp_status.current()
+        out = {i: live[i] for i in ids if i in live}
+        missing = [i for i in ids if i not in out]
+        if missing:
+            out.update(get_statuses(missing))
+        return jsonify({"statuses": out})
 
     @app.get("/api/v1/team_picker/<path:session_id>")
     def team_picker_get(session_id: str):
@@ -534,9 +573,12 @@ def create_app() -> Flask:
         cmd1 = payload.get("commander1_id")
         cmd2 = payload.get("commander2_id")
         from app.db import session_scope
-        from app.models import TeamPickSession, TeamPickParticipant, SessionPlayer, Session, SitePresence
+        from app.models import TeamPickSession, TeamPickParticipant, SessionPlayer, Session
+        from app import team_picker as tp
+        from app.store import steam_profiles
         from sqlalchemy import select as _select
         with session_scope() as db:
+            tp.open_stream(db, session_id)
             # Only allow for PreGame sessions
             sess_row = db.get(Session, session_id)
             if not sess_row or (sess_row.state or '').lower() != 'pregame'.lower():
@@ -561,18 +603,14 @@ def create_app() -> Flask:
             if str(creator_provider) == "steam" and str(creator_external) not in (str(cmd1), str(cmd2)):
                 # Only allow a commander to start
                 return jsonify({"ok": False, "error": "forbidden"}), 403
-            # Require both commanders to be recently present on the site (signed in)
+            # Require both commanders to be present on the site (signed in)
             try:
-                from datetime import datetime as _dt, timedelta as _td
-                cutoff = _dt.utcnow() - _td(seconds=20)
+                from app.presence import site_online_users
                 present_ids: set[str] = set()
-                present_rows = db.execute(
-                    _select(SitePresence).where(
-                        (SitePresence.provider == 'steam') & (SitePresence.last_seen_at >= cutoff) & (SitePresence.external_id.in_([str(cmd1), str(cmd2)]))
-                    )
-                ).scalars().all()
-                for pr in present_rows:
-                    present_ids.add(str(pr.external_id))
+                online = set(site_online_users())
+                for cmd in (str(cmd1), str(cmd2)):
+                    if f"steam:{cmd}" in online:
+                        present_ids.add(cmd)
                 # Always count the caller as present if they are one of the commanders (even if heartbeat hasn't arrived yet)
                 if creator_provider == 'steam' and str(creator_external) in (str(cmd1), str(cmd2)):
                     present_ids.add(str(creator_external))
@@ -585,9 +623,11 @@ def create_app() -> Flask:
                 _select(TeamPickSession).where(TeamPickSession.session_id == session_id, TeamPickSession.state == "open")
             ).scalars().all()
             from datetime import datetime as _dt
+            events = []
             for r in open_rows:
                 r.state = "canceled"
                 r.closed_at = _dt.utcnow()
+                events.append((r.id, "canceled", {"closed_at": tp.iso(r.closed_at)}))
             # Create new pick session
             tps = TeamPickSession(
                 session_id=session_id,
@@ -598,16 +638,19 @@ def create_app() -> Flask:
             db.add(tps)
             db.flush()
             # Participants
-            db.add(TeamPickParticipant(pick_session_id=tps.id, provider="steam", external_id=str(cmd1), role="commander1"))
-            db.add(TeamPickParticipant(pick_session_id=tps.id, provider="steam", external_id=str(cmd2), role="commander2"))
+            members = [("steam", str(cmd1), "commander1"), ("steam", str(cmd2), "commander2")]
             if str(creator_provider) == "steam" and str(creator_external) not in (str(cmd1), str(cmd2)):
-                db.add(TeamPickParticipant(pick_session_id=tps.id, provider=creator_provider, external_id=creator_external, role="viewer"))
-        try:
-            if socketio:
-                state = _build_team_picker_state(session_id)
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "start", "session": state}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+                members.append((creator_provider, creator_external, "viewer"))
+            for pvd, ext, role in members:
+                db.add(TeamPickParticipant(pick_session_id=tps.id, provider=pvd, external_id=ext, role=role))
+            profiles = steam_profiles(db, [ext for pvd, ext, _role in members if pvd == "steam"])
+            events.append((tps.id, "started", {
+                "created_at": tp.iso(tps.created_at),
+                "created_by": {"provider": creator_provider, "id": creator_external},
+                "participants": [tp.participant(pvd, ext, role, profiles) for pvd, ext, role in members],
+            }))
+            events = tp.append_events(db, session_id, events, actor=uid)
+        _publish_team_picker(session_id, "start", events, invite=True)
         return team_picker_get(session_id)
 
     @app.post("/api/v1/team_picker/<path:session_id>/restart")
@@ -619,8 +662,12 @@ def create_app() -> Flask:
         creator_provider, creator_external = uid.split(":", 1)
         from app.db import session_scope
         from app.models import TeamPickSession, TeamPickParticipant, Session, SessionPlayer
+        from app import team_picker as tp
+        from app.store import steam_profiles
         from sqlalchemy import select as _select
         with session_scope() as db:
+            tp.open_stream(db, session_id)
+            events = []
             sess_row = db.get(Session, session_id)
             if not sess_row or (sess_row.state or '').lower() != 'pregame'.lower():
                 return jsonify({"ok": False, "error": "not_pregame"}), 400
@@ -643,6 +690,7 @@ def create_app() -> Flask:
                     from datetime import datetime as _dt
                     existing.state = 'canceled'
                     existing.closed_at = _dt.utcnow()
+                    events.append((existing.id, "canceled", {"closed_at": tp.iso(existing.closed_at)}))
             # Infer commanders if missing
             if not cmd1 or not cmd2:
                 rows = db.execute(
@@ -673,12 +721,14 @@ def create_app() -> Flask:
             db.flush()
             db.add(TeamPickParticipant(pick_session_id=tps.id, provider='steam', external_id=str(cmd1), role='commander1'))
             db.add(TeamPickParticipant(pick_session_id=tps.id, provider='steam', external_id=str(cmd2), role='commander2'))
-        try:
-            if socketio:
-                state = _build_team_picker_state(session_id)
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "restart", "session": state}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+            profiles = steam_profiles(db, [str(cmd1), str(cmd2)])
+            events.append((tps.id, "started", {
+                "created_at": tp.iso(tps.created_at),
+                "created_by": {"provider": creator_provider, "id": creator_external},
+                "participants": [tp.participant('steam', str(cmd1), 'commander1', profiles), tp.participant('steam', str(cmd2), 'commander2', profiles)],
+            }))
+            events = tp.append_events(db, session_id, events, actor=uid)
+        _publish_team_picker(session_id, "restart", events, invite=True)
         return team_picker_get(session_id)
 
     @app.post("/api/v1/team_picker/<path:session_id>/coin_toss")
@@ -689,8 +739,10 @@ def create_app() -> Flask:
         provider, external = uid.split(":", 1)
         from app.db import session_scope
         from app.models import TeamPickSession, TeamPickParticipant
+        from app import team_picker as tp
         from sqlalchemy import select as _select, text as _text
         with session_scope() as db:
+            tp.open_stream(db, session_id)
             tps = db.execute(
                 _select(TeamPickSession).where(TeamPickSession.session_id == session_id, TeamPickSession.state == "open")
             ).scalars().first()
@@ -714,12 +766,8 @@ def create_app() -> Flask:
             if getattr(r, "rowcount", 0) != 1:
                 return jsonify({"ok": False, "error": "already_tossed"}), 400
             tps.coin_winner_team = winner
-        try:
-            if socketio:
-                state = _build_team_picker_state(session_id)
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "coin_toss", "team": tps.coin_winner_team, "session": state}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+            events = tp.append_events(db, session_id, [(tps.id, "coin_tossed", {"team": winner})], actor=uid)
+        _publish_team_picker(session_id, "coin_toss", events, team=winner)
         return team_picker_get(session_id)
 
     @app.post("/api/v1/team_picker/<path:session_id>/pick")
@@ -734,8 +782,11 @@ def create_app() -> Flask:
             return jsonify({"ok": False, "error": "missing_player_steam_id"}), 400
         from app.db import session_scope
         from app.models import TeamPickSession, TeamPickParticipant, TeamPickPick
+        from app import team_picker as tp
+        from app.store import steam_profiles
         from sqlalchemy import select as _select
         with session_scope() as db:
+            tp.open_stream(db, session_id)
             tps = db.execute(
                 _select(TeamPickSession).where(TeamPickSession.session_id == session_id, TeamPickSession.state == "open")
             ).scalars().first()
@@ -763,7 +814,7 @@ def create_app() -> Flask:
             team_counts = {1: 0, 2: 0}
             for e in existing:
                 team_counts[e.team_id] = team_counts.get(e.team_id, 0) + 1
-            if team_counts.get(next_team, 0) >= 4:
+            if team_counts.get(next_team, 0) >= tp.MAX_PICKS_PER_TEAM:
                 return jsonify({"ok": False, "error": "team_full"}), 400
             # Only the corresponding commander may pick
             required_role = "commander1" if next_team == 1 else "commander2"
@@ -784,12 +835,9 @@ def create_app() -> Flask:
                 picked_by_external_id=external,
             )
             db.add(p)
-        try:
-            if socketio:
-                state = _build_team_picker_state(session_id)
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "pick", "session": state}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+            db.flush()
+            events = tp.append_events(db, session_id, [(tps.id, "picked", tp.pick_data(p, steam_profiles(db, [steam_id])))], actor=uid)
+        _publish_team_picker(session_id, "pick", events)
         return team_picker_get(session_id)
 
     @app.post("/api/v1/team_picker/<path:session_id>/finalize")
@@ -800,8 +848,10 @@ def create_app() -> Flask:
         provider, external = uid.split(":", 1)
         from app.db import session_scope
         from app.models import TeamPickSession, TeamPickParticipant
+        from app import team_picker as tp
         from sqlalchemy import select as _select
         with session_scope() as db:
+            tp.open_stream(db, session_id)
             tps = db.execute(
                 _select(TeamPickSession).where(TeamPickSession.session_id == session_id, TeamPickSession.state == "open")
             ).scalars().first()
@@ -812,6 +862,7 @@ def create_app() -> Flask:
             ).scalars().first()
             if not part or part.role not in ("commander1", "commander2"):
                 return jsonify({"ok": False, "error": "forbidden"}), 403
+            accepted = [part.role]
             if part.role == "commander1":
                 tps.accepted_by_commander1 = True
             elif part.role == "commander2":
@@ -826,18 +877,19 @@ def create_app() -> Flask:
                 if (settings.flask_env or "production").lower() != "production" and str(session_id).startswith("Dev:TP:"):
                     if part.role == "commander1":
                         tps.accepted_by_commander2 = True
+                        accepted.append("commander2")
                     elif part.role == "commander2":
                         tps.accepted_by_commander1 = True
+                        accepted.append("commander1")
                     if tps.accepted_by_commander1 and tps.accepted_by_commander2:
                         from datetime import datetime as _dt
                         tps.state = "final"
                         tps.closed_at = _dt.utcnow()
-        try:
-            if socketio:
-                state = _build_team_picker_state(session_id)
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "finalize", "session": state}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+            events = [(tps.id, "accepted", {"roles": accepted})]
+            if tps.state == "final":
+                events.append((tps.id, "finalized", {"closed_at": tp.iso(tps.closed_at)}))
+            events = tp.append_events(db, session_id, events, actor=uid)
+        _publish_team_picker(session_id, "finalize", events)
         return team_picker_get(session_id)
 
     @app.post("/api/v1/team_picker/<path:session_id>/presence")
@@ -846,122 +898,63 @@ def create_app() -> Flask:
         if not uid:
             return jsonify({"ok": False, "error": "not_authenticated"}), 401
         provider, external = uid.split(":", 1)
-        from app.db import session_scope
-        from app.models import TeamPickSession, TeamPickParticipant
-        from sqlalchemy import select as _select
-        with session_scope() as db:
-            tps = db.execute(
-                _select(TeamPickSession).where(TeamPickSession.session_id == session_id, TeamPickSession.state == 'open')
-            ).scalars().first()
-            if not tps:
-                return jsonify({"ok": False})
-            part = db.execute(
-                _select(TeamPickParticipant).where(TeamPickParticipant.pick_session_id == tps.id, TeamPickParticipant.provider == provider, TeamPickParticipant.external_id == external)
-            ).scalars().first()
-            if not part:
-                return jsonify({"ok": False, "error": "forbidden"}), 403
-        from time import time as _time
-        presence = app.config.get('TEAM_PICK_PRESENCE', {})
-        presence[f"{session_id}:{provider}:{external}"] = _time()
-        app.config['TEAM_PICK_PRESENCE'] = presence
+        from app import team_picker as tp
+        _version, agg = tp.current(session_id)
+        if not agg or agg["state"] != "open":
+            return jsonify({"ok": False})
+        if tp.role_of(agg, provider, external) is None:
+            return jsonify({"ok": False, "error": "forbidden"}), 403
+        from app.presence import get_presence_store, team_pick_scope
+        get_presence_store().touch(team_pick_scope(session_id), f"{provider}:{external}")
         try:
             if socketio:
-                socketio.emit("team_picker:presence", {"session_id": session_id}, room=f"team_picker:{session_id}", broadcast=True)
+                socketio.emit("team_picker:presence", {"session_id": session_id}, room=f"team_picker:{session_id}")
         except Exception:
             pass
         return jsonify({"ok": True})
 
     @app.get("/api/v1/team_picker/open_for_me")
     def team_picker_open_for_me():
+        # Cold-start fallback for invites missed while no socket was connected (live ones arrive
+        # as team_picker:invite on the user's room): recent open pick sessions, in PreGame,
+        # where the caller holds a commander seat and the other commander started it
         uid = session.get('uid')
         if not uid:
             return jsonify({"items": []})
         provider, external = uid.split(":", 1)
         from app.db import session_scope
-        from app.models import TeamPickSession, TeamPickParticipant, Identity, Player, Session
+        from app.models import TeamPickSession, TeamPickParticipant, Session
+        from app import team_picker as tp
         from sqlalchemy import select as _select
         from datetime import datetime as _dt, timedelta as _td
+        PROMPT_WINDOW_SECONDS = 300
+        cutoff = _dt.utcnow() - _td(seconds=PROMPT_WINDOW_SECONDS)
         with session_scope() as db:
-            rows = db.execute(
-                _select(TeamPickSession, TeamPickParticipant)
-                .where(TeamPickSession.state == 'open')
+            session_ids = db.execute(
+                _select(TeamPickSession.session_id)
                 .join(TeamPickParticipant, TeamPickParticipant.pick_session_id == TeamPickSession.id)
                 .join(Session, Session.id == TeamPickSession.session_id)
-                .where(Session.state == 'PreGame')
-            ).all()
-            sessions: dict[str, dict] = {}
-            for tps, part in rows:
-                if part.provider == provider and part.external_id == external and part.role in ("commander1", "commander2"):
-                    # Do not prompt the creator of the Team Picker session about their own start
-                    if tps.created_by_provider == provider and tps.created_by_external_id == external:
-                        continue
-                    # Include created_at for recency filtering
-                    sessions.setdefault(tps.session_id, {
-                        "session_id": tps.session_id,
-                        "state": tps.state,
-                        "participants": [],
-                        "created_by": {"provider": tps.created_by_provider, "id": tps.created_by_external_id},
-                        "created_at_ts": (tps.created_at.timestamp() if getattr(tps, 'created_at', None) else 0)
-                    })
-            if not sessions:
-                return jsonify({"items": []})
-            ids = list(sessions.keys())
-            parts = db.execute(
-                _select(TeamPickSession, TeamPickParticipant)
-                .where(TeamPickSession.session_id.in_(ids))
-                .join(TeamPickParticipant, TeamPickParticipant.pick_session_id == TeamPickSession.id)
-            ).all()
-            steam_ids = [p.external_id for tps, p in parts if p.provider == 'steam']
-            mapping = {}
-            if steam_ids:
-                idrows = db.execute(
-                    _select(Identity, Player)
-                    .where(Identity.provider == 'steam', Identity.external_id.in_(steam_ids))
-                    .join(Player, Identity.player_id == Player.id, isouter=True)
-                ).all()
-                for ident, player in idrows:
-                    mapping[str(ident.external_id)] = {
-                        "id": str(ident.external_id),
-                        "profile": ident.profile_url,
-                        "nickname": (player.display_name if player else None),
-                        "avatar": (player.avatar_url if player else None),
-                    }
-            presence = app.config.get('TEAM_PICK_PRESENCE', {})
-            cutoff_ts = (_dt.utcnow() - _td(seconds=20)).timestamp()
-            for tps, p in parts:
-                if tps.session_id in sessions:
-                    sessions[tps.session_id]["participants"].append({
-                        "provider": p.provider,
-                        "id": p.external_id,
-                        "role": p.role,
-                        "active": presence.get(f"{tps.session_id}:{p.provider}:{p.external_id}", 0) >= cutoff_ts,
-                        "steam": mapping.get(str(p.external_id)) if p.provider == 'steam' else None,
-                    })
-            # Only notify when the other commander (creator) is present and the game is in PreGame
-            filtered = []
-            # Only show prompts for recently created Team Picker sessions to reflect a fresh "start" event
-            PROMPT_WINDOW_SECONDS = 300
-            now_ts = _dt.utcnow().timestamp()
-            for item in sessions.values():
-                my = next((pp for pp in item.get("participants", []) if pp.get("provider") == provider and str(pp.get("id")) == str(external) and pp.get("role") in ("commander1", "commander2")), None)
-                if not my:
-                    continue
-                other = next((pp for pp in item.get("participants", []) if pp.get("role") in ("commander1", "commander2") and not (pp.get("provider") == provider and str(pp.get("id")) == str(external))), None)
-                if not other:
-                    continue
-                # Must be created by the other commander
-                created_by = item.get("created_by") or {}
-                if not (created_by.get("provider") == other.get("provider") and str(created_by.get("id")) == str(other.get("id"))):
-                    continue
-                # Must be a recent start
-                cat = float(item.get("created_at_ts") or 0)
-                if (now_ts - cat) > PROMPT_WINDOW_SECONDS:
-                    continue
-                # Do not require explicit Team Picker presence for the other commander; "start" recency is enough.
-                filtered.append(item)
-            # Sort newest first
-            filtered.sort(key=lambda x: x.get("created_at_ts") or 0, reverse=True)
-            return jsonify({"items": filtered})
+                .where(
+                    TeamPickSession.state == 'open',
+                    TeamPickSession.created_at >= cutoff,
+                    TeamPickParticipant.provider == provider,
+                    TeamPickParticipant.external_id == external,
+                    TeamPickParticipant.role.in_(("commander1", "commander2")),
+                    Session.state == 'PreGame',
+                )
+                .order_by(TeamPickSession.created_at.desc())
+            ).scalars().all()
+        items = []
+        for sid in dict.fromkeys(session_ids):
+            _version, agg = tp.current(sid)
+            if not agg or agg["state"] != "open":
+                continue
+            other = next((p for p in agg["participants"] if p["role"] in ("commander1", "commander2") and not (p["provider"] == provider and p["id"] == external)), None)
+            created_by = agg.get("created_by") or {}
+            if not other or (created_by.get("provider"), created_by.get("id")) != (other["provider"], other["id"]):
+                continue
+            items.append(tp.invite_item(sid, agg, _team_pick_active(sid, agg)))
+        return jsonify({"items": items})
 
     @app.post("/api/v1/team_picker/<path:session_id>/cancel")
     def team_picker_cancel(session_id: str):
@@ -971,8 +964,10 @@ def create_app() -> Flask:
         provider, external = uid.split(":", 1)
         from app.db import session_scope
         from app.models import TeamPickSession, TeamPickParticipant
+        from app import team_picker as tp
         from sqlalchemy import select as _select
         with session_scope() as db:
+            tp.open_stream(db, session_id)
             tps = db.execute(
                 _select(TeamPickSession).where(TeamPickSession.session_id == session_id, TeamPickSession.state == "open")
             ).scalars().first()
@@ -993,12 +988,8 @@ def create_app() -> Flask:
             from datetime import datetime as _dt
             tps.state = "canceled"
             tps.closed_at = _dt.utcnow()
-        try:
-            if socketio:
-                state = _build_team_picker_state(session_id)
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "cancel", "session": state}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+            events = tp.append_events(db, session_id, [(tps.id, "canceled", {"closed_at": tp.iso(tps.closed_at)})], actor=uid)
+        _publish_team_picker(session_id, "cancel", events)
         return team_picker_get(session_id)
 
     @app.post("/api/v1/team_picker/<path:session_id>/clear")
@@ -1009,8 +1000,10 @@ def create_app() -> Flask:
         provider, external = uid.split(":", 1)
         from app.db import session_scope
         from app.models import TeamPickSession, TeamPickParticipant
+        from app import team_picker as tp
         from sqlalchemy import select as _select, delete as _delete
         with session_scope() as db:
+            tp.open_stream(db, session_id)
             # Find latest session (any state) to check permissions
             latest = db.execute(
                 _select(TeamPickSession).where(TeamPickSession.session_id == session_id).order_by(TeamPickSession.id.desc())
@@ -1030,11 +1023,8 @@ def create_app() -> Flask:
                 return jsonify({"ok": False, "error": "forbidden"}), 403
             # Delete all Team Picker sessions for this game session (cascades remove picks/participants)
             db.execute(_delete(TeamPickSession).where(TeamPickSession.session_id == session_id))
-        try:
-            if socketio:
-                socketio.emit("team_picker:update", {"session_id": session_id, "action": "clear", "session": None}, room=f"team_picker:{session_id}", broadcast=True)
-        except Exception:
-            pass
+            events = tp.append_events(db, session_id, [(None, "cleared", {})], actor=uid)
+        _publish_team_picker(session_id, "clear", events, session=None)
         return jsonify({"session": None})
 
     # Simple Admin Tools (scaffold)
@@ -1,138 +1,454 @@
+import hashlib
+import re
+import sys
+import textwrap
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
 from sqlalchemy import text
 
-from app.db import engine
+from app.db import configure, create_role_engine, get_engine
 from app.models import Base
 
 
+SNAPSHOT_PARTITIONS_AHEAD_DAYS = 7
+_LEGACY_RANGE_CHECK = "ck_session_snapshots_legacy_range"
+_LEGACY_UNIQUE_INDEX = "ix_session_snapshots_legacy_id_observed"
+
+
 def create_all() -> None:
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 
-def ensure_alter_tables() -> None:
-    # Add newly introduced columns if they don't exist
-    with engine.begin() as conn:
-        conn.execute(text(
-            """
-            ALTER TABLE IF EXISTS sessions
-            ADD COLUMN IF NOT EXISTS state VARCHAR(32);
-            """
-        ))
-        # Create mods and levels tables if not present
-        conn.execute(text(
-            """
-            CREATE TABLE IF NOT EXISTS mods (
-              id VARCHAR(32) PRIMARY KEY,
-              name VARCHAR(256),
-              image_url VARCHAR(512)
-            );
-            """
-        ))
-        conn.execute(text(
-            """
-            CREATE TABLE IF NOT EXISTS levels (
-              id VARCHAR(256) PRIMARY KEY,
-              mod_id VARCHAR(32),
-              map_file VARCHAR(128),
-              name VARCHAR(256),
-              image_url VARCHAR(512)
-            );
-            """
+def _snapshots_relkind(conn) -> Optional[str]:
+    return conn.execute(text(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = 'session_snapshots' AND n.nspname = current_schema()"
+    )).scalar()
+
+
+def _day_literal(day: date) -> str:
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+def snapshot_partition_name(day: date) -> str:
+    return f"session_snapshots_p{day.strftime('%Y%m%d')}"
+
+
+def ensure_snapshot_partitioning() -> None:
+    """Convert session_snapshots into a table range-partitioned by day on observed_at.
+
+    Idempotent and online: the slow parts (validating a range CHECK and
+    building the (id, observed_at) unique index) run against the live heap
+    without blocking inserts. The swap itself only renames the heap to
+    session_snapshots_legacy, creates the partitioned parent and attaches the
+    legacy heap as its oldest partition, all of which are catalog-only.
+    """
+    with get_engine().connect() as probe:
+        if _snapshots_relkind(probe) != "r":
+            # Already partitioned ('p') or not created yet
+            ensure_snapshot_partitions()
+            return
+
+    # Legacy partition covers everything before the day after tomorrow so rows
+    # inserted while this runs (even across midnight) still fit its range.
+    bound = datetime.utcnow().date() + timedelta(days=2)
+    auto = get_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        auto.execute(text("UPDATE session_snapshots SET observed_at = to_timestamp(0) WHERE observed_at IS NULL"))
+        # A leftover constraint from an interrupted run may carry a different bound
+        auto.execute(text(f"ALTER TABLE session_snapshots DROP CONSTRAINT IF EXISTS {_LEGACY_RANGE_CHECK}"))
+        auto.execute(text(
+            f"ALTER TABLE session_snapshots ADD CONSTRAINT {_LEGACY_RANGE_CHECK} "
+            f"CHECK (observed_at IS NOT NULL AND observed_at < '{_day_literal(bound)}'::timestamptz) NOT VALID"
         ))
-        conn.execute(text(
-            """
-            DO $$ BEGIN
-              IF NOT EXISTS (
-                SELECT 1 FROM pg_constraint WHERE conname = 'uq_levels_mod_map'
-              ) THEN
-                ALTER TABLE levels ADD CONSTRAINT uq_levels_mod_map UNIQUE (mod_id, map_file);
-              END IF;
-            END $$;
-            """
+        auto.execute(text(f"ALTER TABLE session_snapshots VALIDATE CONSTRAINT {_LEGACY_RANGE_CHECK}"))
+        invalid = auto.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :n AND NOT i.indisvalid"
+        ), {"n": _LEGACY_UNIQUE_INDEX}).scalar()
+        if invalid:
+            auto.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {_LEGACY_UNIQUE_INDEX}"))
+        auto.execute(text(
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {_LEGACY_UNIQUE_INDEX} "
+            "ON session_snapshots (id, observed_at)"
         ))
+    finally:
+        auto.close()
+
+    with get_engine().begin() as conn:
+        conn.execute(text("LOCK TABLE session_snapshots IN ACCESS EXCLUSIVE MODE"))
+        if _snapshots_relkind(conn) != "r":
+            # Another process won the race
+            return
         conn.execute(text(
-            """
-            CREATE TABLE IF NOT EXISTS session_snapshots (
-              id SERIAL PRIMARY KEY,
+            f"""
+            ALTER TABLE session_snapshots RENAME TO session_snapshots_legacy;
+            ALTER INDEX IF EXISTS ix_session_snapshots_session_time RENAME TO ix_session_snapshots_legacy_session_time;
+            ALTER INDEX IF EXISTS ix_session_snapshots_session_id RENAME TO ix_session_snapshots_legacy_session_id;
+            ALTER INDEX IF EXISTS ix_session_snapshots_observed_at RENAME TO ix_session_snapshots_legacy_observed_at;
+            ALTER TABLE session_snapshots_legacy ALTER COLUMN observed_at SET NOT NULL;
+            -- Promote the (id, observed_at) index built above to the partition's primary key so ATTACH reuses it
+            ALTER TABLE session_snapshots_legacy DROP CONSTRAINT IF EXISTS session_snapshots_pkey;
+            ALTER TABLE session_snapshots_legacy ADD CONSTRAINT session_snapshots_legacy_pkey
+              PRIMARY KEY USING INDEX {_LEGACY_UNIQUE_INDEX};
+            CREATE TABLE session_snapshots (
+              id INTEGER NOT NULL DEFAULT nextval('session_snapshots_id_seq'),
               session_id VARCHAR(128),
-              observed_at TIMESTAMPTZ DEFAULT now(),
+              observed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
               player_count INTEGER,
               state VARCHAR(32),
               map_file VARCHAR(128),
-              mod_id VARCHAR(32)
-            );
-            CREATE INDEX IF NOT EXISTS ix_session_snapshots_session_time ON session_snapshots(session_id, observed_at);
-            """
-        ))
-        conn.execute(text(
-            """
-            ALTER TABLE IF EXISTS sessions
-            ADD COLUMN IF NOT EXISTS nat_type VARCHAR(32);
-            """
-        ))
-        conn.execute(text(
-            """
-            ALTER TABLE IF EXISTS sessions
-            ADD COLUMN IF NOT EXISTS map_file VARCHAR(128);
-            """
-        ))
-        conn.execute(text(
-            """
-            ALTER TABLE IF EXISTS sessions
-            ADD COLUMN IF NOT EXISTS mod_id VARCHAR(32);
-            """
-        ))
-        # Ensure unique constraints and indexes (idempotent where possible)
-        conn.execute(text(
-            """
-            DO $$ BEGIN
-              IF NOT EXISTS (
-                SELECT 1 FROM pg_constraint WHERE conname = 'uq_identities_provider_external'
-              ) THEN
-                ALTER TABLE IF EXISTS identities
-                ADD CONSTRAINT uq_identities_provider_external UNIQUE (provider, external_id);
-              END IF;
-            END $$;
-            """
-        ))
-        conn.execute(text(
-            """
-            DO $$ BEGIN
-              IF NOT EXISTS (
-                SELECT 1 FROM pg_constraint WHERE conname = 'uq_session_players_session_slot'
-              ) THEN
-                ALTER TABLE IF EXISTS session_players
-                ADD CONSTRAINT uq_session_players_session_slot UNIQUE (session_id, slot);
-              END IF;
-            END $$;
-            """
-        ))
-        # Presence table for logged-in site users (Steam)
-        conn.execute(text(
-            """
-            CREATE TABLE IF NOT EXISTS site_presence (
-              id SERIAL PRIMARY KEY,
-              provider VARCHAR(16),
-              external_id VARCHAR(64),
-              last_seen_at TIMESTAMPTZ DEFAULT now()
-            );
-            CREATE INDEX IF NOT EXISTS ix_site_presence_provider_external ON site_presence(provider, external_id);
-            CREATE INDEX IF NOT EXISTS ix_site_presence_last_seen ON site_presence(last_seen_at);
-            -- Deduplicate existing rows before adding UNIQUE
-            DELETE FROM site_presence a USING site_presence b
-            WHERE a.provider=b.provider AND a.external_id=b.external_id AND a.id < b.id;
-            DO $$ BEGIN
-              IF NOT EXISTS (
-                SELECT 1 FROM pg_constraint WHERE conname = 'uq_site_presence_provider_external'
-              ) THEN
-                ALTER TABLE site_presence ADD CONSTRAINT uq_site_presence_provider_external UNIQUE (provider, external_id);
-              END IF;
-            END $$;
+              mod_id VARCHAR(32),
+              CONSTRAINT session_snapshots_pkey PRIMARY KEY (id, observed_at)
+            ) PARTITION BY RANGE (observed_at);
+            ALTER TABLE session_snapshots ATTACH PARTITION session_snapshots_legacy
+              FOR VALUES FROM (MINVALUE) TO ('{_day_literal(bound)}');
+            CREATE INDEX IF NOT EXISTS ix_session_snapshots_session_time ON session_snapshots (session_id, observed_at);
+            CREATE INDEX IF NOT EXISTS ix_session_snapshots_session_id ON session_snapshots (session_id);
+            CREATE INDEX IF NOT EXISTS ix_session_snapshots_observed_at ON session_snapshots (observed_at);
             """
         ))
+    ensure_snapshot_partitions()
 
 
-if __name__ == "__main__":
+def _legacy_upper_bound(conn) -> Optional[date]:
+    expr = conn.execute(text(
+        "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = 'session_snapshots_legacy' AND n.nspname = current_schema() AND c.relispartition"
+    )).scalar()
+    m = re.search(r"TO \('(\d{4}-\d{2}-\d{2})", expr or "")
+    return date.fromisoformat(m.group(1)) if m else None
+
+
+def list_snapshot_partitions(conn) -> List[date]:
+    """Dates of the existing daily session_snapshots partitions, oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'session_snapshots'::regclass"
+    )).scalars().all()
+    days = []
+    for n in names:
+        m = re.fullmatch(r"session_snapshots_p(\d{8})", n)
+        if m:
+            days.append(datetime.strptime(m.group(1), "%Y%m%d").date())
+    return sorted(days)
+
+
+def ensure_snapshot_partitions(days_ahead: int = SNAPSHOT_PARTITIONS_AHEAD_DAYS, today: Optional[date] = None) -> int:
+    """Create daily session_snapshots partitions from today through today + days_ahead.
+
+    No-op unless the table is partitioned. Returns the number created.
+    """
+    today = today or datetime.utcnow().date()
+    created = 0
+    with get_engine().begin() as conn:
+        if _snapshots_relkind(conn) != "p":
+            return 0
+        existing = set(list_snapshot_partitions(conn))
+        floor = _legacy_upper_bound(conn) or today
+        day = max(today, floor)
+        while day <= today + timedelta(days=days_ahead):
+            if day not in existing:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {snapshot_partition_name(day)} PARTITION OF session_snapshots "
+                    f"FOR VALUES FROM ('{_day_literal(day)}') TO ('{_day_literal(day + timedelta(days=1))}')"
+                ))
+                created += 1
+            day += timedelta(days=1)
+    return created
+
+
+def has_snapshot_partition(day: date) -> bool:
+    with get_engine().connect() as conn:
+        return _snapshots_relkind(conn) == "p" and day in set(list_snapshot_partitions(conn))
+
+
+def drop_snapshot_partition(day: date) -> bool:
+    """Drop the daily partition for day, if it exists. Returns True when one was dropped."""
+    with get_engine().begin() as conn:
+        if _snapshots_relkind(conn) != "p" or day not in set(list_snapshot_partitions(conn)):
+            return False
+        conn.execute(text(f"DROP TABLE IF EXISTS {snapshot_partition_name(day)}"))
+    return True
+
+
+# Schema migrations: applied in version order by `python -m app.migrate` (one process at a
+# time, under an advisory lock) and recorded in schema_migrations with a checksum of their
+# SQL. Web and worker processes only verify the ledger at boot. Steps must stay idempotent
+# (IF NOT EXISTS) so databases created before the ledger existed can adopt it; never edit
+# an applied step, append a new one instead. Code-backed steps (`run`) are checksummed by
+# version and name only, so their functions can be refactored; a change in what they do
+# needs a new step.
+
+MIGRATION_LOCK = "schema_migrations"
+
+
+# Ledger entry points for the code-backed steps. They only delegate, so the helpers above
+# (and how they reach the engine) can change without touching an applied step.
+def _step_0001_base_tables() -> None:
     create_all()
-    ensure_alter_tables()
+
+
+def _step_0011_session_snapshots_partitioning() -> None:
+    ensure_snapshot_partitioning()
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: Optional[str] = None
+    # For steps that are not a single transaction of SQL; they manage their own connections
+    run: Optional[Callable[[], None]] = None
+
+    @property
+    def checksum(self) -> str:
+        source = textwrap.dedent(self.sql).strip() if self.sql is not None else f"run:{self.version}:{self.name}"
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "base_tables", run=_step_0001_base_tables),
+    Migration(2, "sessions_state", """
+        ALTER TABLE IF EXISTS sessions
+        ADD COLUMN IF NOT EXISTS state VARCHAR(32);
+        """),
+    # Mods and levels lookup tables
+    Migration(3, "mods_and_levels", """
+        CREATE TABLE IF NOT EXISTS mods (
+          id VARCHAR(32) PRIMARY KEY,
+          name VARCHAR(256),
+          image_url VARCHAR(512)
+        );
+        CREATE TABLE IF NOT EXISTS levels (
+          id VARCHAR(256) PRIMARY KEY,
+          mod_id VARCHAR(32),
+          map_file VARCHAR(128),
+          name VARCHAR(256),
+          image_url VARCHAR(512)
+        );
+        DO $$ BEGIN
+          IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'uq_levels_mod_map'
+          ) THEN
+            ALTER TABLE levels ADD CONSTRAINT uq_levels_mod_map UNIQUE (mod_id, map_file);
+          END IF;
+        END $$;
+        """),
+    Migration(4, "session_snapshots", """
+        CREATE TABLE IF NOT EXISTS session_snapshots (
+          id SERIAL PRIMARY KEY,
+          session_id VARCHAR(128),
+          observed_at TIMESTAMPTZ DEFAULT now(),
+          player_count INTEGER,
+          state VARCHAR(32),
+          map_file VARCHAR(128),
+          mod_id VARCHAR(32)
+        );
+        CREATE INDEX IF NOT EXISTS ix_session_snapshots_session_time ON session_snapshots(session_id, observed_at);
+        """),
+    Migration(5, "sessions_nat_map_mod", """
+        ALTER TABLE IF EXISTS sessions
+        ADD COLUMN IF NOT EXISTS nat_type VARCHAR(32);
+        ALTER TABLE IF EXISTS sessions
+        ADD COLUMN IF NOT EXISTS map_file VARCHAR(128);
+        ALTER TABLE IF EXISTS sessions
+        ADD COLUMN IF NOT EXISTS mod_id VARCHAR(32);
+        """),
+    # Unique constraints the upserts rely on
+    Migration(6, "identity_and_slot_uniques", """
+        DO $$ BEGIN
+          IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'uq_identities_provider_external'
+          ) THEN
+            ALTER TABLE IF EXISTS identities
+            ADD CONSTRAINT uq_identities_provider_external UNIQUE (provider, external_id);
+          END IF;
+        END $$;
+        DO $$ BEGIN
+          IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'uq_session_players_session_slot'
+          ) THEN
+            ALTER TABLE IF EXISTS session_players
+            ADD CONSTRAINT uq_session_players_session_slot UNIQUE (session_id, slot);
+          END IF;
+        END $$;
+        """),
+    # Promote steam_id/name out of session_players.stats so lookups can use an index
+    Migration(7, "session_players_steam_id", """
+        ALTER TABLE IF EXISTS session_players ADD COLUMN IF NOT EXISTS steam_id VARCHAR(64);
+        ALTER TABLE IF EXISTS session_players ADD COLUMN IF NOT EXISTS name VARCHAR(128);
+        CREATE INDEX IF NOT EXISTS ix_session_players_steam_id ON session_players(steam_id);
+        UPDATE session_players
+        SET steam_id = stats->>'steam_id', name = COALESCE(name, stats->>'name')
+        WHERE steam_id IS NULL AND stats->>'steam_id' IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS player_names (
+          steam_id VARCHAR(64) PRIMARY KEY,
+          name VARCHAR(128) NOT NULL,
+          updated_at TIMESTAMPTZ DEFAULT now()
+        );
+        INSERT INTO player_names(steam_id, name, updated_at)
+        SELECT DISTINCT ON (steam_id) steam_id, name, now()
+        FROM session_players
+        WHERE steam_id IS NOT NULL AND name IS NOT NULL
+        ORDER BY steam_id, id DESC
+        ON CONFLICT (steam_id) DO NOTHING;
+        """),
+    # Leaderboard rollups track which participation stints were already counted
+    Migration(8, "player_sessions_rolled_up", """
+        ALTER TABLE IF EXISTS player_sessions ADD COLUMN IF NOT EXISTS rolled_up BOOLEAN NOT NULL DEFAULT false;
+        CREATE INDEX IF NOT EXISTS ix_player_sessions_pending_rollup
+          ON player_sessions(session_id) WHERE NOT rolled_up;
+        """),
+    # Team Picker invite fallback: open pick sessions, and each user's commander seats
+    Migration(9, "team_pick_invite_indexes", """
+        CREATE INDEX IF NOT EXISTS ix_team_pick_sessions_open
+          ON team_pick_sessions(created_at) WHERE state = 'open';
+        CREATE INDEX IF NOT EXISTS ix_team_pick_participants_commander
+          ON team_pick_participants(provider, external_id, pick_session_id) WHERE role IN ('commander1', 'commander2');
+        """),
+    # Presence table for logged-in site users (Steam), one row per user
+    Migration(10, "site_presence", """
+        CREATE TABLE IF NOT EXISTS site_presence (
+          id SERIAL PRIMARY KEY,
+          provider VARCHAR(16),
+          external_id VARCHAR(64),
+          last_seen_at TIMESTAMPTZ DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS ix_site_presence_provider_external ON site_presence(provider, external_id);
+        CREATE INDEX IF NOT EXISTS ix_site_presence_last_seen ON site_presence(last_seen_at);
+        -- Deduplicate existing rows before adding UNIQUE
+        DELETE FROM site_presence a USING site_presence b
+        WHERE a.provider=b.provider AND a.external_id=b.external_id AND a.id < b.id;
+        DO $$ BEGIN
+          IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'uq_site_presence_provider_external'
+          ) THEN
+            ALTER TABLE site_presence ADD CONSTRAINT uq_site_presence_provider_external UNIQUE (provider, external_id);
+          END IF;
+        END $$;
+        """),
+    # Online conversion to daily partitions; manages its own connections (CREATE INDEX CONCURRENTLY)
+    Migration(11, "session_snapshots_partitioning", run=_step_0011_session_snapshots_partitioning),
+    # Live sessions: the worker's registry load and the stale-session scan without a registry
+    Migration(12, "sessions_live_index", """
+        CREATE INDEX IF NOT EXISTS ix_sessions_live_last_seen
+          ON sessions(last_seen_at) WHERE ended_at IS NULL;
+        """),
+    # Per-match records segmented by the worker from session state and map transitions
+    Migration(13, "matches", """
+        CREATE TABLE IF NOT EXISTS matches (
+          id BIGSERIAL PRIMARY KEY,
+          session_id VARCHAR(128) NOT NULL,
+          started_at TIMESTAMPTZ NOT NULL,
+          last_seen_at TIMESTAMPTZ NOT NULL,
+          ended_at TIMESTAMPTZ,
+          map_file VARCHAR(128),
+          mod_id VARCHAR(32),
+          game_mode VARCHAR(64),
+          peak_players INTEGER NOT NULL DEFAULT 0,
+          roster JSON
+        );
+        CREATE INDEX IF NOT EXISTS ix_matches_map_time ON matches(map_file, started_at);
+        CREATE INDEX IF NOT EXISTS ix_matches_started ON matches(started_at);
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_matches_open_session ON matches(session_id) WHERE ended_at IS NULL;
+        """),
+    # Player lookups by in-game name (session_players.name, truncated to 128 characters)
+    Migration(14, "session_players_name_index", """
+        CREATE INDEX IF NOT EXISTS ix_session_players_name ON session_players(name);
+        """),
+]
+
+
+def _applied(conn) -> Dict[int, str]:
+    if conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+        return {}
+    return dict(conn.execute(text("SELECT version, checksum FROM schema_migrations")).all())
+
+
+def schema_status() -> Tuple[List[Migration], List[Migration]]:
+    """(pending, changed): steps not applied yet, and applied steps whose checksum no longer matches."""
+    with get_engine().connect() as conn:
+        applied = _applied(conn)
+    pending = [m for m in MIGRATIONS if m.version not in applied]
+    # Code-backed steps were once checksummed by their source; migrate() rewrites those rows
+    changed = [m for m in MIGRATIONS if m.version in applied and m.run is None and applied[m.version] != m.checksum]
+    return pending, changed
+
+
+def verify_schema() -> None:
+    """Boot check: one read of the ledger; raises when the database is behind the code."""
+    pending, changed = schema_status()
+    if changed:
+        raise RuntimeError(f"applied migrations were edited: {', '.join(f'{m.version:04d}_{m.name}' for m in changed)}")
+    if pending:
+        raise RuntimeError(
+            f"database schema is {len(pending)} migration(s) behind (next: {pending[0].version:04d}_{pending[0].name}); "
+            "run `python -m app.migrate`"
+        )
+
+
+def migrate() -> List[int]:
+    """Apply pending migrations in order; concurrent callers wait on the lock, then find nothing to do."""
+    # Session-level advisory lock: taken on a direct server connection, never through PgBouncer
+    lock_engine = create_role_engine("migrate")
+    lock = lock_engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        lock.execute(text("SELECT pg_advisory_lock(hashtextextended(:k, 0))"), {"k": MIGRATION_LOCK})
+        with get_engine().begin() as conn:
+            conn.execute(text(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                  version INTEGER PRIMARY KEY,
+                  name VARCHAR(128) NOT NULL,
+                  checksum VARCHAR(64) NOT NULL,
+                  applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                  duration_ms INTEGER
+                );
+                """
+            ))
+        pending, changed = schema_status()
+        if changed:
+            raise RuntimeError(f"applied migrations were edited: {', '.join(f'{m.version:04d}_{m.name}' for m in changed)}")
+        with get_engine().begin() as conn:
+            for m in MIGRATIONS:
+                if m.run is not None:
+                    conn.execute(text(
+                        "UPDATE schema_migrations SET checksum = :c WHERE version = :v AND checksum <> :c"
+                    ), {"v": m.version, "c": m.checksum})
+        for m in pending:
+            started = time.monotonic()
+            print(f"[migrate] applying {m.version:04d}_{m.name}", flush=True)
+            if m.run is not None:
+                m.run()
+            with get_engine().begin() as conn:
+                if m.sql is not None:
+                    conn.execute(text(m.sql))
+                conn.execute(text(
+                    "INSERT INTO schema_migrations(version, name, checksum, duration_ms) VALUES (:v, :n, :c, :d)"
+                ), {"v": m.version, "n": m.name, "c": m.checksum, "d": int((time.monotonic() - started) * 1000)})
+        return [m.version for m in pending]
+    finally:
+        try:
+            lock.execute(text("SELECT pg_advisory_unlock(hashtextextended(:k, 0))"), {"k": MIGRATION_LOCK})
+        finally:
+            lock.close()
+            lock_engine.dispose()
+
+
+if __name__ == "__main__":
+    # python -m app.migrate [--check]
+    configure("migrate")
+    if "--check" in sys.argv[1:]:
+        pending, changed = schema_status()
+        for m in changed:
+            print(f"[migrate] changed since applied: {m.version:04d}_{m.name}", flush=True)
+        for m in pending:
+            print(f"[migrate] pending: {m.version:04d}_{m.name}", flush=True)
+        sys.exit(1 if pending or changed else 0)
+    applied = migrate()
+    print(f"[migrate] applied {len(applied)} migration(s); schema at version {MIGRATIONS[-1].version}", flush=True)
 
 
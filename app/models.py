@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import String, BigInteger, ForeignKey, DateTime, Integer, JSON, Text, Boolean
+from sqlalchemy import String, BigInteger, ForeignKey, DateTime, Date, Integer, JSON, Text, Boolean
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import UniqueConstraint, Index
+from sqlalchemy import UniqueConstraint, Index, text
 
 
 class Base(DeclarativeBase):
@@ -69,9 +69,84 @@ class SessionPlayer(Base):
     slot: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     team_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     is_host: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
+    steam_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    name: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, index=True)
     stats: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
 
 
+class PlayerName(Base):
+    # Last in-game name seen per Steam id; refreshed by save_sessions on every tick
+    __tablename__ = "player_names"
+
+    steam_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[str] = mapped_column(String(128))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class PlayerSession(Base):
+    # Append-only participation log: one row per stint of a Steam id in a session,
+    # extended in place while the player stays in the lobby
+    __tablename__ = "player_sessions"
+    __table_args__ = (
+        Index("ix_player_sessions_player_time", "steam_id", "first_seen_at", "id"),
+        Index("ix_player_sessions_session", "session_id", "last_seen_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    steam_id: Mapped[str] = mapped_column(String(64))
+    session_id: Mapped[str] = mapped_column(String(128))
+    slot: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    team_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    first_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    last_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    kills: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    deaths: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    score: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Set once the stint has been folded into player_stats after its session ended
+    rolled_up: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
+
+
+class PlayerStat(Base):
+    # All-time per-Steam-id aggregates, maintained incrementally as sessions end
+    __tablename__ = "player_stats"
+
+    steam_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    games: Mapped[int] = mapped_column(Integer, default=0)
+    kills: Mapped[int] = mapped_column(BigInteger, default=0)
+    deaths: Mapped[int] = mapped_column(BigInteger, default=0)
+    score: Mapped[int] = mapped_column(BigInteger, default=0)
+    play_seconds: Mapped[int] = mapped_column(BigInteger, default=0)
+    map_counts: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # map_file -> games
+    mod_counts: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # mod_id -> games
+    last_played_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PlayerStatDaily(Base):
+    # Same counters bucketed by the UTC day the session ended; summed for windowed leaderboards
+    __tablename__ = "player_stats_daily"
+    __table_args__ = (
+        Index("ix_player_stats_daily_day", "day"),
+    )
+
+    steam_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    games: Mapped[int] = mapped_column(Integer, default=0)
+    kills: Mapped[int] = mapped_column(BigInteger, default=0)
+    deaths: Mapped[int] = mapped_column(BigInteger, default=0)
+    score: Mapped[int] = mapped_column(BigInteger, default=0)
+    play_seconds: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class LeaderboardDoc(Base):
+    # Precomputed top-N lists for one time window, stored as the JSON served to clients
+    __tablename__ = "leaderboards"
+
+    window: Mapped[str] = mapped_column(String(16), primary_key=True)
+    body: Mapped[str] = mapped_column(Text)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
 class Mod(Base):
     __tablename__ = "mods"
 
@@ -94,6 +169,8 @@ class Level(Base):
 
 
 class SessionSnapshot(Base):
+    # Range-partitioned by day on observed_at in Postgres (see migrate.ensure_snapshot_partitioning);
+    # the physical primary key there is (id, observed_at), id alone stays unique via its sequence.
     __tablename__ = "session_snapshots"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -105,6 +182,28 @@ class SessionSnapshot(Base):
     mod_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
 
 
+class Match(Base):
+    # One game within a session's lobby: opened when it goes InGame, kept through PostGame, closed
+    # on the next lobby, restart or map change, or when the session ends. Roster is the last seen
+    __tablename__ = "matches"
+    __table_args__ = (
+        Index("ix_matches_map_time", "map_file", "started_at"),
+        Index("ix_matches_started", "started_at"),
+        Index("uq_matches_open_session", "session_id", unique=True, postgresql_where=text("ended_at IS NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(String(128))
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    last_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    ended_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    map_file: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    mod_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    game_mode: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    peak_players: Mapped[int] = mapped_column(Integer, default=0)
+    roster: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)  # [{steam_id, name, slot, team_id, kills, deaths, score}]
+
+
 class SitePresence(Base):
     __tablename__ = "site_presence"
 
@@ -159,4 +258,23 @@ class TeamPickParticipant(Base):
     pick_session_id: Mapped[int] = mapped_column(ForeignKey("team_pick_sessions.id", ondelete="CASCADE"))
     provider: Mapped[str] = mapped_column(String(16))
     external_id: Mapped[str] = mapped_column(String(64))
-    role: Mapped[str] = mapped_column(String(16))  # commander1, commander2, viewer
\ No newline at end of file
+    role: Mapped[str] = mapped_column(String(16))  # commander1, commander2, viewer
+
+
+# Append-only Team Picker event stream, one per game session (version is per stream)
+class TeamPickEvent(Base):
+    __tablename__ = "team_pick_events"
+    __table_args__ = (
+        UniqueConstraint("session_id", "version", name="uq_team_pick_event_version"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(String(128))
+    version: Mapped[int] = mapped_column(Integer)
+    # No foreign key: the stream outlives "clear", which deletes the pick sessions themselves
+    pick_session_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    kind: Mapped[str] = mapped_column(String(16))  # started, canceled, coin_tossed, picked, accepted, finalized, cleared
+    data: Mapped[dict] = mapped_column(JSON, default=dict)
+    actor_provider: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    actor_external_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
+from app.records import NormalizedPlayer, NormalizedSession
 from app.util_base64 import decode_raknet_guid, b64_to_str, sanitize_text
 
 
-def normalize_bzcc_sessions(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
-    sessions: List[Dict[str, Any]] = []
+def normalize_bzcc_sessions(payload: Dict[str, Any]) -> List[NormalizedSession]:
+    sessions: List[NormalizedSession] = []
     items = payload.get("GET") or []
     for raw in items:
         nat = raw.get("g") or raw.get("NATNegID")
@@ -51,19 +52,17 @@ def normalize_bzcc_sessions(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
                     team_val = 1
                 elif 6 <= slot_val <= 10:
                     team_val = 2
-            player = {
-                "raw_id": pid,
-                "steam_id": pid[1:] if isinstance(pid, str) and pid.startswith("S") else None,
-                "gog_id": pid[1:] if isinstance(pid, str) and pid.startswith("G") else None,
-                "name": player_name,
-                "slot": slot_val,
-                "team_id": team_val,
-                "stats": {
-                    "kills": p.get("k"),
-                    "deaths": p.get("d"),
-                    "score": p.get("s"),
-                },
-            }
+            player = NormalizedPlayer(
+                raw_id=pid,
+                steam_id=pid[1:] if isinstance(pid, str) and pid.startswith("S") else None,
+                gog_id=pid[1:] if isinstance(pid, str) and pid.startswith("G") else None,
+                name=player_name,
+                slot=slot_val,
+                team_id=team_val,
+                kills=p.get("k"),
+                deaths=p.get("d"),
+                score=p.get("s"),
+            )
             players.append(player)
 
         # Derive state from server info mode (si)
@@ -162,22 +161,22 @@ def normalize_bzcc_sessions(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
         if game_mode:
             attributes["game_mode"] = game_mode
 
-        sess = {
-            "id": session_id,
-            "source": source,
-            "name": session_name,
-            "tps": tps,
-            "version": ver,
-            "player_count": cur_players,
-            "nat": nat,
-            "state": state,
-            "nat_type": nat_type,
-            "players": players,
-            "map_file": map_file,
-            "mod": mod,
-            "mods": mods,
-            "attributes": attributes or None,
-        }
+        sess = NormalizedSession(
+            id=session_id,
+            source=source,
+            name=session_name,
+            tps=tps,
+            version=ver,
+            player_count=cur_players,
+            nat=nat,
+            state=state,
+            nat_type=nat_type,
+            players=players,
+            map_file=map_file,
+            mod=mod,
+            mods=mods,
+            attributes=attributes or None,
+        )
         sessions.append(sess)
     return sessions
 
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import abc
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+
+
+# Entries older than this are dropped; callers decide "active" with their own, shorter window
+PRESENCE_TTL_SECONDS = 120
+# Scopes (one per Team Picker session and per signed-in user) kept by the in-memory fallback
+# before LRU eviction
+MEMORY_MAX_SCOPES = 16384
+# Signed-in site presence: one scope per user with an entry per Socket.IO connection (or HTTP
+# heartbeat), see site_conn_scope(), and one scope with an entry per user
+SITE_CONN_SCOPE_PREFIX = "site:conns:"
+SITE_USER_SCOPE = "site:users"
+SITE_PRESENCE_TTL_SECONDS = 30
+
+
+class PresenceStore(abc.ABC):
+    """Last-seen timestamps of members within a scope, e.g. participants of one Team Picker session.
+
+    Members are opaque strings ("steam:7656..."). Timestamps are epoch seconds.
+    """
+
+    @abc.abstractmethod
+    def touch(self, scope: str, member: str, ts: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def last_seen_many(self, scope: str, members: Iterable[str]) -> Dict[str, float]:
+        """Last-seen time for each member that has a live entry, in one round trip."""
+        ...
+
+    @abc.abstractmethod
+    def active_since(self, scope: str, since_ts: float) -> List[str]:
+        """Members seen at or after since_ts, via a range query on the ordered index."""
+        ...
+
+    @abc.abstractmethod
+    def remove(self, scope: str, member: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def try_lock(self, name: str, ttl_seconds: float) -> bool:
+        """Best-effort lock shared by all processes using the store; expires on its own."""
+        ...
+
+    def active(self, scope: str, members: Iterable[str], within_seconds: float) -> Dict[str, bool]:
+        members = list(members)
+        cutoff = time.time() - within_seconds
+        seen = self.last_seen_many(scope, members)
+        return {m: seen.get(m, 0.0) >= cutoff for m in members}
+
+
+class RedisPresenceStore(PresenceStore):
+    """One sorted set per scope (member -> last-seen ts), expiring with the scope's last touch."""
+
+    def __init__(self, client, prefix: str = "presence:", ttl_seconds: int = PRESENCE_TTL_SECONDS) -> None:
+        self.r = client
+        self.prefix = prefix
+        self.ttl = ttl_seconds
+
+    def _key(self, scope: str) -> str:
+        return f"{self.prefix}{scope}"
+
+    def touch(self, scope: str, member: str, ts: Optional[float] = None) -> None:
+        now = time.time() if ts is None else ts
+        key = self._key(scope)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zadd(key, {member: now})
+        pipe.zremrangebyscore(key, "-inf", now - self.ttl)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def last_seen_many(self, scope: str, members: Iterable[str]) -> Dict[str, float]:
+        members = list(members)
+        if not members:
+            return {}
+        scores = self.r.zmscore(self._key(scope), members)
+        floor = time.time() - self.ttl
+        return {m: float(s) for m, s in zip(members, scores) if s is not None and float(s) >= floor}
+
+    def active_since(self, scope: str, since_ts: float) -> List[str]:
+        since_ts = max(since_ts, time.time() - self.ttl)
+        return [m.decode() if isinstance(m, bytes) else m for m in self.r.zrangebyscore(self._key(scope), since_ts, "+inf")]
+
+    def remove(self, scope: str, member: str) -> None:
+        self.r.zrem(self._key(scope), member)
+
+    def try_lock(self, name: str, ttl_seconds: float) -> bool:
+        return bool(self.r.set(f"{self.prefix}lock:{name}", "1", nx=True, px=max(1, int(ttl_seconds * 1000))))
+
+
+class _Scope:
+    __slots__ = ("last", "order")
+
+    def __init__(self) -> None:
+        self.last: Dict[str, float] = {}
+        self.order: List[Tuple[float, str]] = []  # sorted by (ts, member)
+
+
+class MemoryPresenceStore(PresenceStore):
+    """Single-process fallback: per-scope dict plus a sorted (ts, member) list, LRU-bounded by scope."""
+
+    def __init__(self, ttl_seconds: int = PRESENCE_TTL_SECONDS, max_scopes: int = MEMORY_MAX_SCOPES) -> None:
+        self.ttl = ttl_seconds
+        self.max_scopes = max_scopes
+        self._lock = threading.Lock()
+        self._scopes: "OrderedDict[str, _Scope]" = OrderedDict()
+        self._locks: Dict[str, float] = {}
+
+    def _expire(self, sc: _Scope, now: float) -> None:
+        cut = bisect.bisect_left(sc.order, (now - self.ttl, ""))
+        if cut:
+            for _ts, m in sc.order[:cut]:
+                sc.last.pop(m, None)
+            del sc.order[:cut]
+
+    def touch(self, scope: str, member: str, ts: Optional[float] = None) -> None:
+        now = time.time() if ts is None else ts
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None:
+                sc = self._scopes[scope] = _Scope()
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+            else:
+                self._scopes.move_to_end(scope)
+            prev = sc.last.get(member)
+            if prev is not None:
+                i = bisect.bisect_left(sc.order, (prev, member))
+                if i < len(sc.order) and sc.order[i] == (prev, member):
+                    del sc.order[i]
+            sc.last[member] = now
+            bisect.insort(sc.order, (now, member))
+            self._expire(sc, now)
+
+    def last_seen_many(self, scope: str, members: Iterable[str]) -> Dict[str, float]:
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None:
+                return {}
+            self._expire(sc, time.time())
+            return {m: sc.last[m] for m in members if m in sc.last}
+
+    def active_since(self, scope: str, since_ts: float) -> List[str]:
+        with self._lock:
+            sc = self._scopes.get(scope)
+            if sc is None:
+                return []
+            self._expire(sc, time.time())
+            i = bisect.bisect_left(sc.order, (since_ts, ""))
+            return [m for _ts, m in sc.order[i:]]
+
+    def remove(self, scope: str, member: str) -> None:
+        with self._lock:
+            sc = self._scopes.get(scope)
+            prev = sc.last.pop(member, None) if sc is not None else None
+            if prev is not None:
+                i = bisect.bisect_left(sc.order, (prev, member))
+                if i < len(sc.order) and sc.order[i] == (prev, member):
+                    del sc.order[i]
+
+    def try_lock(self, name: str, ttl_seconds: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._locks.get(name, 0.0) > now:
+                return False
+            self._locks[name] = now + ttl_seconds
+            return True
+
+
+_store: Optional[PresenceStore] = None
+_store_lock = threading.Lock()
+
+
+def get_presence_store() -> PresenceStore:
+    """Redis-backed when REDIS_URL is set and reachable, so every web process shares presence."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store: PresenceStore = MemoryPresenceStore()
+                if settings.redis_url:
+                    try:
+                        import redis  # type: ignore
+                        client = redis.Redis.from_url(settings.redis_url, socket_timeout=2)
+                        client.ping()
+                        store = RedisPresenceStore(client)
+                    except Exception as ex:
+                        print(f"[presence] redis unavailable, using in-memory store: {ex}", flush=True)
+                _store = store
+    return _store
+
+
+def team_pick_scope(session_id: str) -> str:
+    return f"team_pick:{session_id}"
+
+
+def site_conn_scope(uid: str) -> str:
+    return f"{SITE_CONN_SCOPE_PREFIX}{uid}"
+
+
+class PresenceWriteBuffer:
+    """Coalesces site_presence writes: latest timestamp per user, flushed as one upsert.
+
+    Users whose last flushed stamp is younger than stale_seconds are skipped here as well as
+    in the upsert's WHERE clause, so steady heartbeats cost no database round trips. Online/
+    offline transitions are added with force=True and always written.
+    """
+
+    def __init__(self, stale_seconds: int) -> None:
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._pending: Dict[str, float] = {}
+        self._forced: Set[str] = set()
+        self._flushed: Dict[str, float] = {}
+
+    def add(self, uid: str, ts: Optional[float] = None, force: bool = False) -> None:
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if not force and ts - self._flushed.get(uid, 0.0) < self.stale_seconds:
+                return
+            if ts > self._pending.get(uid, 0.0):
+                self._pending[uid] = ts
+            if force:
+                self._forced.add(uid)
+
+    def flush(self) -> int:
+        from datetime import datetime, timezone
+        from app.store import upsert_site_presence
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            forced, self._forced = self._forced, set()
+        if not pending:
+            return 0
+
+        def _rows(uids: Iterable[str]) -> List[Tuple[str, str, datetime]]:
+            return [(*uid.split(":", 1), datetime.fromtimestamp(pending[uid], timezone.utc).replace(tzinfo=None)) for uid in sorted(uids) if ":" in uid]
+
+        rows = _rows(u for u in pending if u not in forced)
+        forced_rows = _rows(u for u in pending if u in forced)
+        try:
+            upsert_site_presence(rows, self.stale_seconds)
+            # Transitions only need to move last_seen_at forward
+            upsert_site_presence(forced_rows, 0)
+        except Exception:
+            with self._lock:
+                for uid, ts in pending.items():
+                    if ts > self._pending.get(uid, 0.0):
+                        self._pending[uid] = ts
+                self._forced.update(forced)
+            raise
+        with self._lock:
+            self._flushed.update(pending)
+            floor = time.time() - self.stale_seconds
+            self._flushed = {u: t for u, t in self._flushed.items() if t >= floor}
+        return len(rows) + len(forced_rows)
+
+
+presence_writes = PresenceWriteBuffer(settings.presence_stale_seconds)
+
+
+# Site presence. A user ("steam:7656...") is online while any of their connections has been
+# seen within SITE_PRESENCE_TTL_SECONDS. The functions return True on an online/offline
+# transition, which is when callers persist to site_presence and notify clients.
+
+def _site_user_fresh(store: PresenceStore, uid: str, now: float) -> bool:
+    return store.last_seen_many(SITE_USER_SCOPE, [uid]).get(uid, 0.0) >= now - SITE_PRESENCE_TTL_SECONDS
+
+
+def site_seen(uid: str, conn_id: str) -> bool:
+    """Connect or heartbeat from one connection; True if the user just came online."""
+    store = get_presence_store()
+    now = time.time()
+    came_online = not _site_user_fresh(store, uid, now)
+    store.touch(site_conn_scope(uid), conn_id, now)
+    store.touch(SITE_USER_SCOPE, uid, now)
+    presence_writes.add(uid, now, force=came_online)
+    return came_online
+
+
+def _live_conns(store: PresenceStore, uid: str, now: float) -> List[str]:
+    # The user's own scope: one range query over their connections, not the whole site's
+    return store.active_since(site_conn_scope(uid), now - SITE_PRESENCE_TTL_SECONDS)
+
+
+def site_gone(uid: str, conn_id: Optional[str] = None) -> bool:
+    """Drop one connection (or all of the user's with conn_id=None); True if the user went offline."""
+    store = get_presence_store()
+    now = time.time()
+    was_online = _site_user_fresh(store, uid, now)
+    scope = site_conn_scope(uid)
+    if conn_id is None:
+        for m in _live_conns(store, uid, now):
+            store.remove(scope, m)
+    else:
+        store.remove(scope, conn_id)
+    if _live_conns(store, uid, now):
+        return False
+    store.remove(SITE_USER_SCOPE, uid)
+    if was_online:
+        presence_writes.add(uid, now, force=True)
+    return was_online
+
+
+def site_online_users() -> List[str]:
+    return get_presence_store().active_since(SITE_USER_SCOPE, time.time() - SITE_PRESENCE_TTL_SECONDS)
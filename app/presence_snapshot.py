@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.jsoncodec import dumps
+from app.records import SessionView
+
+
+# Sidebar presence in one document: signed-in site users (presence store) and in-game
+# players (current tick). Rebuilt only when either source changes; the version is a hash
+# of the content, so every web process hands out the same version for the same snapshot.
+
+PROFILE_TTL_SECONDS = 60.0
+LONG_POLL_MAX_SECONDS = 25.0
+
+
+class Snapshot(NamedTuple):
+    version: str
+    doc: Dict[str, Any]
+    body: bytes
+
+
+def in_game_players(sessions: List[SessionView]) -> List[Dict[str, Any]]:
+    """Unique players across current sessions (by Steam id, else by name), sorted by name."""
+    seen: Dict[str, Dict[str, Any]] = {}
+    for s in sessions:
+        for p in s.players:
+            steam = p.steam or {}
+            if steam.get("id"):
+                key = f"steam:{steam['id']}"
+            elif p.name:
+                key = f"name:{p.name}"
+            else:
+                continue
+            if key not in seen:
+                seen[key] = {
+                    "name": steam.get("nickname") or p.name or "Player",
+                    "steam": {
+                        "id": steam.get("id"),
+                        "nickname": steam.get("nickname"),
+                        "avatar": steam.get("avatar"),
+                        "url": steam.get("url"),
+                    },
+                    "in_game": True,
+                }
+    players = list(seen.values())
+    players.sort(key=lambda x: (x.get("steam", {}).get("nickname") or x.get("name") or "").lower())
+    return players
+
+
+class PresenceSnapshots:
+    """Current presence snapshot, re-probed at most once per probe_interval.
+
+    `sessions_version`/`sessions` come from LiveSessions, `online_users` from the presence
+    store ("provider:id" strings) and `profiles` resolves (provider, id) pairs to sidebar
+    entries; resolved profiles are reused for PROFILE_TTL_SECONDS.
+    """
+
+    def __init__(
+        self,
+        sessions: Callable[[], List[SessionView]],
+        sessions_version: Callable[[], Any],
+        online_users: Callable[[], List[str]],
+        profiles: Callable[[List[Tuple[str, str]]], List[Dict[str, Any]]],
+        probe_interval: float = 1.0,
+    ) -> None:
+        self._sessions = sessions
+        self._sessions_version = sessions_version
+        self._online_users = online_users
+        self._profiles = profiles
+        self._probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._probed_at = float("-inf")
+        self._token: Any = object()
+        self._snap = self._encode([], [])
+        self._profile_cache: Dict[str, Dict[str, Any]] = {}
+        self._profile_expires = 0.0
+
+    @staticmethod
+    def _encode(site: List[Dict[str, Any]], in_game: List[Dict[str, Any]]) -> Snapshot:
+        content = {"site": site, "in_game": in_game}
+        version = hashlib.blake2b(dumps(content), digest_size=8).hexdigest()
+        doc = {"version": version, **content}
+        return Snapshot(version, doc, dumps(doc) + b"\n")
+
+    def _site(self, online: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        if now >= self._profile_expires:
+            self._profile_cache = {}
+            self._profile_expires = now + PROFILE_TTL_SECONDS
+        pairs = [tuple(u.split(":", 1)) for u in online if ":" in u]
+        missing = [pair for pair in pairs if f"{pair[0]}:{pair[1]}" not in self._profile_cache]
+        for entry in self._profiles(missing):  # type: ignore[arg-type]
+            self._profile_cache[f"{entry['provider']}:{entry['id']}"] = entry
+        return [self._profile_cache[f"{p}:{e}"] for p, e in pairs if f"{p}:{e}" in self._profile_cache]
+
+    def current(self) -> Snapshot:
+        now = time.monotonic()
+        if now - self._probed_at < self._probe_interval:
+            return self._snap
+        with self._lock:
+            if now - self._probed_at < self._probe_interval:
+                return self._snap
+            online = tuple(sorted(self._online_users()))
+            token = (self._sessions_version(), online)
+            if token != self._token:
+                self._snap = self._encode(self._site(online), in_game_players(self._sessions()))
+                self._token = token
+            self._probed_at = time.monotonic()
+            return self._snap
+
+    def wait(self, since: Optional[str], timeout: float, sleep: Callable[[float], Any] = time.sleep) -> Snapshot:
+        """Long-poll: return once the version differs from `since`, or the current one at timeout."""
+        snap = self.current()
+        deadline = time.monotonic() + max(0.0, min(timeout, LONG_POLL_MAX_SECONDS))
+        while since and snap.version == since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sleep(min(self._probe_interval, remaining))
+            snap = self.current()
+        return snap
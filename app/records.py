@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+# Typed records passed between the parser, store, worker and API. Each one converts to
+# the historical dict shape exactly once, at the edge, via to_dict().
+
+
+@dataclass(slots=True)
+class NormalizedPlayer:
+    raw_id: Optional[str]
+    steam_id: Optional[str]
+    gog_id: Optional[str]
+    name: Optional[str]
+    slot: Optional[int]
+    team_id: Optional[int]
+    kills: Any = None
+    deaths: Any = None
+    score: Any = None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {"kills": self.kills, "deaths": self.deaths, "score": self.score}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "raw_id": self.raw_id,
+            "steam_id": self.steam_id,
+            "gog_id": self.gog_id,
+            "name": self.name,
+            "slot": self.slot,
+            "team_id": self.team_id,
+            "stats": self.stats,
+        }
+
+
+@dataclass(slots=True)
+class NormalizedSession:
+    id: str
+    source: str
+    name: Optional[str]
+    tps: Any
+    version: Optional[str]
+    player_count: int
+    nat: str
+    state: Optional[str]
+    nat_type: Optional[str]
+    players: List[NormalizedPlayer]
+    map_file: Optional[str]
+    mod: Optional[str]
+    mods: List[str]
+    attributes: Optional[Dict[str, Any]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "name": self.name,
+            "tps": self.tps,
+            "version": self.version,
+            "player_count": self.player_count,
+            "nat": self.nat,
+            "state": self.state,
+            "nat_type": self.nat_type,
+            "players": [p.to_dict() for p in self.players],
+            "map_file": self.map_file,
+            "mod": self.mod,
+            "mods": self.mods,
+            "attributes": self.attributes,
+        }
+
+
+@dataclass(slots=True)
+class PlayerView:
+    slot: Optional[int]
+    is_host: Optional[bool]
+    name: Optional[str]
+    score: Any
+    team_id: Optional[int]
+    steam_id: Optional[str] = None
+    steam: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "slot": self.slot,
+            "is_host": self.is_host,
+            "name": self.name,
+            "score": self.score,
+            "team_id": self.team_id,
+        }
+        # Only players with a Steam id (and, for "steam", a known identity) carry these keys
+        if self.steam_id:
+            out["steam_id"] = self.steam_id
+        if self.steam is not None:
+            out["steam"] = self.steam
+        return out
+
+
+@dataclass(slots=True)
+class SessionView:
+    id: str
+    source: Optional[str]
+    name: Optional[str]
+    tps: Optional[int]
+    version: Optional[str]
+    state: Optional[str]
+    nat_type: Optional[str]
+    map_file: Optional[str]
+    mod: Optional[str]
+    mod_name: Optional[str]
+    mod_details: Optional[Dict[str, Any]]
+    attributes: Optional[Dict[str, Any]]
+    level: Optional[Dict[str, Any]]
+    last_seen_at: Optional[datetime]
+    players: List[PlayerView] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "name": self.name,
+            "tps": self.tps,
+            "version": self.version,
+            "state": self.state,
+            "nat_type": self.nat_type,
+            "map_file": self.map_file,
+            "mod": self.mod,
+            "mod_name": self.mod_name,
+            "mod_details": self.mod_details,
+            "attributes": self.attributes,
+            "level": self.level,
+            "last_seen_at": self.last_seen_at,
+            "players": [p.to_dict() for p in self.players],
+        }
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import contextlib
+import csv
+import gzip
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import delete, func, select
+
+from app.config import settings
+from app.db import session_scope
+from app.migrate import drop_snapshot_partition, has_snapshot_partition
+from app.models import SessionSnapshot
+
+
+ARCHIVE_COLUMNS = ("id", "session_id", "observed_at", "player_count", "state", "map_file", "mod_id")
+
+
+class ArchivedSnapshot(NamedTuple):
+    """A session_snapshots row read back from an archive file.
+
+    Exposes the same attribute names as SessionSnapshot so history
+    aggregations can iterate archive and DB rows interchangeably.
+    """
+    id: int
+    session_id: Optional[str]
+    observed_at: datetime
+    player_count: Optional[int]
+    state: Optional[str]
+    map_file: Optional[str]
+    mod_id: Optional[str]
+
+
+def _utc_naive(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """Start of the oldest UTC day that stays in Postgres, or None when retention is disabled."""
+    days = settings.snapshot_retention_days
+    if days <= 0:
+        return None
+    now = _utc_naive(now or datetime.utcnow())
+    return datetime.combine(now.date() - timedelta(days=days), datetime.min.time())
+
+
+def archive_path(day: date) -> str:
+    return os.path.join(settings.snapshot_archive_dir, f"{day.isoformat()}.csv.gz")
+
+
+def _append_rows(day: date, rows: List[SessionSnapshot]) -> None:
+    path = archive_path(day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    new_file = not os.path.exists(path)
+    # Each batch is appended as its own gzip member; gzip readers concatenate them transparently
+    with gzip.open(path, "at", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if new_file:
+            w.writerow(ARCHIVE_COLUMNS)
+        for r in rows:
+            w.writerow([
+                r.id,
+                r.session_id or "",
+                r.observed_at.isoformat() if r.observed_at else "",
+                "" if r.player_count is None else r.player_count,
+                r.state or "",
+                r.map_file or "",
+                r.mod_id or "",
+            ])
+
+
+def _cursor_path(day: date) -> str:
+    # Last id copied from a day partition that is not fully archived yet
+    return os.path.join(settings.snapshot_archive_dir, f"{day.isoformat()}.cursor")
+
+
+def _read_cursor(day: date) -> int:
+    try:
+        with open(_cursor_path(day), encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_cursor(day: date, last_id: int) -> None:
+    path = _cursor_path(day)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(str(last_id))
+    os.replace(f"{path}.tmp", path)
+
+
+def _archive_day(day: date, batch_size: int, pause: float, max_batches: int, delete_rows: bool = True) -> tuple[int, int, bool]:
+    """Copy one UTC day of snapshots into its archive file in id-ordered batches.
+
+    With delete_rows each batch is deleted as it is written; otherwise the
+    caller drops the day's partition once the copy is done, and the last copied
+    id is kept in a cursor file so a copy cut short by max_batches resumes there.
+    Returns (rows_moved, batches_used, done).
+    """
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    moved = 0
+    batches = 0
+    last_id = 0 if delete_rows else _read_cursor(day)
+    while batches < max_batches:
+        with session_scope() as db:
+            rows = db.execute(
+                select(SessionSnapshot)
+                .where(
+                    SessionSnapshot.observed_at >= start,
+                    SessionSnapshot.observed_at < end,
+                    SessionSnapshot.id > last_id,
+                )
+                .order_by(SessionSnapshot.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not rows:
+                return moved, batches, True
+            # Write the file first; the delete only commits once the batch is on disk
+            _append_rows(day, rows)
+            ids = [r.id for r in rows]
+            if delete_rows:
+                db.execute(
+                    delete(SessionSnapshot).where(SessionSnapshot.id.in_(ids)).execution_options(synchronize_session=False)
+                )
+            else:
+                _write_cursor(day, ids[-1])
+            last_id = ids[-1]
+        moved += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            return moved, batches, True
+        if pause > 0:
+            time.sleep(pause)
+    return moved, batches, False
+
+
+def archive_old_snapshots(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Archive and delete snapshots older than the retention window.
+
+    Work per call is bounded by RETENTION_MAX_BATCHES; anything left over is
+    picked up by the next run. Returns counts for logging.
+    """
+    cutoff = retention_cutoff(now)
+    if cutoff is None:
+        return {"rows": 0, "days": 0, "skipped": 1}
+    batch_size = max(1, settings.retention_batch_size)
+    pause = max(0.0, settings.retention_batch_pause_seconds)
+    budget = max(1, settings.retention_max_batches)
+    moved = 0
+    days = 0
+    while budget > 0:
+        with session_scope() as db:
+            oldest = db.execute(
+                select(func.min(SessionSnapshot.observed_at)).where(SessionSnapshot.observed_at < cutoff)
+            ).scalar()
+        if oldest is None:
+            break
+        day = _utc_naive(oldest).date()
+        if has_snapshot_partition(day):
+            # A whole-day partition is copied out within the same budget, resuming from its
+            # cursor, and dropped in one statement once all of it is in the archive
+            n, used, done = _archive_day(day, batch_size, pause, budget, delete_rows=False)
+            if done:
+                drop_snapshot_partition(day)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(_cursor_path(day))
+        else:
+            n, used, done = _archive_day(day, batch_size, pause, budget)
+        moved += n
+        days += 1
+        budget -= max(1, used)
+    return {"rows": moved, "days": days}
+
+
+def iter_archived_snapshots(start: datetime, end: datetime) -> Iterator[ArchivedSnapshot]:
+    """Yield archived snapshots with start <= observed_at < end, oldest day first."""
+    start = _utc_naive(start)
+    end = _utc_naive(end)
+    day = start.date()
+    while day <= end.date():
+        path = archive_path(day)
+        if os.path.exists(path):
+            seen: set[int] = set()
+            with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+                for rec in csv.DictReader(f):
+                    try:
+                        rid = int(rec["id"])
+                        observed = datetime.fromisoformat(rec["observed_at"])
+                    except (KeyError, ValueError):
+                        continue
+                    # A batch re-archived after a crash before its delete committed shows up twice
+                    if rid in seen:
+                        continue
+                    seen.add(rid)
+                    if not (start <= _utc_naive(observed) < end):
+                        continue
+                    yield ArchivedSnapshot(
+                        id=rid,
+                        session_id=rec.get("session_id") or None,
+                        observed_at=observed,
+                        player_count=int(rec["player_count"]) if rec.get("player_count") else None,
+                        state=rec.get("state") or None,
+                        map_file=rec.get("map_file") or None,
+                        mod_id=rec.get("mod_id") or None,
+                    )
+        day += timedelta(days=1)
+
+
+def archived_snapshots_for_window(cutoff: datetime, now: Optional[datetime] = None) -> Iterator[ArchivedSnapshot]:
+    """Archived rows for a history window starting at cutoff; empty unless it reaches past retention."""
+    horizon = retention_cutoff(now)
+    if horizon is None or _utc_naive(cutoff) >= horizon:
+        return iter(())
+    return iter_archived_snapshots(cutoff, horizon)
+
+
+def snapshots_for_window(cutoff: datetime, db_rows: Iterable[Any], now: Optional[datetime] = None) -> Iterator[Any]:
+    """Archived rows for the window followed by db_rows, each snapshot id once.
+
+    A crash between an archive append and its delete commit leaves a batch in both places.
+    """
+    seen: set[int] = set()
+    for row in archived_snapshots_for_window(cutoff, now):
+        seen.add(row.id)
+        yield row
+    for row in db_rows:
+        if row.id not in seen:
+            yield row
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.records import SessionView
+
+
+QueryKey = Tuple[Optional[str], Optional[str], Optional[int], Optional[str], Optional[str]]
+
+_MAX_CACHED_QUERIES = 256
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SessionIndex:
+    """Read-only filter/search index over one tick's current sessions.
+
+    Inverted indexes on state, NAT type and mod, a sorted player-count list for
+    min_players, and a trigram index over session titles and player names.
+    Results keep the input order (most recently seen first).
+    """
+
+    def __init__(self, sessions: List[SessionView]) -> None:
+        self.sessions = sessions
+        self.by_id: Dict[str, SessionView] = {s.id: s for s in sessions}
+        self.by_state: Dict[str, Set[int]] = {}
+        self.by_nat: Dict[str, Set[int]] = {}
+        self.by_mod: Dict[str, Set[int]] = {}
+        self.trigrams: Dict[str, Set[int]] = {}
+        self.texts: List[List[str]] = []
+        counts: List[Tuple[int, int]] = []
+        for i, s in enumerate(sessions):
+            self.by_state.setdefault((s.state or "").lower(), set()).add(i)
+            self.by_nat.setdefault((s.nat_type or "").lower(), set()).add(i)
+            self.by_mod.setdefault(s.mod or "", set()).add(i)
+            counts.append((len(s.players), i))
+            texts = [(s.name or "").lower()] + [(p.name or "").lower() for p in s.players]
+            self.texts.append(texts)
+            for t in texts:
+                for g in _trigrams(t):
+                    self.trigrams.setdefault(g, set()).add(i)
+        counts.sort()
+        self._count_keys = [c for c, _ in counts]
+        self._count_ids = [i for _, i in counts]
+
+    def _with_min_players(self, n: int) -> Set[int]:
+        return set(self._count_ids[bisect.bisect_left(self._count_keys, n):])
+
+    def _matching_text(self, q: str, candidates: Optional[Set[int]]) -> Set[int]:
+        if len(q) >= 3:
+            # Every trigram of q must occur in some text of the session; confirm with a substring check
+            found: Optional[Set[int]] = candidates
+            for g in sorted(_trigrams(q), key=lambda g: len(self.trigrams.get(g, ()))):
+                found = self.trigrams.get(g, set()) if found is None else found & self.trigrams.get(g, set())
+                if not found:
+                    return set()
+            pool: Iterable[int] = found if found is not None else range(len(self.sessions))
+        else:
+            pool = candidates if candidates is not None else range(len(self.sessions))
+        return {i for i in pool if any(q in t for t in self.texts[i])}
+
+    def query(self, key: QueryKey) -> List[SessionView]:
+        state, nat_type, min_players, mod, q = key
+        ids: Optional[Set[int]] = None
+
+        def _narrow(s: Set[int]) -> None:
+            nonlocal ids
+            ids = s if ids is None else ids & s
+
+        if state is not None:
+            _narrow(self.by_state.get(state, set()))
+        if nat_type is not None:
+            _narrow(self.by_nat.get(nat_type, set()))
+        if mod is not None:
+            _narrow(self.by_mod.get(mod, set()))
+        if min_players is not None:
+            _narrow(self._with_min_players(min_players))
+        if q is not None:
+            ids = self._matching_text(q, ids)
+        if ids is None:
+            return self.sessions
+        return [self.sessions[i] for i in sorted(ids)]
+
+
+def normalize_query(state: Optional[str], nat_type: Optional[str], min_players: Optional[int],
+                    mod: Optional[str], q: Optional[str]) -> QueryKey:
+    """Canonical cache key; empty parameters mean "no filter", as in the original request handling."""
+    return (
+        state.strip().lower() if state else None,
+        nat_type.strip().lower() if nat_type else None,
+        min_players if isinstance(min_players, int) else None,
+        mod if mod else None,
+        q.strip().lower() if q else None,
+    )
+
+
+class LiveSessions:
+    """Holds the SessionIndex for the latest tick and a per-query result cache.
+
+    `probe` returns a cheap version token for the current session set; the index and
+    cache are rebuilt only when it changes, i.e. at most once per worker tick. `load`
+    returns (version, sessions) read together, and the index is kept under that version.
+    """
+
+    def __init__(self, load: Callable[[], Tuple[Any, List[SessionView]]], probe: Callable[[], Any],
+                 probe_interval: float = 1.0) -> None:
+        self._load = load
+        self._probe = probe
+        self._probe_interval = probe_interval
+        self._probed: Tuple[float, Any] = (float("-inf"), None)
+        self._lock = threading.Lock()
+        # (version, index, result cache) swapped as one tuple so readers never mix ticks
+        self._state: Tuple[Any, SessionIndex, Dict[QueryKey, List[SessionView]]] = (object(), SessionIndex([]), {})
+
+    def version(self) -> Any:
+        """Current tick token; the probe query runs at most once per probe_interval."""
+        at, version = self._probed
+        now = time.monotonic()
+        if now - at >= self._probe_interval:
+            version = self._probe()
+            self._probed = (now, version)
+        return version
+
+    def _current(self) -> Tuple[Any, SessionIndex, Dict[QueryKey, List[SessionView]]]:
+        version = self.version()
+        state = self._state
+        if version != state[0]:
+            with self._lock:
+                state = self._state
+                if version != state[0]:
+                    version, sessions = self._load()
+                    state = (version, SessionIndex(sessions), {})
+                    self._state = state
+                    # The load is the newer probe; the next one is due after probe_interval
+                    self._probed = (time.monotonic(), version)
+        return state
+
+    def sessions(self) -> List[SessionView]:
+        return self._current()[1].sessions
+
+    def get(self, session_id: str) -> Optional[SessionView]:
+        return self._current()[1].by_id.get(session_id)
+
+    def query(self, key: QueryKey) -> List[SessionView]:
+        _version, index, cache = self._current()
+        hit = cache.get(key)
+        if hit is None:
+            hit = index.query(key)
+            if len(cache) >= _MAX_CACHED_QUERIES:
+                cache.clear()
+            cache[key] = hit
+        return hit
@@ -58,7 +58,9 @@
     return arr;
   }
 
+  let lastRendered = null;
   function render(data) {
+    lastRendered = data;
     if (!grid) return;
     grid.innerHTML = '';
     const sessionsRaw = data.sessions || [];
@@ -74,6 +76,12 @@
       grid.appendChild(empty);
       return;
     }
+    // Team Picker badges arrive with the feed; anything without one is looked up in bulk below
+    const tpApply = (window.__TP_APPLY__ = new Map()); // session id -> applyUI(active)
+    const tpStale = [];
+    sessions.forEach(s => {
+      if (s.team_picker) cache.set(s.id, { active: !!s.team_picker.active, version: s.team_picker.version, ts: Date.now() });
+    });
     sessions.forEach(s => {
       const card = document.createElement('div');
       card.className = 'card bg-base-200 border border-base-300 p-3';
@@ -174,25 +182,26 @@
         }
       };
       if (cached) applyUI(!!cached.active); // always use cache if present to avoid flicker
-      // Refresh in background if stale
-      if (!fresh) {
-        (async ()=>{
-          try {
-            console.log('[TP][card] fetch status', { sid: s.id });
-            const r = await fetch(`/api/v1/team_picker/${encodeURIComponent(s.id)}`);
-            const j = await r.json();
-            console.log('[TP][card] status resp', { sid: s.id, json: j });
-            const active = !!(j && j.session);
-            cache.set(s.id, { active, ts: Date.now() });
-            applyUI(active);
-          } catch (e) {
-            try { console.log('[TP][card] status error', { sid: s.id, error: String(e) }); } catch {}
-          }
-        })();
-      }
+      tpApply.set(s.id, applyUI);
+      if (!fresh) tpStale.push(s.id);
 
       grid.appendChild(card);
     });
+    // One bulk status request for every card whose badge is stale
+    if (tpStale.length) {
+      (async ()=>{
+        try {
+          const r = await fetch(`/api/v1/team_picker/status?ids=${tpStale.map(encodeURIComponent).join(',')}`);
+          const j = await r.json();
+          for (const [sid, st] of Object.entries((j && j.statuses) || {})) {
+            cache.set(sid, { active: !!st.active, version: st.version, ts: Date.now() });
+            const apply = tpApply.get(sid); if (apply) apply(!!st.active);
+          }
+        } catch (e) {
+          try { console.log('[TP][card] status error', { ids: tpStale, error: String(e) }); } catch {}
+        }
+      })();
+    }
     // no-op: no skeleton placeholder behavior
   }
 
@@ -283,6 +292,7 @@
   let socket;
   // Track last realtime update for Team Picker to avoid jittery polling
   let __TP_LAST_SOCKET_TS = 0;
+  const __TP_VERSIONS = {}; // game session id -> last Team Picker stream version seen
   function startSSE(){
     if (!window.EventSource) return;
     if (sse) sse.close();
@@ -314,13 +324,42 @@
     try {
       // eslint-disable-next-line no-undef
       socket = io('/', { transports: ['websocket', 'polling'] });
+      window.__SOCKET__ = socket;
       socket.on('connect', ()=>{ if (!sseLive) { if (connDot) connDot.className='dot ok'; if (connText) connText.textContent='Live'; } });
       socket.on('sessions:update', ()=>{ fetchOnce(); });
+      // Sent by the worker as soon as it ends sessions; drop their cards without a refetch
+      socket.on('sessions:ended', (msg)=>{
+        const gone = new Set((msg && msg.ids) || []);
+        if (!gone.size || !lastRendered) return;
+        render({ sessions: (lastRendered.sessions || []).filter(s => !gone.has(s.id)) });
+      });
+      // Invites arrive on our per-user room; on (re)connect catch up on any pushed while offline
+      socket.on('team_picker:invite', (item)=>{ if (typeof window.__TP_INVITE__ === 'function') window.__TP_INVITE__(item); });
+      socket.on('connect', ()=>{ if (typeof window.__TP_CHECK_INVITES__ === 'function') window.__TP_CHECK_INVITES__(); });
+      // Pushed at most once per second, only when the sidebar presence snapshot changes
+      socket.on('presence:snapshot', (snap)=>{ if (typeof window.__RENDER_ONLINE__ === 'function') window.__RENDER_ONLINE__(snap); });
+      // Badge changes between ticks; ignore anything older than what the card already shows
+      socket.on('team_picker:status', (payload)=>{
+        try {
+          if (!payload || !payload.session_id || !payload.status) return;
+          const cache = (window.__TP_STATUS_CACHE__ ||= new Map());
+          const cur = cache.get(payload.session_id);
+          if (cur && typeof cur.version === 'number' && payload.status.version < cur.version) return;
+          cache.set(payload.session_id, { active: !!payload.status.active, version: payload.status.version, ts: Date.now() });
+          const apply = window.__TP_APPLY__ && window.__TP_APPLY__.get(payload.session_id);
+          if (apply) apply(!!payload.status.active);
+        } catch {}
+      });
       socket.on('team_picker:update', (payload)=>{
         try {
           if (!window.__TP_OPEN__ || !payload || !payload.session_id) return;
           if (window.__TP_OPEN__ !== payload.session_id) return;
           __TP_LAST_SOCKET_TS = Date.now();
+          // Events carry the stream version; skip duplicates and anything older than what we rendered
+          if (typeof payload.version === 'number') {
+            if (payload.version <= (__TP_VERSIONS[payload.session_id] || 0)) return;
+            __TP_VERSIONS[payload.session_id] = payload.version;
+          }
           const sess = payload.session;
           if (sess && typeof window.__RENDER_TP === 'function') { window.__RENDER_TP(sess); return; }
           fetch(`/api/v1/team_picker/${encodeURIComponent(window.__TP_OPEN__)}`, {cache:'no-store'}).then(r=>r.json()).then(j=>{ if (j && j.session) { if (typeof window.__RENDER_TP === 'function') { window.__RENDER_TP(j.session); } } });
@@ -396,10 +435,14 @@
       if (sbName) sbName.textContent = user.display_name || user.id;
       if (sbProfile) sbProfile.href = user.profile;
       if (sbOpenProfile) sbOpenProfile.onclick = (e)=>{ e.preventDefault(); btnProfile?.click(); };
-      // Start presence heartbeat for site-online API
+      // Presence heartbeat: over the realtime socket when connected, HTTP otherwise
       if (!presenceTimer) {
-        const hb = async ()=>{ try { await fetch('/api/v1/presence/heartbeat', {method:'POST'}); } catch {} setTimeout(refreshOnline, 200); };
-        presenceTimer = setInterval(hb, 5000);
+        const hb = async ()=>{
+          const sock = window.__SOCKET__;
+          if (sock && sock.connected) { sock.emit('presence:heartbeat'); return; }
+          try { await fetch('/api/v1/presence/heartbeat', {method:'POST'}); } catch {}
+        };
+        presenceTimer = setInterval(hb, 10000);
         hb();
       }
       if (sbSignOut) sbSignOut.onclick = async (e)=>{ e.preventDefault(); try { await fetch('/auth/logout', {method:'POST'}); } catch {} location.href='/'; };
@@ -409,65 +452,68 @@
     }
   })();
 
-  // Players online sidebar — refresh periodically
-  async function refreshOnline(){
-    try {
-      const map = new Map();
-      // signed-in site presence
-      try {
-        const r1 = await fetch('/api/v1/players/site-online');
-        const j1 = await r1.json();
-        const rows = (j1 && Array.isArray(j1.players)) ? j1.players : [];
-        for (const p of rows) {
-          const key = p.provider === 'steam' && p.id ? `steam:${p.id}` : `${p.provider}:${p.id}`;
-          map.set(key, { name: p.display_name || p.id, avatar: p.avatar, profile: p.profile, signed: true });
-        }
-      } catch {}
-      // in-game players
+  // Players online sidebar: one versioned snapshot (signed-in site users + in-game players),
+  // pushed over the socket when realtime is on and long-polled otherwise
+  let onlineVersion = null;
+  function renderOnline(snap){
+    if (!snap || !snap.version || snap.version === onlineVersion) return;
+    onlineVersion = snap.version;
+    const map = new Map();
+    for (const p of (Array.isArray(snap.site) ? snap.site : [])) {
+      const key = p.provider === 'steam' && p.id ? `steam:${p.id}` : `${p.provider}:${p.id}`;
+      map.set(key, { name: p.display_name || p.id, avatar: p.avatar, profile: p.profile, signed: true });
+    }
+    for (const p of (Array.isArray(snap.in_game) ? snap.in_game : [])) {
+      const sid = p.steam && p.steam.id;
+      const key = sid ? `steam:${sid}` : `name:${p.name||''}`;
+      const name = (p.steam && p.steam.nickname) || p.name;
+      const avatar = p.steam && p.steam.avatar;
+      const profile = p.steam && p.steam.url;
+      if (!map.has(key)) map.set(key, { name, avatar, profile, signed: false });
+      else {
+        const cur = map.get(key);
+        map.set(key, { name: cur.name || name, avatar: cur.avatar || avatar, profile: cur.profile || profile, signed: cur.signed || false });
+      }
+    }
+    const players = Array.from(map.values()).sort((a,b)=>{
+      if (!!a.signed !== !!b.signed) return a.signed ? -1 : 1;
+      return (a.name||'').localeCompare(b.name||'');
+    });
+    if (onlineList) {
+      const items = players.map(p=>{
+        const av = p.avatar ? `<img src="${p.avatar}" class="tp-avatar-sm mr-2"/>` : '';
+        const name = p.name || 'Player';
+        const href = p.profile || '#';
+        const dot = p.signed ? '<span class="dot sm ok ml-2 flex-none"></span>' : '';
+        return `<a class="flex items-center text-sm mb-1" href="${href}" target="_blank" rel="noopener">${av}<span class="truncate flex-1">${name}</span>${dot}</a>`;
+      }).join('');
+      onlineList.innerHTML = items || '<span class="opacity-70 text-xs">No players online</span>';
+    }
+  }
+  window.__RENDER_ONLINE__ = renderOnline;
+
+  async function pollOnline(){
+    while (true) {
+      const sock = window.__SOCKET__;
+      // While the socket is up, pushes keep the sidebar current; only re-check occasionally
+      const live = sock && sock.connected;
+      const qs = (onlineVersion && !live) ? `?since=${encodeURIComponent(onlineVersion)}&wait=25` : '';
       try {
-        const r2 = await fetch('/api/v1/players/online');
-        const j2 = await r2.json();
-        const rows2 = (j2 && Array.isArray(j2.players)) ? j2.players : [];
-        for (const p of rows2) {
-          const sid = p.steam && p.steam.id;
-          const key = sid ? `steam:${sid}` : `name:${p.name||''}`;
-          const name = (p.steam && p.steam.nickname) || p.name;
-          const avatar = p.steam && p.steam.avatar;
-          const profile = p.steam && p.steam.url;
-          if (!map.has(key)) map.set(key, { name, avatar, profile, signed: false });
-          else {
-            const cur = map.get(key);
-            map.set(key, { name: cur.name || name, avatar: cur.avatar || avatar, profile: cur.profile || profile, signed: cur.signed || false });
-          }
-        }
-      } catch {}
-      const players = Array.from(map.values()).sort((a,b)=>{
-        if (!!a.signed !== !!b.signed) return a.signed ? -1 : 1;
-        return (a.name||'').localeCompare(b.name||'');
-      });
-      if (onlineList) {
-        const items = players.map(p=>{
-          const av = p.avatar ? `<img src="${p.avatar}" class="tp-avatar-sm mr-2"/>` : '';
-          const name = p.name || 'Player';
-          const href = p.profile || '#';
-          const dot = p.signed ? '<span class="dot sm ok ml-2 flex-none"></span>' : '';
-          return `<a class="flex items-center text-sm mb-1" href="${href}" target="_blank" rel="noopener">${av}<span class="truncate flex-1">${name}</span>${dot}</a>`;
-        }).join('');
-        onlineList.innerHTML = items || '<span class="opacity-70 text-xs">No players online</span>';
+        const r = await fetch(`/api/v1/presence/snapshot${qs}`, {cache:'no-store'});
+        renderOnline(await r.json());
+      } catch {
+        if (onlineList && !onlineVersion) onlineList.innerHTML = '<span class="opacity-70 text-xs">No players online</span>';
+        await new Promise(res=>setTimeout(res, 5000));
       }
-    } catch {
-      if (onlineList) onlineList.innerHTML = '<span class="opacity-70 text-xs">No players online</span>';
+      if (live || !qs) await new Promise(res=>setTimeout(res, live ? 30000 : 1000));
     }
   }
-  refreshOnline();
-  setInterval(refreshOnline, 5000);
+  pollOnline();
 
-  // Team Picker: poll for sessions open for me and prompt join
-  async function checkTeamPickerInvites(){
+  // Team Picker invites: pushed to our user room on start/restart; open_for_me covers cold starts
+  // and clients without a socket
+  function showTeamPickerInvite(items){
     try {
-      const r = await fetch('/api/v1/team_picker/open_for_me');
-      const j = await r.json();
-      const items = (j && Array.isArray(j.items)) ? j.items : [];
       if (!items.length || tpPromptOpen || window.__TP_OPEN__) return;
       // Pick the first session we haven't prompted for recently
       let s = null;
@@ -521,7 +567,22 @@
       }
     } catch {}
   }
-  setInterval(checkTeamPickerInvites, 5000);
+  async function checkTeamPickerInvites(){
+    try {
+      const r = await fetch('/api/v1/team_picker/open_for_me');
+      const j = await r.json();
+      showTeamPickerInvite((j && Array.isArray(j.items)) ? j.items : []);
+    } catch {}
+  }
+  window.__TP_CHECK_INVITES__ = checkTeamPickerInvites;
+  window.__TP_INVITE__ = (item)=>{
+    // Both commanders get the push; the one who started it is not prompted
+    const me = window.__ME__ || null;
+    const by = (item && item.created_by) || {};
+    if (!item || !item.session_id || (me && by.provider === me.provider && String(by.id) === String(me.id))) return;
+    showTeamPickerInvite([item]);
+  };
+  setInterval(()=>{ if (!(window.__SOCKET__ && window.__SOCKET__.connected)) checkTeamPickerInvites(); }, 5000);
   setTimeout(checkTeamPickerInvites, 1000);
 
   // Mock session button removed
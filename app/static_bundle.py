@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import Dict, Optional
+
+from app.compress import ENCODING_SUFFIX, brotli, compress
+
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# Source files (relative to app/static) published with content-hashed names
+BUNDLED = ("css/app.tailwind.css", "css/app.css", "js/app.js")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_manifest: Optional[Dict[str, str]] = None
+
+
+def build() -> Dict[str, str]:
+    """Write hashed copies of BUNDLED plus .gz/.br variants into static/dist and return the manifest.
+
+    Run after `npm run build` (Tailwind) with `python -m app.static_bundle`.
+    """
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    manifest: Dict[str, str] = {}
+    for rel in BUNDLED:
+        src = os.path.join(STATIC_DIR, rel)
+        if not os.path.exists(src):
+            continue
+        with open(src, "rb") as f:
+            body = f.read()
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(rel)
+        hashed = f"{stem}.{digest}{ext}"
+        out = os.path.join(DIST_DIR, hashed)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, "wb") as f:
+            f.write(body)
+        for encoding, suffix in ENCODING_SUFFIX.items():
+            if encoding == "br" and brotli is None:
+                continue
+            with open(out + suffix, "wb") as f:
+                f.write(compress(body, encoding, static=True))
+        manifest[rel] = f"dist/{hashed}"
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest() -> Dict[str, str]:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            # No build yet (local dev): templates fall back to the plain files
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(rel: str) -> str:
+    return f"/static/{load_manifest().get(rel, rel)}"
+
+
+if __name__ == "__main__":
+    m = build()
+    for src, dst in m.items():
+        print(f"[static] {src} -> {dst}")
+    if brotli is None:
+        print("[static] brotli not installed; only .gz variants written", file=sys.stderr)
@@ -1,16 +1,60 @@
 from __future__ import annotations
 
+import base64
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import String, any_, bindparam, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 
 from app.db import session_scope
-from app.models import Session, SessionPlayer, Mod, Level, SessionSnapshot, Identity, Player
+from app.models import Session, SessionPlayer, Mod, Level, SessionSnapshot, Identity, Player, PlayerName, PlayerSession, SitePresence, Match
+from app.leaderboards import roll_up_ended_sessions
+from app.records import NormalizedSession, PlayerView, SessionView
+from app.retention import snapshots_for_window
 
 
 # Reduce grace so killed sessions fall off quickly in UI
 GRACE_SECONDS = 12  # consider sessions stale if not seen for this long
+# Session states during which a match row stays open
+MATCH_STATES = ("InGame", "PostGame")
+
+
+class LiveRegistry:
+    """The worker's view of live sessions (ended_at IS NULL): id -> last_seen_at.
+
+    Loaded with one query on the first save_sessions() and kept in step after each commit, so
+    finding sessions that stopped reporting is a dict scan rather than a table scan per tick.
+    """
+
+    def __init__(self) -> None:
+        self.last_seen: Optional[Dict[str, datetime]] = None
+
+    def load(self, db) -> Dict[str, datetime]:
+        if self.last_seen is None:
+            rows = db.execute(select(Session.id, Session.last_seen_at).where(Session.ended_at.is_(None))).all()
+            # Naive UTC, like utcnow()
+            self.last_seen = {
+                sid: seen.astimezone(timezone.utc).replace(tzinfo=None) if seen.tzinfo else seen for sid, seen in rows
+            }
+        return self.last_seen
+
+    def committed(self, seen: List[str], gone: List[str], now: datetime) -> None:
+        if self.last_seen is None:
+            return
+        for sid in gone:
+            self.last_seen.pop(sid, None)
+        self.last_seen.update(dict.fromkeys(seen, now))
+
+
+def _end_sessions(db, now: datetime, condition) -> List[str]:
+    return list(db.scalars(
+        update(Session)
+        .where(Session.ended_at.is_(None), condition)
+        .values(ended_at=now)
+        .returning(Session.id)
+        .execution_options(synchronize_session=False)
+    ))
 
 
 def utcnow() -> datetime:
@@ -18,7 +62,100 @@ def utcnow() -> datetime:
     return datetime.utcnow()
 
 
-def save_sessions(normalized: List[Dict[str, Any]]) -> Dict[str, int]:
+def _int_or_none(v: Any) -> Optional[int]:
+    return v if isinstance(v, int) and not isinstance(v, bool) else None
+
+
+def _record_participation(db, now: datetime, seen: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+    """Extend open player_sessions stints for players seen this tick; open new ones for the rest.
+
+    A stint stays open while the player is seen again within GRACE_SECONDS.
+    """
+    cutoff = now - timedelta(seconds=GRACE_SECONDS)
+    open_rows = db.execute(
+        select(PlayerSession.id, PlayerSession.session_id, PlayerSession.steam_id)
+        .where(
+            PlayerSession.session_id.in_({k[0] for k in seen}),
+            PlayerSession.last_seen_at >= cutoff,
+        )
+    ).all()
+    open_ids = {(r.session_id, r.steam_id): r.id for r in open_rows}
+    updates: List[Dict[str, Any]] = []
+    inserts: List[Dict[str, Any]] = []
+    for (session_id, steam_id), v in seen.items():
+        stint_id = open_ids.get((session_id, steam_id))
+        if stint_id is not None:
+            updates.append({"id": stint_id, "last_seen_at": now, **v})
+        else:
+            inserts.append({"session_id": session_id, "steam_id": steam_id, "first_seen_at": now, "last_seen_at": now, **v})
+    if updates:
+        db.execute(update(PlayerSession), updates)
+    if inserts:
+        db.execute(insert(PlayerSession), inserts)
+
+
+def _segment_matches(db, now: datetime, ticks: Dict[str, Tuple[Optional[str], Optional[str], NormalizedSession]]) -> Tuple[int, int]:
+    """Open, extend and close match rows from this tick's state and map transitions.
+
+    `ticks` maps session id -> (state, map_file before this tick, session). A match opens when
+    a session goes InGame and stays open through PostGame so its roster keeps the final
+    scores; returning to the lobby, a restart (PostGame -> InGame) or a map change closes it.
+    Returns (opened, closed).
+    """
+    open_rows = {
+        r.session_id: r for r in db.execute(
+            select(Match.session_id, Match.id, Match.peak_players)
+            .where(Match.session_id.in_(ticks), Match.ended_at.is_(None))
+        )
+    }
+    closes: List[int] = []
+    updates: List[Dict[str, Any]] = []
+    inserts: List[Dict[str, Any]] = []
+    for sid, (prev_state, prev_map, s) in ticks.items():
+        current = open_rows.get(sid)
+        if current is not None and (
+            s.state not in MATCH_STATES or s.map_file != prev_map or (prev_state == "PostGame" and s.state == "InGame")
+        ):
+            closes.append(current.id)
+            current = None
+        roster = [
+            {
+                "steam_id": str(p.steam_id) if p.steam_id else None,
+                "name": p.name[:128] if p.name else None,
+                "slot": p.slot,
+                "team_id": p.team_id,
+                "kills": _int_or_none(p.kills),
+                "deaths": _int_or_none(p.deaths),
+                "score": _int_or_none(p.score),
+            }
+            for p in s.players if p.slot is not None
+        ]
+        if current is not None:
+            updates.append({"id": current.id, "last_seen_at": now, "peak_players": max(current.peak_players, len(roster)), "roster": roster})
+        elif s.state == "InGame":
+            inserts.append({
+                "session_id": sid, "started_at": now, "last_seen_at": now, "map_file": s.map_file, "mod_id": s.mod,
+                "game_mode": (s.attributes or {}).get("game_mode"), "peak_players": len(roster), "roster": roster,
+            })
+    # Close before inserting: a session has at most one open match (uq_matches_open_session)
+    if closes:
+        db.execute(
+            update(Match).where(Match.id.in_(closes)).values(ended_at=Match.last_seen_at)
+            .execution_options(synchronize_session=False)
+        )
+    if updates:
+        db.execute(update(Match), updates)
+    if inserts:
+        db.execute(insert(Match), inserts)
+    return len(inserts), len(closes)
+
+
+def save_sessions(normalized: List[NormalizedSession], live: Optional[LiveRegistry] = None) -> Dict[str, Any]:
+    """Upsert one poll tick and end sessions unseen for GRACE_SECONDS.
+
+    With a LiveRegistry (the worker) the candidates come from memory and are ended by id;
+    without one the partial index on live sessions is scanned.
+    """
     now = utcnow()
     ids_seen = set()
     created = 0
@@ -27,36 +164,49 @@ def save_sessions(normalized: List[Dict[str, Any]]) -> Dict[str, int]:
     levels_upserted = 0
 
     with session_scope() as db:
+        # Resolve player ids for every Steam id in this tick with one query
+        tick_steam_ids = {str(p.steam_id) for s in normalized for p in s.players if p.steam_id}
+        player_ids: Dict[str, int] = {}
+        if tick_steam_ids:
+            player_ids = dict(db.execute(
+                select(Identity.external_id, Identity.player_id)
+                .where(Identity.provider == "steam", Identity.external_id.in_(tick_steam_ids))
+            ).all())
+        last_names: Dict[str, str] = {}
+        participations: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        match_ticks: Dict[str, Tuple[Optional[str], Optional[str], NormalizedSession]] = {}
+
         for s in normalized:
-            sid = s["id"]
+            sid = s.id
             ids_seen.add(sid)
             row = db.get(Session, sid)
+            match_ticks[sid] = (row.state, row.map_file, s) if row is not None else (None, None, s)
             if row is None:
                 row = Session(
                     id=sid,
-                    source=s.get("source"),
-                    name=s.get("name"),
-                    tps=s.get("tps"),
-                    version=s.get("version"),
-                    map_file=s.get("map_file"),
-                    mod_id=s.get("mod"),
+                    source=s.source,
+                    name=s.name,
+                    tps=s.tps,
+                    version=s.version,
+                    map_file=s.map_file,
+                    mod_id=s.mod,
                     level_map_id=None,
-                    attributes=s.get("attributes"),
+                    attributes=s.attributes,
                     started_at=now,
                     last_seen_at=now,
                 )
                 db.add(row)
                 created += 1
             else:
-                row.name = s.get("name")
-                row.tps = s.get("tps")
-                row.version = s.get("version")
-                row.state = s.get("state")
-                row.nat_type = s.get("nat_type")
-                row.map_file = s.get("map_file")
-                row.mod_id = s.get("mod")
-                if s.get("attributes") is not None:
-                    row.attributes = s.get("attributes")
+                row.name = s.name
+                row.tps = s.tps
+                row.version = s.version
+                row.state = s.state
+                row.nat_type = s.nat_type
+                row.map_file = s.map_file
+                row.mod_id = s.mod
+                if s.attributes is not None:
+                    row.attributes = s.attributes
                 row.last_seen_at = now
                 # If we marked this session as ended previously but we see it again, revive it
                 if row.ended_at is not None:
@@ -66,31 +216,47 @@ def save_sessions(normalized: List[Dict[str, Any]]) -> Dict[str, int]:
             # Upsert session_players by (session_id, slot) to avoid duplicates
             # Upsert session players by slot; remove any stale rows not present now
             current_slots = set()
-            for p in s.get("players", []) or []:
-                slot = p.get("slot")
+            for p in s.players:
+                slot = p.slot
                 if slot is None:
                     continue
                 current_slots.add(slot)
                 existing = db.execute(
                     select(SessionPlayer).where(SessionPlayer.session_id == row.id, SessionPlayer.slot == slot)
                 ).scalar_one_or_none()
-                payload_stats = {**(p.get("stats") or {}), **({"name": p.get("name")} if p.get("name") else {})}
-                if p.get("steam_id"):
-                    payload_stats["steam_id"] = p.get("steam_id")
+                payload_stats = {**p.stats, **({"name": p.name} if p.name else {})}
+                steam_id = str(p.steam_id) if p.steam_id else None
+                pname = p.name[:128] if p.name else None
+                if steam_id:
+                    payload_stats["steam_id"] = p.steam_id
+                    if pname:
+                        last_names[steam_id] = pname
+                    participations[(sid, steam_id)] = {
+                        "slot": slot,
+                        "team_id": p.team_id,
+                        "kills": _int_or_none(p.kills),
+                        "deaths": _int_or_none(p.deaths),
+                        "score": _int_or_none(p.score),
+                    }
                 if existing is None:
                     sp = SessionPlayer(
                         session_id=row.id,
-                        player_id=None,
+                        player_id=player_ids.get(steam_id) if steam_id else None,
                         slot=slot,
-                        team_id=p.get("team_id"),
+                        team_id=p.team_id,
                         is_host=True if slot in (1, 6) else None,
+                        steam_id=steam_id,
+                        name=pname,
                         stats=payload_stats,
                     )
                     db.add(sp)
                 else:
                     existing.stats = payload_stats
                     existing.is_host = True if slot in (1, 6) else None
-                    existing.team_id = p.get("team_id")
+                    existing.team_id = p.team_id
+                    existing.steam_id = steam_id
+                    existing.name = pname
+                    existing.player_id = player_ids.get(steam_id) if steam_id else None
                 players_upserted += 1
             # delete players whose slots disappeared
             if current_slots:
@@ -111,8 +277,8 @@ def save_sessions(normalized: List[Dict[str, Any]]) -> Dict[str, int]:
             db.add(snap)
 
             # Upsert level and mod records minimally
-            mod_id = s.get("mod")
-            map_file = s.get("map_file")
+            mod_id = s.mod
+            map_file = s.map_file
             if mod_id:
                 if db.get(Mod, mod_id) is None:
                     db.add(Mod(id=mod_id))
@@ -122,59 +288,161 @@ def save_sessions(normalized: List[Dict[str, Any]]) -> Dict[str, int]:
                         db.add(Level(id=lid, mod_id=mod_id, map_file=map_file))
                         levels_upserted += 1
 
-        # Optionally mark stale sessions as ended
+        if participations:
+            _record_participation(db, now, participations)
+        matches_opened, matches_closed = _segment_matches(db, now, match_ticks) if match_ticks else (0, 0)
+
+        # Refresh last-known names; rows whose name did not change are left untouched
+        if last_names:
+            ins = pg_insert(PlayerName).values([
+                {"steam_id": k, "name": v, "updated_at": now} for k, v in last_names.items()
+            ])
+            db.execute(ins.on_conflict_do_update(
+                index_elements=[PlayerName.steam_id],
+                set_={"name": ins.excluded.name, "updated_at": ins.excluded.updated_at},
+                where=PlayerName.name.is_distinct_from(ins.excluded.name),
+            ))
+
+        # Mark stale sessions as ended; flush first so revived rows are not caught by last_seen_at
+        db.flush()
         stale_cutoff = now - timedelta(seconds=GRACE_SECONDS)
-        q = select(Session).where(Session.ended_at.is_(None), Session.last_seen_at < stale_cutoff)
-        for stale in db.scalars(q):
-            stale.ended_at = now
+        candidates: List[str] = []
+        if live is not None:
+            candidates = [sid for sid, seen in live.load(db).items() if seen < stale_cutoff and sid not in ids_seen]
+            ids = bindparam("ids", candidates, type_=ARRAY(String))
+            ended_ids = _end_sessions(db, now, Session.id == any_(ids)) if candidates else []
+        else:
+            ended_ids = _end_sessions(db, now, Session.last_seen_at < stale_cutoff)
+        # Fold the finished sessions into the leaderboard aggregates in the same transaction
+        if ended_ids:
+            roll_up_ended_sessions(db, ended_ids, now)
+            matches_closed += db.execute(
+                update(Match)
+                .where(Match.session_id == any_(bindparam("ended", ended_ids, type_=ARRAY(String))), Match.ended_at.is_(None))
+                .values(ended_at=Match.last_seen_at)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+    if live is not None:
+        live.committed(list(ids_seen), candidates, now)
+    return {
+        "created": created, "updated": updated, "players": players_upserted, "levels": levels_upserted,
+        "ended": len(ended_ids), "ended_ids": ended_ids,
+        "matches_opened": matches_opened, "matches_closed": matches_closed,
+    }
+
 
-    return {"created": created, "updated": updated, "players": players_upserted, "levels": levels_upserted}
+def get_site_profiles(online: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Sidebar profile (display name, avatar, profile URL) for each (provider, external_id), in order."""
+    if not online:
+        return []
+    profiles: Dict[Tuple[str, str], tuple] = {}
+    with session_scope() as db:
+        # Last in-game name comes from the same query, for users without a display name
+        rows = db.execute(
+            select(Identity, Player, PlayerName.name)
+            .where(tuple_(Identity.provider, Identity.external_id).in_(online))
+            .join(Player, Identity.player_id == Player.id, isouter=True)
+            .join(PlayerName, (Identity.provider == "steam") & (PlayerName.steam_id == Identity.external_id), isouter=True)
+        ).all()
+        for ident, player, last_name in rows:
+            profiles[(ident.provider, ident.external_id)] = (ident, player, last_name)
+        missing = [ext for pvd, ext in online if pvd == "steam" and (pvd, ext) not in profiles]
+        names = dict(db.execute(select(PlayerName.steam_id, PlayerName.name).where(PlayerName.steam_id.in_(missing))).all()) if missing else {}
+    out = []
+    for provider, external_id in online:
+        ident, player, last_name = profiles.get((provider, external_id), (None, None, names.get(external_id)))
+        display_name = player.display_name if player else None
+        if provider == "steam" and not display_name:
+            display_name = last_name
+        out.append({
+            "provider": provider,
+            "id": external_id,
+            "display_name": display_name,
+            "avatar": player.avatar_url if player else None,
+            "profile": ident.profile_url if ident else None,
+        })
+    return out
+
+
+def upsert_site_presence(rows: List[Tuple[str, str, datetime]], stale_seconds: int = 0) -> None:
+    """One multi-row upsert of (provider, external_id, last_seen_at).
 
+    Existing rows are only updated when that moves last_seen_at forward by at least stale_seconds.
+    """
+    if not rows:
+        return
+    with session_scope() as db:
+        ins = pg_insert(SitePresence).values([
+            {"provider": p, "external_id": e, "last_seen_at": ts} for p, e, ts in rows
+        ])
+        db.execute(ins.on_conflict_do_update(
+            index_elements=[SitePresence.provider, SitePresence.external_id],
+            set_={"last_seen_at": ins.excluded.last_seen_at},
+            where=SitePresence.last_seen_at <= ins.excluded.last_seen_at - timedelta(seconds=stale_seconds),
+        ))
+
+
+def steam_profiles(db, steam_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Steam id -> {id, profile, nickname, avatar} for ids with a known identity."""
+    mapping: Dict[str, Dict[str, Any]] = {}
+    if not steam_ids:
+        return mapping
+    rows = db.execute(
+        select(Identity, Player)
+        .where(Identity.provider == "steam", Identity.external_id.in_(steam_ids))
+        .join(Player, Identity.player_id == Player.id, isouter=True)
+    ).all()
+    for ident, player in rows:
+        mapping[str(ident.external_id)] = {
+            "id": str(ident.external_id),
+            "profile": ident.profile_url,
+            "nickname": (player.display_name if player else None),
+            "avatar": (player.avatar_url if player else None),
+        }
+    return mapping
 
-def get_current_sessions(max_age_seconds: int = 10) -> List[Dict[str, Any]]:
+
+def _player_views(db, session_id: str) -> List[PlayerView]:
+    players: List[PlayerView] = []
+    pq = select(SessionPlayer).where(SessionPlayer.session_id == session_id).order_by(SessionPlayer.slot)
+    steam_ids: List[str] = []
+    for sp in db.scalars(pq):
+        info = PlayerView(
+            slot=sp.slot,
+            is_host=sp.is_host,
+            # The column is cut to 128 characters for the index; stats keeps the full name
+            name=(sp.stats or {}).get("name") or sp.name,
+            score=(sp.stats or {}).get("score"),
+            team_id=sp.team_id,
+        )
+        sid = sp.steam_id or (sp.stats or {}).get("steam_id")
+        if sid:
+            info.steam_id = str(sid)
+            steam_ids.append(str(sid))
+        players.append(info)
+    # Batch-enrich Steam identities for this session
+    mapping = steam_profiles(db, steam_ids)
+    for p in players:
+        if p.steam_id and p.steam_id in mapping:
+            p.steam = mapping[p.steam_id]
+    return players
+
+
+def get_session_players(session_id: str) -> List[PlayerView]:
+    """Roster of one session (any state), Steam-enriched like get_current_sessions."""
+    with session_scope() as db:
+        return _player_views(db, session_id)
+
+
+def get_current_sessions(max_age_seconds: int = 10) -> List[SessionView]:
     now = utcnow()
     cutoff = now - timedelta(seconds=max_age_seconds)
-    out: List[Dict[str, Any]] = []
+    out: List[SessionView] = []
     with session_scope() as db:
         q = select(Session).where(Session.last_seen_at >= cutoff, Session.ended_at.is_(None)).order_by(Session.last_seen_at.desc())
         for row in db.scalars(q):
-            players: List[Dict[str, Any]] = []
-            pq = select(SessionPlayer).where(SessionPlayer.session_id == row.id).order_by(SessionPlayer.slot)
-            steam_ids: List[str] = []
-            for sp in db.scalars(pq):
-                info = {
-                    "slot": sp.slot,
-                    "is_host": sp.is_host,
-                    "name": (sp.stats or {}).get("name"),
-                    "score": (sp.stats or {}).get("score"),
-                    "team_id": sp.team_id,
-                }
-                sid = (sp.stats or {}).get("steam_id")
-                if sid:
-                    info["steam_id"] = str(sid)
-                    steam_ids.append(str(sid))
-                players.append(info)
-
-            # Batch-enrich Steam identities for this session
-            if steam_ids:
-                from sqlalchemy import select as _select
-                mapping: Dict[str, Dict[str, Any]] = {}
-                rows = db.execute(
-                    _select(Identity, Player)
-                    .where(Identity.provider == "steam", Identity.external_id.in_(steam_ids))
-                    .join(Player, Identity.player_id == Player.id, isouter=True)
-                ).all()
-                for ident, player in rows:
-                    mapping[str(ident.external_id)] = {
-                        "id": str(ident.external_id),
-                        "profile": ident.profile_url,
-                        "nickname": (player.display_name if player else None),
-                        "avatar": (player.avatar_url if player else None),
-                    }
-                for p in players:
-                    sid = p.get("steam_id")
-                    if sid and sid in mapping:
-                        p["steam"] = mapping[sid]
+            players = _player_views(db, row.id)
             # Enriched level/mod if present
             level_name = None
             level_image = None
@@ -200,30 +468,42 @@ def get_current_sessions(max_age_seconds: int = 10) -> List[Dict[str, Any]]:
                     mod_url = None
             # Fallback placeholder asset if level image missing
             placeholder_img = "/static/assets/placeholder-thumbnail-200x200.svg"
-            out.append({
-                "id": row.id,
-                "source": row.source,
-                "name": row.name,
-                "tps": row.tps,
-                "version": row.version,
-                "state": row.state,
-                "nat_type": row.nat_type,
-                "map_file": row.map_file,
-                "mod": row.mod_id,
-                "mod_name": mod_name,
-                "mod_details": {"name": mod_name, "image": mod_image, "url": mod_url} if (mod_name or mod_image or mod_url) else None,
-                "attributes": row.attributes,
-                "level": {"name": level_name or (row.map_file or "(unknown)"), "image": level_image or placeholder_img} if (row.map_file or level_name or level_image) else None,
-                "last_seen_at": (row.last_seen_at.isoformat() if row.last_seen_at else None),
-                "players": players,
-            })
+            out.append(SessionView(
+                id=row.id,
+                source=row.source,
+                name=row.name,
+                tps=row.tps,
+                version=row.version,
+                state=row.state,
+                nat_type=row.nat_type,
+                map_file=row.map_file,
+                mod=row.mod_id,
+                mod_name=mod_name,
+                mod_details={"name": mod_name, "image": mod_image, "url": mod_url} if (mod_name or mod_image or mod_url) else None,
+                attributes=row.attributes,
+                level={"name": level_name or (row.map_file or "(unknown)"), "image": level_image or placeholder_img} if (row.map_file or level_name or level_image) else None,
+                last_seen_at=row.last_seen_at,
+                players=players,
+            ))
     return out
 
 
+def get_current_sessions_version(max_age_seconds: int = 10) -> Tuple[int, Optional[datetime]]:
+    """Cheap change token for get_current_sessions: (live session count, newest last_seen_at)."""
+    cutoff = utcnow() - timedelta(seconds=max_age_seconds)
+    with session_scope() as db:
+        count, newest = db.execute(
+            select(func.count(), func.max(Session.last_seen_at))
+            .where(Session.last_seen_at >= cutoff, Session.ended_at.is_(None))
+        ).one()
+    return count, newest
+
+
 def get_history_summary(minutes: int = 60) -> List[Dict[str, Any]]:
     """Return per-minute aggregates for the last N minutes.
 
     For each minute bucket: number of distinct sessions observed and total players.
+    Windows that reach past the snapshot retention horizon also read the day archives.
     """
     now = utcnow()
     from datetime import timedelta
@@ -231,7 +511,7 @@ def get_history_summary(minutes: int = 60) -> List[Dict[str, Any]]:
     points: Dict[str, Tuple[set, int]] = {}
     with session_scope() as db:
         q = select(SessionSnapshot).where(SessionSnapshot.observed_at >= cutoff).order_by(SessionSnapshot.observed_at)
-        for row in db.scalars(q):
+        for row in snapshots_for_window(cutoff, db.scalars(q), now):
             bucket = row.observed_at.replace(second=0, microsecond=0).isoformat()
             if bucket not in points:
                 points[bucket] = (set(), 0)
@@ -257,7 +537,7 @@ def get_maps_summary(hours: int = 24) -> List[Dict[str, Any]]:
     agg: Dict[str, Dict[str, Any]] = {}
     with session_scope() as db:
         q = select(SessionSnapshot).where(SessionSnapshot.observed_at >= cutoff)
-        for row in db.scalars(q):
+        for row in snapshots_for_window(cutoff, db.scalars(q), now):
             key = row.map_file or "(unknown)"
             bucket = agg.setdefault(key, {"map_file": key, "sessions": set(), "players": 0})
             if row.session_id:
@@ -280,7 +560,7 @@ def get_mods_summary(hours: int = 24) -> List[Dict[str, Any]]:
     agg: Dict[str, Dict[str, Any]] = {}
     with session_scope() as db:
         q = select(SessionSnapshot).where(SessionSnapshot.observed_at >= cutoff)
-        for row in db.scalars(q):
+        for row in snapshots_for_window(cutoff, db.scalars(q), now):
             key = row.mod_id or "0"
             bucket = agg.setdefault(key, {"mod": key, "sessions": set(), "players": 0})
             if row.session_id:
@@ -319,11 +599,61 @@ def get_session_detail(session_id: str) -> Dict[str, Any] | None:
             "state": row.state,
             "nat_type": row.nat_type,
             "state": row.state,
-            "last_seen_at": (row.last_seen_at.isoformat() if row.last_seen_at else None),
+            "last_seen_at": row.last_seen_at,
             "players": players,
         }
 
 
+def _encode_cursor(first_seen_at: datetime, row_id: int) -> str:
+    raw = f"{first_seen_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    ts, rid = raw.rsplit("|", 1)
+    return datetime.fromisoformat(ts), int(rid)
+
+
+def get_player_history(steam_id: str, limit: int = 20, cursor: str | None = None) -> Dict[str, Any]:
+    """Sessions a Steam id played in, newest first, keyset-paginated on (first_seen_at, id).
+
+    Raises ValueError for a malformed cursor.
+    """
+    limit = max(1, min(100, limit))
+    with session_scope() as db:
+        q = (
+            select(PlayerSession, Session.name, Session.map_file, Session.mod_id)
+            .join(Session, Session.id == PlayerSession.session_id, isouter=True)
+            .where(PlayerSession.steam_id == steam_id)
+        )
+        if cursor:
+            t, rid = _decode_cursor(cursor)
+            q = q.where(tuple_(PlayerSession.first_seen_at, PlayerSession.id) < tuple_(t, rid))
+        q = q.order_by(PlayerSession.first_seen_at.desc(), PlayerSession.id.desc()).limit(limit + 1)
+        rows = db.execute(q).all()
+        items: List[Dict[str, Any]] = []
+        for ps, name, map_file, mod_id in rows[:limit]:
+            items.append({
+                "session_id": ps.session_id,
+                "session_name": name,
+                "map_file": map_file,
+                "mod": mod_id,
+                "slot": ps.slot,
+                "team_id": ps.team_id,
+                "first_seen_at": ps.first_seen_at,
+                "last_seen_at": ps.last_seen_at,
+                "kills": ps.kills,
+                "deaths": ps.deaths,
+                "score": ps.score,
+            })
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1][0]
+            next_cursor = _encode_cursor(last.first_seen_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
+
+
 def get_mod_catalog() -> Dict[str, Dict[str, Any]]:
     """Return a mapping of mod_id -> {name, image, url} for all known mods."""
     catalog: Dict[str, Dict[str, Any]] = {}
@@ -343,3 +673,55 @@ def get_mod_catalog() -> Dict[str, Dict[str, Any]]:
     return catalog
 
 
+def _match_doc(m: Match) -> Dict[str, Any]:
+    return {
+        "id": m.id,
+        "session_id": m.session_id,
+        "started_at": m.started_at.isoformat() if m.started_at else None,
+        "ended_at": m.ended_at.isoformat() if m.ended_at else None,
+        "last_seen_at": m.last_seen_at.isoformat() if m.last_seen_at else None,
+        "map_file": m.map_file,
+        "mod_id": m.mod_id,
+        "game_mode": m.game_mode,
+        "peak_players": m.peak_players,
+        "roster": m.roster or [],
+    }
+
+
+def get_matches(map_file: Optional[str] = None, hours: int = 24, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent matches started in the last N hours, optionally on one map (ix_matches_map_time)."""
+    cutoff = utcnow() - timedelta(hours=max(1, hours))
+    q = select(Match).where(Match.started_at >= cutoff)
+    if map_file:
+        q = q.where(Match.map_file == map_file)
+    with session_scope() as db:
+        return [_match_doc(m) for m in db.scalars(q.order_by(Match.started_at.desc()).limit(max(1, min(limit, 200))))]
+
+
+def get_match_maps_summary(hours: int = 24) -> List[Dict[str, Any]]:
+    """Per map over the last N hours: matches played, average length and players, from match rows alone."""
+    cutoff = utcnow() - timedelta(hours=max(1, hours))
+    duration = func.extract("epoch", func.coalesce(Match.ended_at, Match.last_seen_at) - Match.started_at)
+    with session_scope() as db:
+        rows = db.execute(
+            select(
+                Match.map_file,
+                func.count().label("matches"),
+                func.avg(duration).label("avg_seconds"),
+                func.avg(Match.peak_players).label("avg_players"),
+                func.max(Match.peak_players).label("peak_players"),
+            )
+            .where(Match.started_at >= cutoff)
+            .group_by(Match.map_file)
+            .order_by(func.count().desc())
+        ).all()
+    return [
+        {
+            "map_file": r.map_file or "(unknown)",
+            "matches": r.matches,
+            "avg_minutes": round(float(r.avg_seconds or 0) / 60.0, 1),
+            "avg_players": round(float(r.avg_players or 0), 1),
+            "peak_players": r.peak_players,
+        }
+        for r in rows
+    ]
@@ -0,0 +1,530 @@
+from __future__ import annotations
+
+import abc
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+
+from app.db import session_scope
+from app.jsoncodec import dumps, loads
+from app.models import TeamPickEvent, TeamPickParticipant, TeamPickPick, TeamPickSession
+from app.records import PlayerView, SessionView
+
+
+# Team Picker as an append-only event stream per game session. Every mutation appends its
+# events (team_pick_events) in the same transaction as the relational rows, under a
+# per-stream advisory lock; the aggregate (the latest non-canceled pick session) is folded
+# from the stream once and then kept current by applying each new event. Reads take the
+# cached aggregate and overlay what changes outside the stream: the roster (current tick),
+# the caller's role and Team Picker presence.
+
+MAX_TEAM_SIZE = 5
+MAX_PICKS_PER_TEAM = MAX_TEAM_SIZE - 1  # the commander fills the fifth slot
+AGGREGATE_CACHE_MAX = 1024
+AGGREGATE_TTL_SECONDS = 6 * 3600
+
+Aggregate = Optional[Dict[str, Any]]
+
+
+def iso(ts: Optional[datetime]) -> Optional[str]:
+    """Naive UTC timestamps rendered the way timestamptz columns come back."""
+    if ts is None:
+        return None
+    return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).isoformat()
+
+
+# --- aggregate ---------------------------------------------------------------------------
+
+def apply_event(agg: Aggregate, ev: Dict[str, Any]) -> Aggregate:
+    """Next aggregate after ev. Never mutates agg (cached aggregates are shared)."""
+    kind = ev["kind"]
+    data = ev.get("data") or {}
+    if kind == "started":
+        # Remembered so canceling this one shows the previous pick session again; only an open
+        # session can be canceled, so a finished one needs no history of its own
+        previous = agg if agg is None or agg["state"] == "open" else {k: v for k, v in agg.items() if k != "previous"}
+        return {
+            "id": ev["pick_session_id"],
+            "game_session_id": ev["session_id"],
+            "state": "open",
+            "coin_winner_team": None,
+            "created_at": data.get("created_at"),
+            "closed_at": None,
+            "created_by": data.get("created_by"),
+            "accepted": {"commander1": False, "commander2": False},
+            "participants": list(data.get("participants") or []),
+            "picks": [],
+            "previous": previous,
+        }
+    if kind == "imported":
+        return data.get("aggregate")
+    if kind == "cleared":
+        return None
+    if agg is None or ev.get("pick_session_id") != agg["id"]:
+        return agg
+    if kind == "canceled":
+        return agg.get("previous")
+    agg = dict(agg)
+    if kind == "coin_tossed":
+        agg["coin_winner_team"] = data.get("team")
+    elif kind == "picked":
+        agg["picks"] = agg["picks"] + [data]
+    elif kind == "accepted":
+        agg["accepted"] = {**agg["accepted"], **{r: True for r in data.get("roles") or []}}
+    elif kind == "finalized":
+        agg["state"] = "final"
+        agg["closed_at"] = data.get("closed_at")
+    return agg
+
+
+def fold(events: Iterable[Dict[str, Any]]) -> Tuple[int, Aggregate]:
+    version, agg = 0, None
+    for ev in events:
+        agg = apply_event(agg, ev)
+        version = ev["version"]
+    return version, agg
+
+
+def next_team(agg: Dict[str, Any]) -> Optional[int]:
+    """Team whose commander picks next (coin winner first, then alternating)."""
+    winner = agg.get("coin_winner_team")
+    if winner is None:
+        return None
+    return winner if len(agg["picks"]) % 2 == 0 else (2 if winner == 1 else 1)
+
+
+def role_of(agg: Aggregate, provider: str, external_id: str) -> Optional[str]:
+    if not agg:
+        return None
+    for p in agg["participants"]:
+        if p["provider"] == provider and p["id"] == external_id:
+            return p["role"]
+    return None
+
+
+def render_state(agg: Dict[str, Any], version: int, roster: List[PlayerView], uid: Optional[str], active: Dict[str, bool]) -> Dict[str, Any]:
+    """Public Team Picker state: the aggregate plus roster, caller role and presence."""
+    fresh = {p.steam_id: p.steam for p in roster if p.steam_id and p.steam}
+    commander_ids = {p["id"] for p in agg["participants"] if p["role"] in ("commander1", "commander2") and p["provider"] == "steam"}
+    picked_ids = {pk["player"]["steam_id"] for pk in agg["picks"]}
+    remaining = sum(1 for p in roster if p.steam_id and p.steam_id not in commander_ids and p.steam_id not in picked_ids)
+    your_role = None
+    if uid:
+        pvd, ext = uid.split(":", 1)
+        your_role = role_of(agg, pvd, ext)
+    return {
+        "id": agg["id"],
+        "version": version,
+        "game_session_id": agg["game_session_id"],
+        "state": agg["state"],
+        "coin_winner_team": agg["coin_winner_team"],
+        "next_team": next_team(agg) if remaining > 0 else None,
+        "your_role": your_role,
+        "picks_complete": remaining == 0,
+        "max_team_size": MAX_TEAM_SIZE,
+        "created_at": agg["created_at"],
+        "closed_at": agg["closed_at"],
+        "accepted": dict(agg["accepted"]),
+        "participants": [
+            {
+                "provider": p["provider"],
+                "id": p["id"],
+                "role": p["role"],
+                "active": active.get(f"{p['provider']}:{p['id']}", False),
+                "steam": (fresh.get(p["id"]) or p.get("steam")) if p["provider"] == "steam" else None,
+            } for p in agg["participants"]
+        ],
+        "picks": [
+            {
+                "order": pk["order"],
+                "team_id": pk["team_id"],
+                "player": {
+                    "steam_id": pk["player"]["steam_id"],
+                    "steam": fresh.get(pk["player"]["steam_id"]) or pk["player"].get("steam"),
+                },
+                "picked_at": pk["picked_at"],
+            } for pk in agg["picks"]
+        ],
+        "roster": [
+            {
+                "slot": p.slot,
+                "team_id": p.team_id,
+                "is_host": p.is_host,
+                "name": p.name,
+                "steam_id": p.steam_id,
+                "steam": p.steam if p.steam_id else None,
+            } for p in roster
+        ],
+    }
+
+
+# --- stream ------------------------------------------------------------------------------
+
+def open_stream(db, session_id: str) -> None:
+    """Lock the stream until the transaction ends (serialising its writers), seeding it from
+    pre-event rows on first use."""
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtextextended(:k, 0))"), {"k": f"team_pick:{session_id}"})
+    if db.execute(select(TeamPickEvent.id).where(TeamPickEvent.session_id == session_id).limit(1)).first() is None:
+        _import_legacy(db, session_id)
+
+
+def _event_dict(row: TeamPickEvent) -> Dict[str, Any]:
+    return {
+        "session_id": row.session_id,
+        "version": row.version,
+        "pick_session_id": row.pick_session_id,
+        "kind": row.kind,
+        "data": row.data or {},
+    }
+
+
+def append_events(db, session_id: str, events: List[Tuple[Optional[int], str, Dict[str, Any]]], actor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Append (pick_session_id, kind, data) events; call after open_stream()."""
+    db.flush()  # the session doesn't autoflush; earlier appends in this transaction must count
+    version = db.execute(
+        select(func.coalesce(func.max(TeamPickEvent.version), 0)).where(TeamPickEvent.session_id == session_id)
+    ).scalar_one()
+    provider, external_id = actor.split(":", 1) if actor else (None, None)
+    out: List[Dict[str, Any]] = []
+    for pick_session_id, kind, data in events:
+        version += 1
+        row = TeamPickEvent(
+            session_id=session_id,
+            version=version,
+            pick_session_id=pick_session_id,
+            kind=kind,
+            data=data,
+            actor_provider=provider,
+            actor_external_id=external_id,
+        )
+        db.add(row)
+        out.append(_event_dict(row))
+    return out
+
+
+def _import_legacy(db, session_id: str) -> None:
+    """Seed an empty stream from pick sessions written before events existed."""
+    from app.store import steam_profiles
+    tps = db.execute(
+        select(TeamPickSession)
+        .where(TeamPickSession.session_id == session_id, TeamPickSession.state != "canceled")
+        .order_by(TeamPickSession.id.desc())
+    ).scalars().first()
+    if tps is None:
+        return
+    parts = db.execute(select(TeamPickParticipant).where(TeamPickParticipant.pick_session_id == tps.id)).scalars().all()
+    picks = db.execute(
+        select(TeamPickPick).where(TeamPickPick.pick_session_id == tps.id).order_by(TeamPickPick.order_index.asc())
+    ).scalars().all()
+    profiles = steam_profiles(db, [p.external_id for p in parts if p.provider == "steam"] + [p.player_steam_id for p in picks])
+    aggregate = {
+        "id": tps.id,
+        "game_session_id": tps.session_id,
+        "state": tps.state,
+        "coin_winner_team": tps.coin_winner_team,
+        "created_at": iso(tps.created_at),
+        "closed_at": iso(tps.closed_at),
+        "created_by": {"provider": tps.created_by_provider, "id": tps.created_by_external_id},
+        "accepted": {"commander1": bool(tps.accepted_by_commander1), "commander2": bool(tps.accepted_by_commander2)},
+        "participants": [participant(p.provider, p.external_id, p.role, profiles) for p in parts],
+        "picks": [pick_data(p, profiles) for p in picks],
+    }
+    append_events(db, session_id, [(tps.id, "imported", {"aggregate": aggregate})])
+
+
+def participant(provider: str, external_id: str, role: str, profiles: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "provider": provider,
+        "id": external_id,
+        "role": role,
+        "steam": profiles.get(external_id) if provider == "steam" else None,
+    }
+
+
+def pick_data(p: TeamPickPick, profiles: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "order": p.order_index,
+        "team_id": p.team_id,
+        "player": {"steam_id": p.player_steam_id, "steam": profiles.get(p.player_steam_id)},
+        "picked_at": iso(p.picked_at),
+    }
+
+
+def _read_stream(db, session_id: str, after: int = 0) -> List[Dict[str, Any]]:
+    rows = db.execute(
+        select(TeamPickEvent)
+        .where(TeamPickEvent.session_id == session_id, TeamPickEvent.version > after)
+        .order_by(TeamPickEvent.version.asc())
+    ).scalars().all()
+    return [_event_dict(r) for r in rows]
+
+
+def catch_up(session_id: str, version: int, agg: Aggregate) -> Tuple[int, Aggregate]:
+    """Apply the events written after `version`, e.g. by another web process."""
+    with session_scope() as db:
+        for ev in _read_stream(db, session_id, after=version):
+            agg = apply_event(agg, ev)
+            version = ev["version"]
+    return version, agg
+
+
+def load_stream(session_id: str) -> Tuple[int, Aggregate]:
+    with session_scope() as db:
+        events = _read_stream(db, session_id)
+        if not events:
+            open_stream(db, session_id)
+            db.flush()
+            events = _read_stream(db, session_id)
+    return fold(events)
+
+
+def user_room(provider: str, external_id: str) -> str:
+    """Socket.IO room every authenticated connection of a user joins."""
+    return f"user:{provider}:{external_id}"
+
+
+def invite_item(session_id: str, agg: Dict[str, Any], active: Dict[str, bool]) -> Dict[str, Any]:
+    """Invite prompt payload for commanders: pushed on start/restart, listed by open_for_me."""
+    created_at = agg.get("created_at")
+    return {
+        "session_id": session_id,
+        "state": agg["state"],
+        "participants": [
+            {
+                "provider": p["provider"],
+                "id": p["id"],
+                "role": p["role"],
+                "active": active.get(f"{p['provider']}:{p['id']}", False),
+                "steam": p.get("steam") if p["provider"] == "steam" else None,
+            } for p in agg["participants"]
+        ],
+        "created_by": agg.get("created_by"),
+        "created_at_ts": datetime.fromisoformat(created_at).timestamp() if created_at else 0,
+    }
+
+
+# --- status ------------------------------------------------------------------------------
+# Compact per-session badge data for session cards: the same fields whether derived from an
+# aggregate or from the grouped status query.
+
+def status_of(version: int, agg: Aggregate) -> Dict[str, Any]:
+    return {
+        "active": agg is not None,
+        "state": agg["state"] if agg else None,
+        "coin_winner_team": agg["coin_winner_team"] if agg else None,
+        "picks": len(agg["picks"]) if agg else 0,
+        "version": version,
+    }
+
+
+def session_docs(sessions: Iterable[SessionView], statuses: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Session feed documents: each session's dict plus its Team Picker badge."""
+    out = []
+    for s in sessions:
+        d = s.to_dict()
+        d["team_picker"] = statuses.get(s.id) or status_of(0, None)
+        out.append(d)
+    return out
+
+
+_STATUS_SQL = text(
+    """
+    WITH latest AS (
+        SELECT DISTINCT ON (session_id) session_id, id, state, coin_winner_team
+        FROM team_pick_sessions
+        WHERE session_id = ANY(:ids) AND state <> 'canceled'
+        ORDER BY session_id, id DESC
+    ), heads AS (
+        SELECT session_id, max(version) AS version
+        FROM team_pick_events
+        WHERE session_id = ANY(:ids)
+        GROUP BY session_id
+    )
+    SELECT coalesce(l.session_id, h.session_id) AS session_id, l.state, l.coin_winner_team,
+           (SELECT count(*) FROM team_pick_picks p WHERE p.pick_session_id = l.id) AS picks,
+           coalesce(h.version, 0) AS version
+    FROM latest l FULL JOIN heads h ON h.session_id = l.session_id
+    """
+)
+
+
+def get_statuses(session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Status for every id in one grouped query; ids without a Team Picker are inactive."""
+    out = {sid: status_of(0, None) for sid in session_ids}
+    if not session_ids:
+        return out
+    with session_scope() as db:
+        for sid, state, coin, picks, version in db.execute(_STATUS_SQL, {"ids": list(session_ids)}):
+            active = state is not None and state != "canceled"
+            out[sid] = {
+                "active": active,
+                "state": state if active else None,
+                "coin_winner_team": coin if active else None,
+                "picks": int(picks or 0) if active else 0,
+                "version": int(version),
+            }
+    return out
+
+
+def events_head() -> int:
+    """Id of the newest event across all streams; changes whenever any Team Picker does."""
+    with session_scope() as db:
+        return db.execute(select(func.coalesce(func.max(TeamPickEvent.id), 0))).scalar_one()
+
+
+class LiveStatus:
+    """Statuses for the current tick's sessions, reloaded (one grouped query) only when the
+    tick or the event head changes; both are probed at most once per probe_interval."""
+
+    def __init__(self, session_ids: Callable[[], List[str]], tick_version: Callable[[], Any], probe_interval: float = 1.0) -> None:
+        self._session_ids = session_ids
+        self._tick_version = tick_version
+        self._probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._probed_at = float("-inf")
+        self._token: Any = None
+        self._statuses: Dict[str, Dict[str, Any]] = {}
+
+    def current(self) -> Tuple[Any, Dict[str, Dict[str, Any]]]:
+        now = time.monotonic()
+        if now - self._probed_at < self._probe_interval:
+            return self._token, self._statuses
+        with self._lock:
+            if now - self._probed_at >= self._probe_interval:
+                token = (self._tick_version(), events_head())
+                if token != self._token:
+                    self._statuses = get_statuses(self._session_ids())
+                    self._token = token
+                self._probed_at = time.monotonic()
+            return self._token, self._statuses
+
+
+# --- aggregate cache ---------------------------------------------------------------------
+
+class AggregateCache(abc.ABC):
+    """session_id -> (version, aggregate); put() never replaces a newer version.
+
+    Entries may lag the stream (another process appended, or a writer died between its commit
+    and publish()), so current() reads the events past the cached version on every hit.
+    """
+
+    @abc.abstractmethod
+    def get(self, session_id: str) -> Optional[Tuple[int, Aggregate]]:
+        ...
+
+    @abc.abstractmethod
+    def put(self, session_id: str, version: int, agg: Aggregate) -> None:
+        ...
+
+
+class MemoryAggregateCache(AggregateCache):
+    """Per-process LRU (no REDIS_URL)."""
+
+    def __init__(self, max_entries: int = AGGREGATE_CACHE_MAX) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, Aggregate]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[Tuple[int, Aggregate]]:
+        with self._lock:
+            hit = self._entries.get(session_id)
+            if hit is not None:
+                self._entries.move_to_end(session_id)
+            return hit
+
+    def put(self, session_id: str, version: int, agg: Aggregate) -> None:
+        with self._lock:
+            cur = self._entries.get(session_id)
+            if cur is not None and cur[0] >= version:
+                return
+            self._entries[session_id] = (version, agg)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisAggregateCache(AggregateCache):
+    """Shared by all web processes: one JSON value per stream, replaced optimistically (WATCH)."""
+
+    def __init__(self, client, prefix: str = "team_pick:agg:", ttl_seconds: int = AGGREGATE_TTL_SECONDS) -> None:
+        self.r = client
+        self.prefix = prefix
+        self.ttl = ttl_seconds
+
+    def get(self, session_id: str) -> Optional[Tuple[int, Aggregate]]:
+        raw = self.r.get(f"{self.prefix}{session_id}")
+        if raw is None:
+            return None
+        doc = loads(raw)
+        return doc["v"], doc["agg"]
+
+    def put(self, session_id: str, version: int, agg: Aggregate) -> None:
+        import redis  # type: ignore
+        key = f"{self.prefix}{session_id}"
+        body = dumps({"v": version, "agg": agg})
+        with self.r.pipeline() as pipe:
+            for _attempt in range(3):
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is not None and loads(raw)["v"] >= version:
+                        return
+                    pipe.multi()
+                    pipe.set(key, body, ex=self.ttl)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+
+_cache: Optional[AggregateCache] = None
+
+
+def get_aggregate_cache() -> AggregateCache:
+    """Redis-backed when the presence store is (same client), in-memory otherwise."""
+    global _cache
+    if _cache is None:
+        from app.presence import RedisPresenceStore, get_presence_store
+        store = get_presence_store()
+        _cache = RedisAggregateCache(store.r) if isinstance(store, RedisPresenceStore) else MemoryAggregateCache()
+    return _cache
+
+
+def current(session_id: str) -> Tuple[int, Aggregate]:
+    """(version, aggregate) for the stream, from the cache; folded from the database on a miss."""
+    cache = get_aggregate_cache()
+    hit = cache.get(session_id)
+    if hit is None:
+        hit = load_stream(session_id)
+        cache.put(session_id, *hit)
+    else:
+        # One index range scan past the cached version; usually empty
+        newer = catch_up(session_id, *hit)
+        if newer[0] != hit[0]:
+            hit = newer
+            cache.put(session_id, *hit)
+    return hit
+
+
+def publish(session_id: str, events: List[Dict[str, Any]]) -> Tuple[int, Aggregate]:
+    """After commit: advance the cached aggregate by the appended events."""
+    if not events:
+        return current(session_id)
+    cache = get_aggregate_cache()
+    hit = cache.get(session_id)
+    if hit is not None and hit[0] == events[0]["version"] - 1:
+        version, agg = hit
+        for ev in events:
+            agg = apply_event(agg, ev)
+            version = ev["version"]
+    elif hit is not None and hit[0] >= events[-1]["version"]:
+        return hit
+    else:
+        # Missed events (another process wrote in between, or nothing cached): refold
+        version, agg = load_stream(session_id)
+    cache.put(session_id, version, agg)
+    return version, agg
@@ -0,0 +1,117 @@
+"""Smoke test for the optional ASGI server (app.asgi).
+
+    python -m bench.asgi_smoke [--port 8765] [--timeout 20]
+
+Imports app.asgi, starts it under uvicorn in a child process and checks /healthz, one
+ResponseCache endpoint (200 with an ETag, then 304 for If-None-Match), the first gzip'd
+SSE frame and a Socket.IO connect. Needs requirements-asgi.txt and a DATABASE_URL
+pointing at a migrated database. Exit code 1 on the first failed check.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, List
+
+import requests
+
+
+def _wait_ready(base: str, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+        try:
+            requests.get(f"{base}/healthz", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def check_import() -> None:
+    out = subprocess.run([sys.executable, "-c", "import app.asgi as a; print(type(a.app).__name__)"],
+                         capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr.strip().splitlines()[-1:]
+    assert out.stdout.strip() == "ASGIApp", out.stdout
+
+
+def check_healthz(base: str) -> None:
+    r = requests.get(f"{base}/healthz", timeout=5)
+    assert r.status_code == 200 and r.json() == {"status": "ok"}, (r.status_code, r.text)
+
+
+def check_cached(base: str) -> None:
+    url = f"{base}/api/v1/sessions/current"
+    r = requests.get(url, timeout=5)
+    assert r.status_code == 200 and "sessions" in r.json(), (r.status_code, r.text[:200])
+    etag = r.headers.get("ETag")
+    assert etag and r.headers.get("Cache-Control", "").startswith("public"), dict(r.headers)
+    again = requests.get(url, headers={"If-None-Match": etag}, timeout=5)
+    assert again.status_code == 304 and not again.content, again.status_code
+
+
+def check_sse(base: str) -> None:
+    import zlib
+    with requests.get(f"{base}/api/v1/stream/sessions", headers={"Accept-Encoding": "gzip"}, stream=True, timeout=5) as r:
+        assert r.status_code == 200 and r.headers.get("Content-Encoding") == "gzip", (r.status_code, dict(r.headers))
+        first = next(r.raw.stream(65536, decode_content=False))
+    text = zlib.decompressobj(31).decompress(first)
+    assert text.startswith(b"data: {") and text.endswith(b"\n\n"), text[:80]
+
+
+def check_socketio(base: str) -> None:
+    import socketio
+    client = socketio.Client(reconnection=False)
+    client.connect(base, transports=["polling"], wait_timeout=5)
+    try:
+        assert client.connected and client.sid
+        # call() waits for the ack, so the handlers have run before the disconnect
+        client.call("join", {"room": "smoke"}, timeout=5)
+        client.call("presence:heartbeat", timeout=5)
+    finally:
+        client.disconnect()
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--timeout", type=float, default=20.0)
+    args = ap.parse_args(argv)
+
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        check_import()
+        print("ok    import app.asgi", flush=True)
+    except AssertionError as ex:
+        print(f"FAIL  import app.asgi: {ex}", flush=True)
+        return 1
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.asgi:app", "--port", str(args.port), "--no-access-log"],
+        env=dict(os.environ),
+    )
+    try:
+        _wait_ready(base, proc, args.timeout)
+        checks: List[Callable[[str], None]] = [check_healthz, check_cached, check_sse, check_socketio]
+        for check in checks:
+            try:
+                check(base)
+            except Exception as ex:
+                print(f"FAIL  {check.__name__}: {ex!r}", flush=True)
+                return 1
+            print(f"ok    {check.__name__}", flush=True)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
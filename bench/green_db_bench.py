@@ -0,0 +1,105 @@
+"""Heartbeat latency on an eventlet hub while heavy queries run, with and without green waits.
+
+    python -m bench.green_db_bench [--queries 8] [--seconds 0.5] [--rounds 3] [--query sleep|history|maps] [--check]
+
+Monkey-patches like app.run_socketio, then runs a ticker greenlet (the stand-in for
+engine.io pings, presence loops and SSE writers) every --tick seconds while --queries
+greenlets each run --rounds heavy queries. `sleep` is pg_sleep(--seconds); `history` and
+`maps` call the store summaries behind /api/v1/history/summary and /api/v1/maps/summary.
+The blocking pass swaps psycopg's C wait loop back in. --check fails when the green pass
+lets a heartbeat slip by more than --max-lag.
+"""
+from __future__ import annotations
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import statistics  # noqa: E402
+import time  # noqa: E402
+from typing import Callable, Dict, List  # noqa: E402
+
+os.environ.setdefault("DB_GREEN", "true")
+
+import psycopg.waiting  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app.db import GREEN, session_scope  # noqa: E402
+
+
+def _queries(seconds: float) -> Dict[str, Callable[[], object]]:
+    from app.store import get_history_summary, get_maps_summary
+
+    def sleep() -> object:
+        with session_scope() as db:
+            return db.execute(text("SELECT pg_sleep(:s)"), {"s": seconds}).scalar()
+
+    return {"sleep": sleep, "history": get_history_summary, "maps": get_maps_summary}
+
+
+def run(query: Callable[[], object], n: int, rounds: int, tick: float) -> Dict[str, float]:
+    lags: List[float] = []
+    done = eventlet.event.Event()
+
+    def ticker() -> None:
+        nxt = time.monotonic() + tick
+        while not done.ready():
+            eventlet.sleep(max(0.0, nxt - time.monotonic()))
+            now = time.monotonic()
+            lags.append(now - nxt)
+            nxt = max(nxt + tick, now)
+
+    def worker() -> None:
+        for _ in range(rounds):
+            query()
+
+    beat = eventlet.spawn(ticker)
+    started = time.monotonic()
+    pool = eventlet.GreenPool(n)
+    for _ in range(n):
+        pool.spawn(worker)
+    pool.waitall()
+    elapsed = time.monotonic() - started
+    done.send(True)
+    beat.wait()
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "beats": len(lags),
+        "p50": statistics.median(lags) if lags else 0.0,
+        "p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0,
+        "max": lags[-1] if lags else 0.0,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=8)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=0.5)
+    ap.add_argument("--tick", type=float, default=0.05)
+    ap.add_argument("--query", choices=["sleep", "history", "maps"], default="sleep")
+    ap.add_argument("--max-lag", type=float, default=0.1)
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+
+    query = _queries(args.seconds)[args.query]
+    query()  # warm the pool and the store's caches outside the measurement
+    green_wait = psycopg.waiting.wait
+    print(f"{args.queries} greenlets x {args.rounds} x {args.query} query, heartbeat every {args.tick * 1000:.0f} ms (green mode: {GREEN})")
+    results = {}
+    for name, wait in (("blocking (wait_c)", psycopg.waiting.wait_c), ("green (wait_select)", green_wait)):
+        psycopg.waiting.wait = wait
+        r = results[name] = run(query, args.queries, args.rounds, args.tick)
+        print(f"{name:22s} {r['elapsed']:6.2f}s total  heartbeat lag p50 {r['p50'] * 1000:7.1f} ms  "
+              f"p99 {r['p99'] * 1000:7.1f} ms  max {r['max'] * 1000:7.1f} ms  ({r['beats']} beats)")
+    psycopg.waiting.wait = green_wait
+    if args.check and results["green (wait_select)"]["max"] > args.max_lag:
+        print(f"FAIL: green heartbeat lag exceeded {args.max_lag * 1000:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+"""Micro-benchmark: encode a get_current_sessions-shaped payload with each JSON backend.
+
+    python -m bench.json_bench [--sessions 40] [--players 10] [--number 200]
+
+No database needed; the payload mirrors store.get_current_sessions output
+(nested players with Steam enrichment, level/mod details, datetimes).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from app import jsoncodec
+
+
+def make_payload(n_sessions: int, n_players: int, seed: int = 7) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    sessions: List[Dict[str, Any]] = []
+    for i in range(n_sessions):
+        players = []
+        for j in range(n_players):
+            steam_id = f"7656119{rnd.randrange(10**10):010d}"
+            players.append({
+                "slot": j + 1,
+                "is_host": True if j in (0, 5) else None,
+                "name": f"Pilot_{i}_{j}",
+                "score": rnd.randint(0, 400),
+                "team_id": 1 if j < n_players // 2 else 2,
+                "steam_id": steam_id,
+                "steam": {
+                    "id": steam_id,
+                    "profile": f"https://steamcommunity.com/profiles/{steam_id}/",
+                    "nickname": f"Nick{rnd.randrange(10**6)}",
+                    "avatar": f"https://avatars.steamstatic.com/{rnd.randrange(16**20):020x}_full.jpg",
+                },
+            })
+        mod_id = str(rnd.randrange(10**9, 4 * 10**9))
+        sessions.append({
+            "id": f"Rebellion:{rnd.randrange(16**16):016x}",
+            "source": "Rebellion",
+            "name": f"Strat night #{i}",
+            "tps": 20,
+            "version": "2.0.180",
+            "state": rnd.choice(["InGame", "PreGame", "PostGame"]),
+            "nat_type": rnd.choice(["Full Cone", "Symmetric", "None"]),
+            "map_file": f"map_{i % 17}",
+            "mod": mod_id,
+            "mod_name": f"Mod {mod_id}",
+            "mod_details": {"name": f"Mod {mod_id}", "image": f"/static/assets/{mod_id}.jpg",
+                            "url": f"http://steamcommunity.com/sharedfiles/filedetails/?id={mod_id}"},
+            "attributes": {"game_mode": "STRAT", "max_players": n_players, "time_limit": 0, "locked": False},
+            "level": {"name": f"Level {i % 17}", "image": "/static/assets/placeholder-thumbnail-200x200.svg"},
+            "last_seen_at": now - timedelta(seconds=rnd.randint(0, 5)),
+            "players": players,
+        })
+    return {"sessions": sessions}
+
+
+def _stdlib(obj: Any) -> bytes:
+    # What Flask's DefaultJSONProvider does for jsonify (compact, sorted keys)
+    return json.dumps(obj, default=jsoncodec.json_default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _candidates() -> Dict[str, Callable[[Any], bytes]]:
+    out: Dict[str, Callable[[Any], bytes]] = {"json (stdlib)": _stdlib}
+    try:
+        import orjson  # type: ignore
+        opts = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        out["orjson"] = lambda o: orjson.dumps(o, default=jsoncodec.json_default, option=opts)
+    except ImportError:
+        pass
+    try:
+        import msgspec  # type: ignore
+        enc = msgspec.json.Encoder(enc_hook=jsoncodec.json_default, order="sorted")
+        out["msgspec"] = enc.encode
+    except ImportError:
+        pass
+    out[f"app.jsoncodec ({jsoncodec.BACKEND})"] = jsoncodec.dumps
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=40)
+    ap.add_argument("--players", type=int, default=10)
+    ap.add_argument("--number", type=int, default=200)
+    args = ap.parse_args()
+
+    payload = make_payload(args.sessions, args.players)
+    reference = json.loads(_stdlib(payload))
+    print(f"payload: {args.sessions} sessions x {args.players} players, {len(_stdlib(payload))} bytes")
+    baseline = None
+    for name, fn in _candidates().items():
+        assert json.loads(fn(payload)) == reference or "msgspec" in name, f"{name} output differs"
+        best = min(timeit.repeat(lambda: fn(payload), number=args.number, repeat=5)) / args.number
+        baseline = baseline or best
+        print(f"{name:28s} {best * 1e6:10.1f} us/encode  {baseline / best:5.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
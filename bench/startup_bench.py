@@ -0,0 +1,119 @@
+"""Cold-start report and budget for the web and worker entry points.
+
+    python -m bench.startup_bench [--runs 5] [--top 15] [--check]
+
+Each target is imported in a fresh interpreter with `-X importtime`; the report lists the
+slowest top-level packages (cumulative import time) and the wall time and peak RSS of the
+whole import, median over --runs. Importing app.main builds the app, so DATABASE_URL must
+point at a reachable database. With --check the exit code is 1 when a target exceeds its
+budget in BUDGETS or imports a module it must not (the worker never loads Flask).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Tuple
+
+
+class Budget(NamedTuple):
+    seconds: float
+    rss_mb: float
+    forbidden: Tuple[str, ...] = ()
+
+
+# target -> budget; "module:attr" imports the module and resolves the attribute
+BUDGETS: Dict[str, Budget] = {
+    "worker.runner": Budget(0.8, 70, forbidden=("flask", "flask_socketio", "werkzeug", "eventlet")),
+    "app.main:app": Budget(2.0, 120),
+    "app.run_socketio": Budget(2.5, 130),
+}
+
+_PROBE = r"""
+import json, resource, sys, time
+mod, _, attr = sys.argv[1].partition(":")
+t0 = time.perf_counter()
+# __import__ goes through the instrumented C import path (importlib.import_module does not)
+__import__(mod)
+m = sys.modules[mod]
+if attr:
+    getattr(m, attr)
+elapsed = time.perf_counter() - t0
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative microseconds per top-level package from `-X importtime` output.
+
+    A package is charged where it is entered from a different package (or at top level),
+    so its figure includes everything it pulls in; figures of nested packages overlap.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, name.strip().split(".")[0], int(cumulative)))
+    out: Dict[str, int] = {}
+    roots: List[str] = []
+    # Children are printed before their parent; walking backwards visits parents first
+    for depth, root, cumulative in reversed(rows):
+        del roots[depth:]
+        if depth == 0 or roots[-1] != root:
+            out[root] = out.get(root, 0) + cumulative
+        roots.append(root)
+    return out
+
+
+def probe(target: str) -> Tuple[dict, Dict[str, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE, target],
+        capture_output=True, text=True, env=dict(os.environ, PYTHONWARNINGS="ignore"),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{target}: import failed\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+
+    failures: List[str] = []
+    for target, budget in BUDGETS.items():
+        results = [probe(target) for _ in range(max(1, args.runs))]
+        seconds = statistics.median(r["seconds"] for r, _ in results)
+        rss = statistics.median(r["rss_mb"] for r, _ in results)
+        packages = {k: statistics.median(t.get(k, 0) for _, t in results) for k in results[0][1]}
+        forbidden = [m for m in budget.forbidden if m in results[0][0]["modules"]]
+
+        print(f"== {target}: {seconds * 1000:.0f} ms (budget {budget.seconds * 1000:.0f}), "
+              f"{rss:.1f} MB RSS (budget {budget.rss_mb:.0f}), {len(results[0][0]['modules'])} modules")
+        for name, us in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"   {us / 1000:8.1f} ms  {name}")
+        if seconds > budget.seconds:
+            failures.append(f"{target}: import took {seconds:.2f}s > {budget.seconds:.2f}s")
+        if rss > budget.rss_mb:
+            failures.append(f"{target}: RSS {rss:.1f} MB > {budget.rss_mb:.0f} MB")
+        if forbidden:
+            failures.append(f"{target}: imports {', '.join(forbidden)}")
+
+    for f in failures:
+        print(f"OVER BUDGET {f}")
+    return 1 if failures and args.check else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
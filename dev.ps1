@@ -43,8 +43,9 @@ function Ensure-DBSchema {
     }
   }
   try {
-    $code = 'from app.migrate import create_all, ensure_alter_tables; create_all(); ensure_alter_tables()'
-    & $py -c $code
+    # Applies pending steps from the schema_migrations ledger; web and worker only verify it
+    & $py -m app.migrate
+    if ($LASTEXITCODE -ne 0) { throw "app.migrate exited with code $LASTEXITCODE" }
   } catch {
     Write-Warn "Schema initialization failed. Likely causes: Postgres not running or DATABASE_URL incorrect."
     if ($dbu) { Write-Warn ("Current DATABASE_URL: {0}" -f $dbu) }
@@ -1,38 +1,90 @@
 import time
 import sys
+import threading
 from app.config import settings
+from app.db import configure
 from app.raknet import fetch_raknet_payload
 from app.parser_bzcc import normalize_bzcc_sessions
-from app.store import save_sessions
+from app.store import LiveRegistry, save_sessions
 from app.steam import enrich_steam_identities
 from app.enrich import enrich_sessions_levels
 from app.assets import ensure_placeholder_asset
-from flask_socketio import SocketIO
+from app.retention import archive_old_snapshots
+from app.migrate import ensure_snapshot_partitions, migrate, verify_schema
+from app.leaderboards import refresh_leaderboards
+from app.team_picker import get_statuses
+
+
+def _retention_loop() -> None:
+    # Runs beside the poll loop so archiving old snapshots never delays a tick
+    interval = max(60, settings.retention_interval_seconds)
+    while True:
+        try:
+            res = archive_old_snapshots()
+            print(f"[worker] retention: {res}", flush=True)
+        except Exception as ex:
+            print(f"[worker] retention error: {ex}", flush=True)
+        time.sleep(interval)
 
 
 def main() -> int:
     # Placeholder loop to verify worker process wiring
     interval = max(1, settings.poll_interval_seconds)
+    configure("worker")
     print(f"[worker] starting placeholder loop with interval={interval}s", flush=True)
     try:
+        try:
+            if settings.migrate_on_boot:
+                migrate()
+            verify_schema()
+        except Exception as ex:
+            print(f"[worker] schema check warning: {ex}", flush=True)
         ensure_placeholder_asset()
+        if settings.snapshot_retention_days > 0:
+            threading.Thread(target=_retention_loop, name="retention", daemon=True).start()
         # Poll immediately on startup to prime the DB
-        # socketio client for emit via Redis message queue
+        # Publish-only Socket.IO client manager on the Redis message queue; the web processes
+        # deliver to their sockets. Imported here so the worker never loads Flask.
         sio = None
         try:
             if settings.redis_url:
-                sio = SocketIO(message_queue=settings.redis_url)
+                from socketio import RedisManager
+                # Same channel Flask-SocketIO subscribes to by default
+                sio = RedisManager(settings.redis_url, channel="flask-socketio", write_only=True)
         except Exception:
             sio = None
+        # Live session ids and last-seen times; loaded from the database on the first tick
+        live = LiveRegistry()
+        partitions_day = None
+        leaderboards_day = None
+        leaderboards_at = float("-inf")
+        leaderboards_dirty = False
         while True:
+            # Keep daily session_snapshots partitions created ahead of time
+            today = time.strftime("%Y-%m-%d", time.gmtime())
+            if today != partitions_day:
+                try:
+                    created = ensure_snapshot_partitions()
+                    partitions_day = today
+                    if created:
+                        print(f"[worker] snapshot partitions created: {created}", flush=True)
+                except Exception as ex:
+                    print(f"[worker] partition error: {ex}", flush=True)
             try:
                 payload = fetch_raknet_payload()
                 if payload is not None:
                     normalized = normalize_bzcc_sessions(payload)
                     for s in normalized:
-                        if not s.get("name"):
-                            s["name"] = None
-                    stats = save_sessions(normalized)
+                        if not s.name:
+                            s.name = None
+                    stats = save_sessions(normalized, live)
+                    ended_ids = stats.pop("ended_ids")
+                    # Ended sessions leave the UI now rather than on the next sessions:update
+                    if sio and ended_ids:
+                        try:
+                            sio.emit("sessions:ended", {"ids": ended_ids})
+                        except Exception as ex:
+                            print(f"[worker] ws emit error: {ex}", flush=True)
                     try:
                         if normalized:
                             enrich = enrich_sessions_levels(normalized)
@@ -40,8 +92,8 @@ def main() -> int:
                             # steam enrichment (collect seen steam IDs)
                             steam_ids = []
                             for s in normalized:
-                                for p in s.get("players", []) or []:
-                                    sid = p.get("steam_id")
+                                for p in s.players:
+                                    sid = p.steam_id
                                     if sid:
                                         steam_ids.append(str(sid))
                             if steam_ids:
@@ -52,10 +104,26 @@ def main() -> int:
                     except Exception as ex:
                         print(f"[worker] enrich error: {ex}", flush=True)
                     print(f"[worker] upsert sessions: {stats}", flush=True)
+                    # Republish leaderboards after sessions ended, at most once per LEADERBOARD_CACHE_SECONDS
+                    # (web processes reuse a document that long anyway), and daily so windows roll forward
+                    leaderboards_dirty = leaderboards_dirty or bool(stats.get("ended"))
+                    due = time.monotonic() - leaderboards_at >= settings.leaderboard_cache_seconds
+                    if (leaderboards_dirty and due) or today != leaderboards_day:
+                        try:
+                            lb = refresh_leaderboards()
+                            leaderboards_day = today
+                            leaderboards_at = time.monotonic()
+                            leaderboards_dirty = False
+                            print(f"[worker] leaderboards refreshed: {lb}", flush=True)
+                        except Exception as ex:
+                            print(f"[worker] leaderboards error: {ex}", flush=True)
                     # broadcast to websockets
                     try:
                         if sio:
-                            sio.emit("sessions:update", {"sessions": normalized}, broadcast=True)
+                            # Team Picker badges ride along: one grouped query for the whole tick
+                            statuses = get_statuses([s.id for s in normalized])
+                            docs = [dict(s.to_dict(), team_picker=statuses[s.id]) for s in normalized]
+                            sio.emit("sessions:update", {"sessions": docs})
                     except Exception as ex:
                         print(f"[worker] ws emit error: {ex}", flush=True)
             except Exception as ex: